@@ -1,48 +1,38 @@
-
+import time
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import xgboost as xgb
-from datetime import datetime
+import plotly.graph_objects as go
+from datetime import datetime, timedelta
+from src.models.registry import get_registry, HIST_FEATURES
+from src.visualization.snapshot import DASHBOARD_CITIES, get_snapshot, snapshot_version
+from src.utils import metrics
+
+DASHBOARD_PROM_PATH = "data/processed/metrics_dashboard.prom"
+DASHBOARD_PROM_INTERVAL = 30  # seconds; the export isn't rewritten on every rerun
+
+render_start = time.perf_counter()
 
 st.set_page_config(page_title="AQILytics", layout="wide")
 st.title("AQILytics — Live + Historical Indian AQI")
 
-city_map = {"Delhi":"delhi", "Mumbai":"mumbai", "Bengaluru":"bangalore", "Kolkata":"kolkata", "Chennai":"chennai"}
-city = st.selectbox("Select City", options=list(city_map.keys()))
-city_key = city_map[city]
+city = st.selectbox("Select City", options=list(DASHBOARD_CITIES.keys()))
+city_key = DASHBOARD_CITIES[city]
 
-# LIVE DATA
-try:
-    live = pd.read_csv(f"data/processed/{city_key}_features.csv")
-    aqi = int(live['aqi'].iloc[-1])
-    pm25 = float(live['pm25'].iloc[-1]) if 'pm25' in live.columns and pd.notna(live['pm25'].iloc[-1]) else 0
-    pm10 = float(live['pm10'].iloc[-1]) if 'pm10' in live.columns and pd.notna(live['pm10'].iloc[-1]) else 0
-    no2 = float(live['no2'].iloc[-1]) if 'no2' in live.columns and pd.notna(live['no2'].iloc[-1]) else 0
-    humidity = float(live['humidity'].iloc[-1]) if 'humidity' in live.columns else 65
-except:
-    fallback = {
-        "Delhi": (415, 280, 340, 68, 72),
-        "Mumbai": (168, 85, 140, 42, 78),
-        "Bengaluru": (82, 48, 95, 28, 68),
-        "Kolkata": (195, 110, 185, 55, 80),
-        "Chennai": (124, 68, 115, 38, 74)
-    }
-    aqi, pm25, pm10, no2, humidity = fallback[city]
-    
-    # Show Warning
-    if city != "Chennai":
-        st.warning("Live data not found — using realistic fallback")
-    
+# Dashboard snapshot written by the pipeline (latest readings, 30-day series,
+# scatter points, forecast). Memoized per file version, so reruns only draw.
+@st.cache_data(max_entries=64)
+def load_snapshot(city_name, version):
+    return get_snapshot(city_name)
 
-# Historical Data
-@st.cache_data
-def load_hist(city_name):
-    df = pd.read_csv("data/historical/city_day.csv", parse_dates=['Datetime'])
-    df['Date'] = pd.to_datetime(df['Datetime'])
-    return df[df['City'] == city_name].copy().sort_values('Date')
+with metrics.span("dashboard_load", city=city_key):
+    snap = load_snapshot(city, snapshot_version(city_key))
+latest, history, forecast = snap["latest"], snap["history"], snap["forecast"]
 
-hist_df = load_hist(city)
+# LIVE DATA
+aqi, pm25, pm10, no2 = latest["aqi"], latest["pm25"], latest["pm10"], latest["no2"]
+if latest["fallback"] and city != "Chennai":
+    # Show Warning
+    st.warning("Live data not found — using realistic fallback")
 
 # AQI BANNER
 color = "red" if aqi > 300 else "orange" if aqi > 200 else "yellow" if aqi > 100 else "green"
@@ -57,39 +47,39 @@ c4.metric("NO₂", f"{no2:.1f} µg/m³")
 
 #  1. 30-Day Seasonal Trend
 st.subheader("30-Day Seasonal Trend (Ending Today)")
-if not hist_df.empty and len(hist_df.dropna(subset=['AQI'])) > 10:
-    trend = hist_df.dropna(subset=['AQI']).tail(30).copy()
-    fake_dates = pd.date_range(end=datetime.now(), periods=len(trend), freq='D')[::-1]
-    trend['Display_Date'] = fake_dates[-len(trend):]
-    
-    fig_line = px.line(trend, x='Display_Date', y='AQI', markers=True, height=480)
-    fig_line.update_traces(line=dict(width=4, color="#FF4444"))
-    fig_line.update_xaxes(title="Date")
+if history["rows"] > 10:
+    trend = history["trend"]
+    today = datetime.now()
+    display_dates = [today - timedelta(days=i) for i in range(len(trend))]
+
+    fig_line = go.Figure(go.Scatter(x=display_dates, y=trend, mode="lines+markers",
+                                    line=dict(width=4, color="#FF4444")))
+    fig_line.update_layout(height=480, xaxis_title="Date", yaxis_title="AQI")
     st.plotly_chart(fig_line, use_container_width=True)
 else:
     st.info("Not enough historical data")
 
 # 2. Bar Chart — Current Pollutants
 st.subheader("Current Pollutant Levels")
-poll_data = pd.DataFrame({
-    "Pollutant": ["PM₂.₅", "PM₁₀", "NO₂"],
-    "Value (µg/m³)": [pm25, pm10, no2],
-    "Color": ["#FF6B6B", "#4ECDC4", "#45B7D1"]
-})
-fig_bar = px.bar(poll_data, x="Pollutant", y="Value (µg/m³)", color="Pollutant",
-                 color_discrete_sequence=poll_data["Color"], height=400)
-fig_bar.update_layout(showlegend=False)
+fig_bar = go.Figure(go.Bar(x=["PM₂.₅", "PM₁₀", "NO₂"], y=[pm25, pm10, no2],
+                           marker_color=["#FF6B6B", "#4ECDC4", "#45B7D1"]))
+fig_bar.update_layout(height=400, showlegend=False, xaxis_title="Pollutant", yaxis_title="Value (µg/m³)")
 st.plotly_chart(fig_bar, use_container_width=True)
 
 # 3. PM2.5 vs Humidity Scatter (Historical)
 st.subheader("PM₂.₅ vs Humidity Relationship (Historical Pattern)")
-if not hist_df.empty and 'PM2.5' in hist_df.columns:
-    scatter_df = hist_df[['PM2.5', 'AQI']].dropna()
-    if len(scatter_df) > 10:
-        scatter_df['Humidity'] = 60 + (scatter_df['AQI']/10).clip(upper=30)  # simulated realistic humidity
-        fig_scatter = px.scatter(scatter_df, x='Humidity', y='PM2.5', size='AQI', color='AQI',
-                                 color_continuous_scale="OrRd", height=450,
-                                 title="Higher AQI → Higher PM2.5 & Lower Humidity (Typical Winter Pattern)")
+if history["has_pm25"]:
+    scatter = history["scatter"]
+    if scatter["n"] > 10:
+        # Points are downsampled by the pipeline; humidity is simulated from AQI there
+        sizes = [max(a, 0) for a in scatter["aqi"]]
+        fig_scatter = go.Figure(go.Scatter(
+            x=scatter["humidity"], y=scatter["pm25"], mode="markers",
+            marker=dict(size=sizes, sizemode="area", sizeref=2 * max(sizes + [1]) / 40 ** 2,
+                        color=scatter["aqi"], colorscale="OrRd", showscale=True,
+                        colorbar=dict(title="AQI"))))
+        fig_scatter.update_layout(height=450, xaxis_title="Humidity", yaxis_title="PM2.5",
+                                  title="Higher AQI → Higher PM2.5 & Lower Humidity (Typical Winter Pattern)")
         fig_scatter.add_hline(y=pm25, line_dash="dash", line_color="red", annotation_text=f"Today: {pm25:.1f}")
         st.plotly_chart(fig_scatter, use_container_width=True)
     else:
@@ -99,34 +89,53 @@ else:
 
 # 4. 24-Hour Forecast
 st.subheader("24-Hour AQI Forecast (ML Model)")
-if not hist_df.empty and len(hist_df) > 20:
-    hist_df['Month'] = hist_df['Date'].dt.month
-    hist_df['Day'] = hist_df['Date'].dt.day
-    hist_df['DayOfWeek'] = hist_df['Date'].dt.dayofweek
-    hist_df['IsWeekend'] = (hist_df['DayOfWeek'] >= 5).astype(int)
-    
-    features = ['PM2.5','PM10','NO2','CO','O3','Month','Day','DayOfWeek','IsWeekend']
-    X = hist_df[features].fillna(0)
-    y = hist_df['AQI'].fillna(method='ffill')
-    
-    model = xgb.XGBRegressor(n_estimators=200, max_depth=6, learning_rate=0.1, random_state=42)
-    model.fit(X, y)
-
-    base = pd.DataFrame([{
-        'PM2.5': pm25, 'PM10': pm10, 'NO2': no2, 'CO': 1.0, 'O3': 40,
-        'Month': datetime.now().month, 'Day': datetime.now().day,
-        'DayOfWeek': datetime.now().weekday(), 'IsWeekend': datetime.now().weekday() >= 5
-    }])
-    
-    forecast = [round(model.predict(base)[0] + (i%6-3)*4) for i in range(24)]
-    hours = pd.date_range(start=datetime.now(), periods=24, freq='H')
-    fc_df = pd.DataFrame({"Time": hours, "Predicted AQI": forecast})
-    
-    fig_fc = px.line(fc_df, x="Time", y="Predicted AQI", markers=True, height=450)
+# Direct multi-horizon forecasts + quantile bands from the pipeline, carried in the
+# snapshot. Falls back to the daily historical model.
+if forecast:
+    fig_fc = go.Figure(go.Scatter(x=forecast["time"], y=forecast["aqi_forecast"], mode="lines+markers",
+                                  line=dict(width=4, color="#FF6B6B"), name="Predicted AQI",
+                                  customdata=forecast["horizon"],
+                                  hovertemplate="%{x}<br>Predicted AQI: %{y}<br>horizon: %{customdata}h"))
+    if "aqi_lower" in forecast and "aqi_upper" in forecast:
+        # Confidence band precomputed by the training job's quantile models
+        fig_fc.add_scatter(x=forecast["time"], y=forecast["aqi_upper"], mode="lines", line=dict(width=0),
+                           showlegend=False, hoverinfo="skip")
+        fig_fc.add_scatter(x=forecast["time"], y=forecast["aqi_lower"], mode="lines", line=dict(width=0),
+                           fill="tonexty", fillcolor="rgba(255,107,107,0.2)", name="Confidence band")
+    fig_fc.update_layout(height=450, xaxis_title="Time", yaxis_title="Predicted AQI")
     fig_fc.add_hline(y=300, line_dash="dash", line_color="red")
-    fig_fc.update_traces(line=dict(width=4, color="#FF6B6B"))
     st.plotly_chart(fig_fc, use_container_width=True)
+
+    # Feature contributions (TreeSHAP) computed by the training job for this forecast
+    explanation = snap.get("explanation")
+    if explanation:
+        st.subheader("Why this forecast?")
+        horizon = st.radio("Horizon (hours ahead)", explanation["horizon"], horizontal=True)
+        j = explanation["horizon"].index(horizon)
+        top = explanation["top"][j]
+        fig_shap = go.Figure(go.Bar(
+            x=top["contribution"][::-1], y=top["feature"][::-1], orientation="h",
+            customdata=top["value"][::-1], hovertemplate="%{y} = %{customdata}<br>contribution: %{x:+.1f}",
+            marker_color=["#FF6B6B" if c > 0 else "#4ECDC4" for c in top["contribution"][::-1]]))
+        fig_shap.update_layout(height=380, xaxis_title=f"AQI contribution (baseline {explanation['base'][j]:.0f})")
+        st.plotly_chart(fig_shap, use_container_width=True)
 else:
-    st.info("Forecast unavailable")
+    # Predict-only: served from the process-wide registry (reloaded when the file changes)
+    registry = get_registry()
+    now = datetime.now()
+    base = pd.DataFrame([{
+        'PM2.5': pm25, 'PM10': pm10, 'NO2': no2, 'CO': 1.0, 'O3': 40,
+        'Month': now.month, 'Day': now.day,
+        'DayOfWeek': now.weekday(), 'IsWeekend': int(now.weekday() >= 5)
+    }])[HIST_FEATURES]
+    pred = registry.predict(city, base)
+    if pred is not None:
+        st.metric("Daily model estimate (no hourly forecast yet)", round(float(pred[0])))
+    else:
+        st.info("Forecast unavailable — no trained model (run `python run_pipeline.py`)")
+
+st.caption("Live Data: WAQI | Historical & ML: Kaggle 2015–2024 | Made with love in India")
 
-st.caption("Live Data: WAQI | Historical & ML: Kaggle 2015–2024 | Made with love in India")
\ No newline at end of file
+metrics.observe("dashboard_render_seconds", time.perf_counter() - render_start, city=city_key)
+# This process's own registry (the pipeline writes metrics.prom); scrape it with a textfile collector
+metrics.write_prometheus(DASHBOARD_PROM_PATH, min_interval=DASHBOARD_PROM_INTERVAL)
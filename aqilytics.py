@@ -0,0 +1,9 @@
+"""
+AQILytics command line: `python aqilytics.py <command> [args]` (see src/cli.py).
+"""
+import sys
+
+from src.cli import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Pollutant parsing throughput: legacy per-row eval + pd.Series vs the
+vectorized extract_pollutants() used by merge_data.
+
+    python -m benchmarks.bench_pollutants                 # 1M rows
+    python -m benchmarks.bench_pollutants --rows 200000 --legacy-rows 20000
+
+The legacy path is timed on a --legacy-rows sample (it needs minutes for
+1M rows) and reported as rows/s, which is what the comparison is about.
+"""
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from src.features.merge_data import extract_pollutants
+
+
+def make_pollutants(n, seed=0):
+    """Synthetic WAQI iaqi maps in the legacy str(dict) form, ~5% empty."""
+    rng = np.random.default_rng(seed)
+    pm25 = rng.gamma(2.0, 40.0, n).round(1)
+    pm10 = rng.gamma(2.0, 60.0, n).round(1)
+    no2 = rng.gamma(2.0, 15.0, n).round(1)
+    text = ("{'pm25': " + pd.Series(pm25).astype(str) + ", 'pm10': " + pd.Series(pm10).astype(str)
+            + ", 'no2': " + pd.Series(no2).astype(str) + ", 't': 24.0, 'h': 61}")
+    text[rng.random(n) < 0.05] = "{}"
+    return pd.DataFrame({'pollutants': text})
+
+
+def legacy_extract(df):
+    """merge_data's previous implementation, kept here as the baseline."""
+    def extract_pm(pollutants_str):
+        if pd.isna(pollutants_str) or pollutants_str in ["{}", "null", ""]:
+            return None, None
+        try:
+            data = eval(pollutants_str)
+            pm25 = data.get('pm25') or data.get('pm2.5') or data.get('pm2_5')
+            pm10 = data.get('pm10')
+            return float(pm25) if pm25 else None, float(pm10) if pm10 else None
+        except Exception:
+            # The old code swallowed any parse failure (bare except); same here
+            # without also catching KeyboardInterrupt / SystemExit
+            return None, None
+
+    out = pd.DataFrame(index=df.index)
+    out[['pm25', 'pm10']] = df['pollutants'].apply(lambda x: pd.Series(extract_pm(x))).astype(float)
+    return out
+
+
+def timed(func, df):
+    start = time.perf_counter()
+    out = func(df)
+    return out, time.perf_counter() - start
+
+
+def run(rows=1_000_000, legacy_rows=50_000):
+    df = make_pollutants(rows)
+    sample = df.head(legacy_rows)
+
+    legacy, legacy_s = timed(legacy_extract, sample)
+    fast, fast_s = timed(lambda d: extract_pollutants(d, ['pm25', 'pm10']), df)
+    assert np.allclose(legacy.to_numpy(), fast.head(legacy_rows).to_numpy(), equal_nan=True)
+
+    # Rows written by the current fetcher carry typed columns: no decoding at all
+    typed = fast.copy()
+    _, typed_s = timed(lambda d: extract_pollutants(d, ['pm25', 'pm10']), typed)
+
+    results = {
+        "legacy_rows_per_s": legacy_rows / legacy_s,
+        "vectorized_rows_per_s": rows / fast_s,
+        "typed_rows_per_s": rows / typed_s,
+    }
+    results["speedup"] = results["vectorized_rows_per_s"] / results["legacy_rows_per_s"]
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--legacy-rows", type=int, default=50_000)
+    args = parser.parse_args()
+
+    res = run(args.rows, args.legacy_rows)
+    print(f"legacy eval + pd.Series : {res['legacy_rows_per_s']:>12,.0f} rows/s  ({args.legacy_rows:,} rows)")
+    print(f"vectorized text decode  : {res['vectorized_rows_per_s']:>12,.0f} rows/s  ({args.rows:,} rows)")
+    print(f"typed columns           : {res['typed_rows_per_s']:>12,.0f} rows/s  ({args.rows:,} rows)")
+    print(f"speedup (text decode)   : {res['speedup']:>12,.1f}x")
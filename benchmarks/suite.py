@@ -0,0 +1,270 @@
+"""
+Benchmark suite for the hourly pipeline hot paths.
+
+Every case builds synthetic inputs shaped like the shipped data (see
+benchmarks/synthetic.py), times the call `--repeat` times and keeps the
+best run. Results are appended to a JSON-lines history; each run is compared
+with the previous entry for the same case, scale and core count and flagged when it is
+more than `--threshold` times slower.
+
+    python -m benchmarks.suite                       # all cases, scale 1
+    python -m benchmarks.suite merge features --scale 0.2
+    python -m benchmarks.suite --fail-on-regression  # exit 1 on a regression (CI)
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import contextlib
+import argparse
+import platform
+import statistics
+import subprocess
+from datetime import datetime
+
+import pandas as pd
+
+from benchmarks import synthetic
+
+HISTORY_PATH = "benchmarks/history.jsonl"
+BENCHMARKS = {}
+
+
+def bench(name):
+    """Register a case: func(scale, workdir) -> (callable, rows processed)."""
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+@bench("fetch_save")
+def case_fetch_save(scale, workdir):
+    # Parsed WAQI records → append-only raw store (the write half of every fetch)
+    from src.data import raw_store
+    records = synthetic.waqi_records(max(10, int(5000 * scale)))
+    db = os.path.join(workdir, "bench.db")
+
+    def run():
+        if os.path.exists(db):
+            os.remove(db)
+        raw_store.upsert("aqi", records, db_path=db)
+    return run, len(records)
+
+
+@bench("merge")
+def case_merge(scale, workdir):
+    # merge_aqi_weather without the disk reads: build_features on a 7-day raw window
+    from src.features.merge_data import build_features
+    hours = max(48, int(168 * scale))
+    raw = synthetic.raw_city("delhi", hours)
+    return (lambda: build_features("delhi", raw)), hours
+
+
+@bench("merge_legacy_text")
+def case_merge_text(scale, workdir):
+    # Same, for rows that only carry the pollutants JSON text
+    from src.features.merge_data import build_features
+    hours = max(48, int(168 * scale))
+    raw = synthetic.raw_city("delhi", hours, text_pollutants=True)
+    return (lambda: build_features("delhi", raw)), hours
+
+
+@bench("features")
+def case_features(scale, workdir):
+    from src.features.engine import add_lag_rolling
+    df = synthetic.hourly_frame(hours=max(48, int(24 * 90 * scale)))
+    return (lambda: add_lag_rolling(df, group_cols=['city'])), len(df)
+
+
+@bench("train_historical")
+def case_train_historical(scale, workdir):
+    # One city's daily model on a shared DMatrix (100 rounds; the real job uses 600)
+    from src.models import train_historical as th
+    df = synthetic.city_day_like(scale)
+    for col, fn in [('Month', lambda d: d.month), ('Day', lambda d: d.day), ('DayOfWeek', lambda d: d.dayofweek)]:
+        df[col] = fn(df['Datetime'].dt)
+    df['IsWeekend'] = (df['DayOfWeek'] >= 5).astype(int)
+    dtrain = th.build_dmatrix(df)
+    dcity = dtrain.slice(th.city_indices(df, ["Delhi"])["Delhi"])
+    return (lambda: th.train_booster(dcity, nthread=os.cpu_count() or 1, rounds=100)), dcity.num_row()
+
+
+@bench("stations")
+def case_stations(scale, workdir):
+    # station_hour rows → station x hour x pollutant cube → per-city aggregates
+    from src.data.stations import StationCube
+    df = synthetic.station_hour_like(scale, stations_per_city=20)
+
+    def run():
+        return StationCube.from_frame(df).aggregate_all()
+    return run, len(df)
+
+
+@bench("aqi")
+def case_aqi(scale, workdir):
+    # NAQI sub-indices + AQI with 24h / 8h averaging over station_hour rows
+    from src.features.aqi import compute_aqi
+    df = synthetic.station_hour_like(scale, stations_per_city=20)
+    return (lambda: compute_aqi(df)), len(df)
+
+
+def _forecaster(scale):
+    from src.models.forecast import DirectForecaster
+    data = synthetic.hourly_frame(hours=max(48, int(24 * 30 * scale)))
+    features = ['aqi', 'pm25', 'pm10', 'temp', 'humidity', 'wind_speed', 'hour']
+    forecaster = DirectForecaster([1, 6, 24], features, cities=sorted(data['city'].unique()),
+                                  params=dict(n_estimators=50, max_depth=4, learning_rate=0.1)).fit(data)
+    latest = data.groupby('city').tail(1).reset_index(drop=True)
+    return forecaster, latest
+
+
+@bench("predict_single")
+def case_predict_single(scale, workdir):
+    # One predict per city (what a per-request server would do)
+    forecaster, latest = _forecaster(scale)
+    rows = [latest.iloc[[i]] for i in range(len(latest))]
+
+    def run():
+        for row in rows:
+            forecaster.predict(row)
+            forecaster.predict_quantiles(row)
+    return run, len(rows)
+
+
+@bench("predict_batched")
+def case_predict_batched(scale, workdir):
+    # Every city stacked into one predict (pipeline / API micro-batch)
+    forecaster, latest = _forecaster(scale)
+
+    def run():
+        forecaster.predict(latest)
+        forecaster.predict_quantiles(latest)
+    return run, len(latest)
+
+
+@bench("app_load_csv")
+def case_app_load_csv(scale, workdir):
+    # What app.py used to do per rerun: parse the features CSV + filter history
+    from src.features.engine import add_lag_rolling
+    path = os.path.join(workdir, "delhi_features.csv")
+    add_lag_rolling(synthetic.hourly_frame(cities=("delhi",), hours=168)).to_csv(path, index=False)
+    hist = synthetic.city_day_like(scale)
+
+    def run():
+        live = pd.read_csv(path)
+        city = hist[hist['City'] == "Delhi"].copy()
+        return live['aqi'].iloc[-1], city.dropna(subset=['AQI']).tail(30), city[['PM2.5', 'AQI']].dropna()
+    return run, 1
+
+
+@bench("app_load_snapshot")
+def case_app_load_snapshot(scale, workdir):
+    # What app.py does now on a cache miss: one JSON snapshot
+    from src.visualization import snapshot
+    hist = synthetic.city_day_like(scale, cities=["Delhi"])
+    feats = synthetic.hourly_frame(cities=("delhi",), hours=168)
+    snapshot.write_snapshot("delhi", snapshot.build_snapshot("Delhi", feats, None, hist=hist), workdir)
+    return (lambda: snapshot.load_snapshot("delhi", workdir)), 1
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def time_case(name, scale=1.0, repeat=5, warmup=1):
+    workdir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    try:
+        # The pipeline functions print progress; keep the report readable
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            func, rows = BENCHMARKS[name](scale, workdir)
+            for _ in range(warmup):
+                func()
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                func()
+                times.append(time.perf_counter() - start)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    best = min(times)
+    return {"name": name, "scale": scale, "rows": rows, "best_s": best,
+            "median_s": statistics.median(times), "rows_per_s": rows / best if best else None,
+            "repeat": repeat}
+
+
+def load_history(path=HISTORY_PATH):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def previous(history, name, scale, cpus=None):
+    """Last recorded result for the same case, scale and core count."""
+    for entry in reversed(history):
+        if entry["name"] == name and entry["scale"] == scale and entry.get("cpus") == cpus:
+            return entry
+    return None
+
+
+def append_history(results, path=HISTORY_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as f:
+        for r in results:
+            f.write(json.dumps(r) + "\n")
+
+
+def run_suite(names=None, scale=1.0, repeat=5, threshold=1.25, history_path=HISTORY_PATH, save=True):
+    names = names or list(BENCHMARKS)
+    unknown = [n for n in names if n not in BENCHMARKS]
+    if unknown:
+        raise ValueError(f"Unknown benchmarks {unknown}; choose from {list(BENCHMARKS)}")
+
+    history = load_history(history_path)
+    meta = {"commit": git_commit(), "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "machine": platform.node(), "cpus": os.cpu_count()}
+    results, regressions = [], []
+    for name in names:
+        res = {**time_case(name, scale, repeat), **meta}
+        prev = previous(history, name, scale, meta["cpus"])
+        res["ratio"] = res["best_s"] / prev["best_s"] if prev and prev["best_s"] else None
+        res["regression"] = bool(res["ratio"] and res["ratio"] > threshold)
+        if res["regression"]:
+            regressions.append(name)
+        results.append(res)
+        print(format_row(res))
+    if save:
+        append_history(results, history_path)
+    return results, regressions
+
+
+def format_row(res):
+    ratio = f"{res['ratio']:.2f}x" if res["ratio"] else "-"
+    flag = "  REGRESSION" if res["regression"] else ""
+    return (f"{res['name']:<20} {res['best_s'] * 1000:>10.2f} ms  {res['rows_per_s'] or 0:>14,.0f} rows/s"
+            f"  vs prev {ratio:>7}{flag}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline hot paths")
+    parser.add_argument("names", nargs="*", help=f"cases to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies synthetic row counts")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio flagged as a regression")
+    parser.add_argument("--history", default=HISTORY_PATH)
+    parser.add_argument("--no-save", action="store_true", help="don't append to the history")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    _, regressions = run_suite(args.names, args.scale, args.repeat, args.threshold, args.history, not args.no_save)
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}")
+        if args.fail_on_regression:
+            sys.exit(1)
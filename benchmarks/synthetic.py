@@ -0,0 +1,92 @@
+"""
+Synthetic data shaped like the shipped datasets, for benchmarks.
+
+Column sets and value ranges follow data/historical/city_day.csv (5 cities x
+~3650 days) and station_hour.csv (2 stations per city, hourly); the raw
+AQI/weather frames look like what merge_data.load_raw() returns from the
+raw store. `scale` multiplies the row counts.
+"""
+import json
+import numpy as np
+import pandas as pd
+
+CITIES = ["Delhi", "Mumbai", "Bangalore", "Kolkata", "Chennai"]
+
+# Upper bounds of the uniform ranges in city_day.csv
+RANGES = {'PM2.5': 500, 'PM10': 600, 'NO': 200, 'NO2': 150, 'NOx': 250, 'NH3': 50, 'CO': 10,
+          'SO2': 100, 'O3': 200, 'Benzene': 20, 'Toluene': 30, 'Xylene': 10, 'AQI': 500}
+
+CITY_DAY_DAYS = 3653
+STATION_HOURS = 721
+
+
+def _readings(n, rng):
+    return {col: rng.uniform(0, top, n).round(2).astype(np.float32) for col, top in RANGES.items()}
+
+
+def city_day_like(scale=1.0, cities=CITIES, seed=0):
+    rng = np.random.default_rng(seed)
+    days = max(1, int(CITY_DAY_DAYS * scale))
+    dates = pd.date_range("2015-01-01", periods=days, freq="D")
+    df = pd.DataFrame({'City': np.repeat(cities, days), 'Datetime': np.tile(dates, len(cities)),
+                       **_readings(days * len(cities), rng)})
+    return df
+
+
+def station_hour_like(scale=1.0, stations_per_city=2, cities=CITIES, seed=0):
+    rng = np.random.default_rng(seed)
+    hours = max(1, int(STATION_HOURS * scale))
+    times = pd.date_range("2015-01-01", periods=hours, freq="h")
+    stations = [(c, f"Station_{c[0]}{i + 1}") for c in cities for i in range(stations_per_city)]
+    n = hours * len(stations)
+    return pd.DataFrame({'City': np.repeat([c for c, _ in stations], hours),
+                         'Station': np.repeat([s for _, s in stations], hours),
+                         'Datetime': np.tile(times, len(stations)), **_readings(n, rng)})
+
+
+def raw_city(city="delhi", hours=168, seed=0, text_pollutants=False):
+    """{'aqi', 'weather', 'cpcb_pm25'} like merge_data.load_raw() for one city."""
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range(end=pd.Timestamp.now().floor("h"), periods=hours, freq="h").strftime("%Y-%m-%d %H:%M:%S")
+    aqi = pd.DataFrame({'city': city, 'timestamp': ts, 'aqi': rng.uniform(20, 500, hours).round()})
+    for p in ['pm25', 'pm10', 'no2', 'o3', 'co', 'so2']:
+        aqi[p] = rng.uniform(1, 400, hours).round(1)
+    if text_pollutants:
+        # Rows written before typed columns existed only carry the JSON text
+        aqi['pollutants'] = ('{"pm25": ' + aqi['pm25'].astype(str) + ', "pm10": ' + aqi['pm10'].astype(str) + '}')
+        aqi[['pm25', 'pm10', 'no2', 'o3', 'co', 'so2']] = np.nan
+    weather = pd.DataFrame({'city': city, 'timestamp': ts,
+                            'temp': rng.uniform(10, 40, hours).round(1),
+                            'humidity': rng.uniform(20, 95, hours).round(),
+                            'pressure': rng.uniform(995, 1020, hours).round(),
+                            'wind_speed': rng.uniform(0, 8, hours).round(1),
+                            'rain_1h': np.where(rng.random(hours) < 0.1, rng.uniform(0, 5, hours), 0.0)})
+    return {'aqi': aqi, 'weather': weather, 'cpcb_pm25': None}
+
+
+def hourly_frame(cities=("delhi", "mumbai", "bangalore", "kolkata", "bhopal"), hours=24 * 90, seed=0):
+    """Merged hourly rows for several cities, before lag/rolling features."""
+    rng = np.random.default_rng(seed)
+    ts = pd.date_range("2025-01-01", periods=hours, freq="h")
+    n = hours * len(cities)
+    return pd.DataFrame({
+        'city': np.repeat(list(cities), hours), 'timestamp': np.tile(ts, len(cities)),
+        'aqi': rng.uniform(20, 500, n), 'pm25': rng.uniform(1, 400, n), 'pm10': rng.uniform(1, 600, n),
+        'no2': rng.uniform(1, 150, n), 'co': rng.uniform(0, 10, n), 'o3': rng.uniform(1, 200, n),
+        'temp': rng.uniform(10, 40, n), 'humidity': rng.uniform(20, 95, n),
+        'wind_speed': rng.uniform(0, 8, n), 'pressure': rng.uniform(995, 1020, n),
+        'rain_1h': rng.uniform(0, 2, n), 'hour': np.tile(ts.hour, len(cities)),
+    })
+
+
+def waqi_records(n, cities=("delhi", "mumbai", "bangalore", "kolkata", "bhopal"), seed=0):
+    """Parsed WAQI records (fetch_aqi.parse_waqi output) for n distinct city-hours."""
+    rng = np.random.default_rng(seed)
+    hours = pd.date_range("2025-01-01", periods=n // len(cities) + 1, freq="h")
+    out = []
+    for i in range(n):
+        vals = {p: float(round(rng.uniform(1, 400), 1)) for p in ['pm25', 'pm10', 'no2', 'o3', 'co', 'so2']}
+        out.append({'city': cities[i % len(cities)], 'timestamp': hours[i // len(cities)].isoformat(),
+                    'aqi': float(rng.integers(20, 500)), 'pollutants': json.dumps(vals), **vals})
+    return out
+
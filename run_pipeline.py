@@ -0,0 +1,184 @@
+"""
+Hourly pipeline: fetch → merge → train → dashboard → alerts for every city in one run.
+
+Fetching happens once for all cities; each city's merge stage then runs in a
+process pool and the merged frames are handed to one training stage (a
+shared multi-horizon model for every city) in memory. Only checkpoints
+(the raw store, data/processed incl. the dashboard snapshots app.py renders
+from, models/) are written, and a stage whose inputs are unchanged since the
+last run is skipped. A city whose upstream observations are all unchanged
+(per the HTTP response cache) reuses its features without merging; when no
+city has new data, train and dashboard are skipped as well.
+
+    python run_pipeline.py                    # all cities
+    python run_pipeline.py delhi mumbai --force --workers 2
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from src.data.ingest import CITIES, run_ingest
+from src.features import merge_data
+from src.models import train
+from src.visualization import snapshot
+from src.utils import alerts, metrics
+from src.utils.fingerprint import config_digest
+from src.utils.pipeline import Stage, run_dag, load_state, save_state, format_report
+
+logger = logging.getLogger("pipeline")
+
+
+def merge_stage(city, raw):
+    df = merge_data.build_features(city, raw)
+    merge_data.save_features(city, df)
+    return df
+
+
+def train_stage(key, features_by_city, force=False):
+    # One direct multi-horizon model for all cities; forecasts come from a single batched predict.
+    # train_all itself skips when the features frames + config match the model's lineage.
+    _, forecasts = train.train_all(features_by_city, force=force)
+    return forecasts
+
+
+def load_forecasts(cities):
+    return {city: train.load_forecast(city) for city in cities}
+
+
+def dashboard_stage(key, features_by_city, forecasts):
+    # Compact per-city JSON the app renders without touching the CSVs
+    return snapshot.build_all(features_by_city, forecasts)
+
+
+def alerts_stage(key, features_by_city, forecasts):
+    # One vectorised rule pass over every city; notifications go out in batches per sink
+    return alerts.run_alerts(features_by_city, forecasts)
+
+
+# Per-city stages run in the process pool
+CITY_STAGES = [
+    Stage("merge", merge_stage, deps=["raw"],
+          checkpoints=lambda c: [merge_data.features_path(c)],
+          load=merge_data.load_features, version=lambda: config_digest("features", "quality")),
+]
+
+
+def global_stages(cities, force=False):
+    """Stages that see every city at once."""
+    return [
+        Stage("train", lambda key, features: train_stage(key, features, force), deps=["merge"],
+              checkpoints=lambda key: [train.MODEL_PATH] + [train.forecast_path(c) for c in cities],
+              load=lambda key: load_forecasts(cities)),
+        Stage("dashboard", dashboard_stage, deps=["merge", "train"],
+              checkpoints=lambda key: [snapshot.snapshot_path(c) for c in snapshot.DASHBOARD_CITIES.values()],
+              load=lambda key: {c: snapshot.snapshot_path(c) for c in snapshot.DASHBOARD_CITIES.values()}),
+        Stage("alerts", alerts_stage, deps=["merge", "train"],
+              checkpoints=lambda key: [alerts.STATE_PATH], load=lambda key: None,
+              version=lambda: config_digest("alerts")),
+    ]
+
+
+def run_city(city, raw, state, force=False):
+    """Worker entry point: run the per-city stages for one city. Metrics go back to the parent."""
+    metrics.get_metrics().reset()
+    try:
+        outputs, report, updates = run_dag(CITY_STAGES, city, inputs={"raw": raw}, state=state, force=force)
+        return outputs["merge"], report, updates, None, metrics.get_metrics().export()
+    except Exception as e:
+        return None, [], {}, f"{type(e).__name__}: {e}", metrics.get_metrics().export()
+
+
+def unchanged_cities(fetched, force=False):
+    """
+    Cities where some upstream answered but none with a new observation, and
+    whose features checkpoint is on disk. Cities with no source configured
+    (no API keys) aren't listed; the fingerprint check decides for those.
+    """
+    if force:
+        return []
+    return [city for city, res in fetched.items()
+            if not res["updated"] and any(res[s] is not None for s in ("aqi", "weather", "cpcb"))
+            and all(os.path.exists(p) for p in CITY_STAGES[0].checkpoints(city))]
+
+
+def run_pipeline(cities=None, workers=None, force=False):
+    cities = cities or CITIES
+    state = load_state()
+    report = []
+
+    start = time.perf_counter()
+    fetched = run_ingest(cities)
+    report.append({"stage": "fetch", "key": "all", "status": "ran",
+                   "seconds": round(time.perf_counter() - start, 4)})
+
+    failed = []
+    features = {}
+    for city in unchanged_cities(fetched, force):
+        t = time.perf_counter()
+        features[city] = merge_data.load_features(city)
+        report.append({"stage": "merge", "key": city, "status": "no_new",
+                       "seconds": round(time.perf_counter() - t, 4)})
+    to_merge = [c for c in cities if c not in features]
+
+    # Each city's merge window comes straight from the append-only raw store
+    t = time.perf_counter()
+    raw = {city: merge_data.load_raw(city) for city in to_merge}
+    report.append({"stage": "load_raw", "key": "all", "status": "ran" if to_merge else "skipped",
+                   "seconds": round(time.perf_counter() - t, 4)})
+
+    workers = workers or max(1, min(len(to_merge), os.cpu_count() or 1))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {city: pool.submit(run_city, city, raw[city], state, force) for city in to_merge}
+        for city, fut in futures.items():
+            merged, city_report, updates, error, city_metrics = fut.result()
+            metrics.get_metrics().merge(city_metrics)
+            report.extend(city_report)
+            state.update(updates)
+            if error:
+                logger.error(f"{city} failed: {error}")
+                failed.append(city)
+            else:
+                features[city] = merged
+
+    stages = global_stages(sorted(features), force)
+    if features and not to_merge and not failed and all(stage.can_skip("all") for stage in stages):
+        logger.info("No new observations for any city — train, dashboard and alerts skipped")
+        report += [{"stage": stage.name, "key": "all", "status": "no_new", "seconds": 0.0} for stage in stages]
+    elif features:
+        try:
+            # The city set is part of the input fingerprint, so one state key is enough
+            _, global_report, updates = run_dag(stages, "all",
+                                                inputs={"merge": features}, state=state, force=force)
+            report.extend(global_report)
+            state.update(updates)
+        except Exception as e:
+            logger.error(f"train failed: {type(e).__name__}: {e}")
+            failed.append("train")
+
+    save_state(state)
+    total = time.perf_counter() - start
+    report.append({"stage": "total", "key": "all", "status": "failed" if failed else "ok",
+                   "seconds": round(total, 4)})
+    metrics.gauge("pipeline_last_run_seconds", total)
+    metrics.gauge("pipeline_last_run_failed", len(failed))
+    print(format_report(report))
+    print(f"Metrics → {metrics.write_prometheus()}")
+    return report, failed
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Run the AQILytics hourly pipeline")
+    parser.add_argument("cities", nargs="*", help=f"cities to update (default: {' '.join(CITIES)})")
+    parser.add_argument("--workers", type=int, default=None, help="process pool size")
+    parser.add_argument("--force", action="store_true", help="rerun stages even if inputs are unchanged")
+    parser.add_argument("--metrics-log", default=metrics.JSONL_PATH,
+                        help="append span / HTTP timing events to this JSONL file (default: $AQILYTICS_METRICS_LOG, off)")
+    args = parser.parse_args()
+    metrics.configure(args.metrics_log or None)
+
+    _, failed = run_pipeline([c.lower() for c in args.cities], args.workers, args.force)
+    sys.exit(1 if failed else 0)
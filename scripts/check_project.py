@@ -0,0 +1,128 @@
+
+"""
+Project structure check: folders, key files, .gitignore, then one pipeline
+run for a single city and a read of the files the dashboard needs.
+
+    python scripts/check_project.py
+"""
+import subprocess
+import sys
+from pathlib import Path
+
+# CONFIG
+ROOT = Path.cwd()
+print(f"Project Root: {ROOT}")
+
+# 1. CHECK REQUIRED FOLDERS
+folders = {
+    "src/data": "Data fetching scripts",
+    "src/features": "Data processing",
+    "src/models": "Model training",
+    "data/raw": "Raw API data",
+    "data/processed": "Merged features",
+    "models": "Trained models",
+    ".github/workflows": "GitHub Actions"
+}
+
+print("\nFOLDER STRUCTURE:")
+missing_folders = []
+for folder, desc in folders.items():
+    path = ROOT / folder
+    exists = path.exists()
+    print(f"  {'✓' if exists else '✗'} {folder.ljust(25)} → {desc}")
+    if not exists:
+        missing_folders.append(folder)
+
+if missing_folders:
+    print(f"\nACTION: Create missing folders:")
+    for f in missing_folders:
+        print(f"  mkdir -p {f}")
+else:
+    print("  All folders present")
+
+# 2. CHECK CRITICAL FILES
+files = {
+    "app.py": "Streamlit dashboard",
+    "requirements.txt": "Python dependencies",
+    ".gitignore": "Git ignore rules",
+    "src/data/fetch_aqi.py": "WAQI API fetcher",
+    "src/data/fetch_weather.py": "Weather fetcher",
+    "src/features/merge_data.py": "Data merger",
+    "src/models/train.py": "XGBoost trainer",
+    "src/utils/alerts.py": "Alerting engine",
+    "src/utils/send_alerts.py": "Alert runner",
+    ".github/workflows/update.yml": "Auto-update workflow"
+}
+
+print("\nCRITICAL FILES:")
+missing_files = []
+for file, desc in files.items():
+    path = ROOT / file
+    exists = path.exists()
+    status = '✓' if exists else '✗'
+    print(f"  {status} {file.ljust(40)} → {desc}")
+    if not exists:
+        missing_files.append(file)
+
+# 3. CHECK .gitignore CONTENT
+gitignore_path = ROOT / ".gitignore"
+if gitignore_path.exists():
+    content = gitignore_path.read_text().strip()
+    required = ["data/", "models/", ".venv/", "__pycache__/", ".streamlit/"]
+    print(f"\n.gitignore CHECK:")
+    for req in required:
+        present = req in content
+        print(f"  {'✓' if present else '✗'} {req}")
+else:
+    print(".gitignore MISSING")
+
+# 4. TEST DATA GENERATION (MUMBAI ONLY)
+print(f"\nTESTING DATA PIPELINE (mumbai only)...")
+city = "mumbai"
+
+steps = [("Fetching AQI + weather", ["fetch", city]), ("Merging data", ["merge", city]),
+         ("Training model", ["train", city])]
+failed = False
+for label, args in steps:
+    print(f"  → {label}...")
+    if subprocess.run([sys.executable, "aqilytics.py", *args], cwd=ROOT).returncode != 0:
+        print(f"  {label} failed")
+        failed = True
+        break
+print("  PIPELINE FAILED" if failed else "  PIPELINE SUCCESS")
+
+# 5. CHECK app.py CAN LOAD DATA
+print(f"\nTESTING app.py DATA LOAD...")
+try:
+    import pandas as pd
+    current_path = ROOT / f"data/processed/{city}_features.csv"
+    forecast_path = ROOT / f"data/processed/{city}_forecast.csv"
+    if current_path.exists() and forecast_path.exists():
+        current = pd.read_csv(current_path)
+        forecast = pd.read_csv(forecast_path)
+        print(f"  current.csv: {len(current)} rows")
+        print(f"  forecast.csv: {len(forecast)} rows")
+        print(f"  Columns: {list(current.columns)}")
+        print("  app.py CAN LOAD DATA")
+    else:
+        print("  DATA FILES MISSING AFTER PIPELINE")
+except Exception as e:
+    print(f"  ERROR: {e}")
+
+# 6. FINAL REPORT
+print(f"\nFINAL REPORT (Nov 16, 2025 06:50 PM IST)")
+print("="*60)
+if not missing_folders and not missing_files:
+    print("PROJECT 100% INTACT")
+    print("NO FILES DELETED")
+    print("READY FOR CLOUD DEPLOY")
+else:
+    print("ISSUES FOUND:")
+    if missing_folders:
+        print("  • Missing folders → run mkdir commands above")
+    if missing_files:
+        print("  • Missing files:")
+        for f in missing_files:
+            print(f"    - {f}")
+print("="*60)
+print("RUN: streamlit run app.py → Should work")
\ No newline at end of file
@@ -0,0 +1,86 @@
+"""
+Load test for the prediction API.
+
+    uvicorn src.app.api:app --port 8000 &
+    python scripts/load_test.py --url http://127.0.0.1:8000 --concurrency 64 --duration 10
+
+Each worker thread keeps one keep-alive connection and cycles through the
+given paths; prints throughput and latency percentiles per status code.
+"""
+import time
+import argparse
+import threading
+import http.client
+from collections import Counter
+from urllib.parse import urlsplit
+
+import numpy as np
+
+DEFAULT_PATHS = ["/forecast/delhi", "/forecast/mumbai?horizon=6", "/current/kolkata",
+                 "/forecast?cities=delhi,mumbai,bangalore,kolkata,bhopal"]
+
+
+def worker(host, port, paths, stop_at, latencies, statuses, lock, offset):
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    local, codes = [], Counter()
+    i = offset
+    while time.perf_counter() < stop_at:
+        path = paths[i % len(paths)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            resp = conn.getresponse()
+            resp.read()
+            codes[resp.status] += 1
+        except (OSError, http.client.HTTPException):
+            codes["error"] += 1
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=10)
+            continue
+        local.append(time.perf_counter() - start)
+    conn.close()
+    with lock:
+        latencies.extend(local)
+        statuses.update(codes)
+
+
+def run(url, concurrency=32, duration=10.0, paths=None):
+    parts = urlsplit(url)
+    paths = paths or DEFAULT_PATHS
+    latencies, statuses, lock = [], Counter(), threading.Lock()
+    stop_at = time.perf_counter() + duration
+    threads = [threading.Thread(target=worker, args=(parts.hostname, parts.port or 80, paths, stop_at,
+                                                     latencies, statuses, lock, n))
+               for n in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    lat = np.array(latencies) * 1000
+    return {
+        "requests": len(lat),
+        "qps": len(lat) / elapsed,
+        "p50_ms": float(np.percentile(lat, 50)) if len(lat) else None,
+        "p95_ms": float(np.percentile(lat, 95)) if len(lat) else None,
+        "p99_ms": float(np.percentile(lat, 99)) if len(lat) else None,
+        "statuses": dict(statuses),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the AQILytics prediction API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--path", action="append", help="request path (repeatable); default mixes endpoints")
+    args = parser.parse_args()
+
+    res = run(args.url, args.concurrency, args.duration, args.path)
+    print(f"{res['requests']:,} requests in {args.duration:.0f}s → {res['qps']:,.0f} req/s")
+    if res["requests"]:
+        print(f"latency p50 {res['p50_ms']:.1f} ms | p95 {res['p95_ms']:.1f} ms | p99 {res['p99_ms']:.1f} ms")
+    print(f"status codes: {res['statuses']}")
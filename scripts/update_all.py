@@ -4,11 +4,7 @@ import sys
 
 CITIES = ["delhi", "mumbai", "bangalore", "kolkata", "bhopal"]
 
-for city in CITIES:
-    print(f"\n=== Updating {city.upper()} ===")
-    subprocess.run(["python", "src/data/fetch_aqi.py", city], check=True)
-    subprocess.run(["python", "src/data/fetch_weather.py", city], check=True)
-    subprocess.run(["python", "src/features/merge_data.py", city], check=True)
-    subprocess.run(["python", "src/models/train.py", city], check=True)
+# One process: fetch all cities at once, then merge/train each city in a process pool
+subprocess.run([sys.executable, "run_pipeline.py", *CITIES], check=True)
 
 print("\nAll cities updated!")
\ No newline at end of file
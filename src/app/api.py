@@ -0,0 +1,331 @@
+"""
+JSON prediction API (plain ASGI, no framework).
+
+    uvicorn src.app.api:app --port 8000
+
+    GET  /health
+    GET  /current/{city}                    latest merged readings
+    GET  /forecast/{city}?horizon=6         all horizons, or just one
+    GET  /forecast?cities=delhi,mumbai      batch
+    POST /forecast  {"cities": [...], "horizon": 6}
+    GET  /metrics                           Prometheus text (request latency, spans)
+
+The multi-horizon forecaster (models/xgb_forecaster.pkl) and each city's
+latest feature row (data/processed/<city>_features.csv) are loaded once and
+reloaded only when their files change; CSV reads run in a thread pool, not
+on the event loop. Concurrent requests are micro-batched: everything that
+arrives within a couple of milliseconds is stacked into one frame and
+served by a single predict() call, and the result is memoized until the
+model or the features change.
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+from urllib.parse import parse_qs
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from src.models.registry import get_registry
+from src.models.train import MODEL_PATH
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+FEATURES_DIR = "data/processed"
+CITY_NAME = re.compile(r"[a-z][a-z_-]*")  # city names become file names; nothing else reaches the filesystem
+CURRENT_FIELDS = ['aqi', 'pm25', 'pm10', 'temp', 'humidity', 'wind_speed']
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def features_path(city, features_dir=FEATURES_DIR):
+    return os.path.join(features_dir, f"{city}_features.csv")
+
+
+class LatestFeatures:
+    """Last feature row per city, re-read (off the event loop) only when the CSV changes."""
+
+    def __init__(self, features_dir=FEATURES_DIR, executor=None):
+        self.features_dir = features_dir
+        self.executor = executor or ThreadPoolExecutor(max_workers=2, thread_name_prefix="features")
+        self._rows = {}     # city -> (stat, row frame)
+        self._loading = {}  # (city, stat) -> task, so concurrent requests share one read
+
+    async def get(self, city):
+        if not CITY_NAME.fullmatch(city):
+            raise ApiError(400, f"Invalid city name '{city}'")
+        path = features_path(city, self.features_dir)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            raise ApiError(404, f"No features for city '{city}'")
+        stat = (st.st_mtime_ns, st.st_size)
+        cached = self._rows.get(city)
+        if cached and cached[0] == stat:
+            return cached[1], stat
+        key = (city, stat)
+        task = self._loading.get(key)
+        if task is None:
+            loop = asyncio.get_running_loop()
+            task = asyncio.ensure_future(loop.run_in_executor(self.executor, self._read, path, city))
+            self._loading[key] = task
+            task.add_done_callback(lambda _: self._loading.pop(key, None))
+        row = await task
+        self._rows[city] = (stat, row)
+        return row, stat
+
+    @staticmethod
+    def _read(path, city):
+        df = pd.read_csv(path, parse_dates=['timestamp'])
+        if df.empty:
+            raise ApiError(404, f"No features for city '{city}'")
+        # copy() consolidates the wide CSV frame before adding the city column
+        return df.sort_values('timestamp').iloc[[-1]].copy().assign(city=city).reset_index(drop=True)
+
+
+class MicroBatcher:
+    """Collect concurrent submit() calls and run them through one batch function call."""
+
+    def __init__(self, batch_fn, max_batch=64, max_wait=0.002, executor=None):
+        self.batch_fn = batch_fn          # list of items -> list of results (runs in a thread)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix="predict")
+        self._queue = None
+        self._worker = None
+        self.batches = 0
+
+    async def submit(self, item):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, fut))
+        return await fut
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            items = [item for item, _ in batch]
+            try:
+                results = await loop.run_in_executor(self.executor, self.batch_fn, items)
+                self.batches += 1
+            except Exception as e:
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            for (_, fut), res in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(res)
+
+
+class ForecastService:
+    def __init__(self, model_path=MODEL_PATH, features_dir=FEATURES_DIR, registry=None,
+                 max_batch=64, max_wait=0.002):
+        self.model_path = model_path
+        self.registry = registry or get_registry()
+        self.features = LatestFeatures(features_dir)
+        self.batcher = MicroBatcher(self._predict_batch, max_batch, max_wait)
+        self._memo = {}      # city -> (model version, features stat, forecast)
+        self._pending = {}   # (city, version, stat) -> task, so identical requests share one predict
+
+    def model(self):
+        forecaster = self.registry.load(self.model_path)
+        if forecaster is None:
+            raise ApiError(503, "No trained forecaster (run `python run_pipeline.py`)")
+        return forecaster, self.registry.load_version(self.model_path)
+
+    async def current(self, city):
+        row, _ = await self.features.get(city)
+        rec = row.iloc[0]
+        out = {"city": city, "timestamp": rec['timestamp'].isoformat()}
+        for col in CURRENT_FIELDS:
+            if col in row.columns and pd.notna(rec[col]):
+                out[col] = float(rec[col])
+        return out
+
+    def _predict_batch(self, items):
+        """items: [(forecaster, version, row)] → one stacked predict per model version."""
+        out = [None] * len(items)
+        metrics.inc("api_predict_batches_total")
+        metrics.inc("api_predict_rows_total", len(items))
+        by_version = {}
+        for i, (forecaster, version, row) in enumerate(items):
+            by_version.setdefault(version, (forecaster, []))[1].append(i)
+        for forecaster, idx in by_version.values():
+            frame = pd.concat([items[i][2] for i in idx], ignore_index=True)
+            preds = forecaster.predict(frame)
+            bands = forecaster.predict_quantiles(frame)
+            q = forecaster.quantiles
+            lower, median, upper = 0, q.index(0.5), len(q) - 1
+            for j, i in enumerate(idx):
+                base = frame['timestamp'].iloc[j]
+                out[i] = [{
+                    "horizon": int(h),
+                    "timestamp": (base + pd.Timedelta(hours=int(h))).isoformat(),
+                    "aqi": round(float(preds[j, k]), 1),
+                    "lower": round(float(bands[j, k, lower]), 1),
+                    "median": round(float(bands[j, k, median]), 1),
+                    "upper": round(float(bands[j, k, upper]), 1),
+                } for k, h in enumerate(forecaster.horizons)]
+        return out
+
+    async def forecast(self, city, horizon=None):
+        forecaster, version = self.model()
+        row, stat = await self.features.get(city)
+        memo = self._memo.get(city)
+        if memo and memo[0] == version and memo[1] == stat:
+            points = memo[2]
+        else:
+            key = (city, version, stat)
+            task = self._pending.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self.batcher.submit((forecaster, version, row)))
+                self._pending[key] = task
+                task.add_done_callback(lambda _: self._pending.pop(key, None))
+            points = await task
+            self._memo[city] = (version, stat, points)
+
+        if horizon is not None:
+            points = [p for p in points if p["horizon"] == horizon]
+            if not points:
+                raise ApiError(400, f"horizon must be one of {forecaster.horizons}")
+        return {"city": city, "model_version": version[:12], "forecast": points}
+
+    async def forecast_many(self, cities, horizon=None):
+        results = await asyncio.gather(*(self.forecast(c, horizon) for c in cities), return_exceptions=True)
+        out = {"results": {}, "errors": {}}
+        for city, res in zip(cities, results):
+            if isinstance(res, ApiError):
+                out["errors"][city] = res.args[0]
+            elif isinstance(res, Exception):
+                raise res
+            else:
+                out["results"][city] = res
+        return out
+
+
+def _parse_horizon(value):
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, "horizon must be an integer (hours)")
+
+
+async def _read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _send(send, status, body, content_type=b"application/json"):
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _send_json(send, status, payload):
+    await _send(send, status, json.dumps(payload, separators=(",", ":")).encode())
+
+
+def create_app(service=None):
+    service = service or ForecastService()
+
+    async def route(method, path, query, receive):
+        parts = [p for p in path.split("/") if p]
+        if parts == ["health"]:
+            return {"status": "ok"}
+        if len(parts) == 2 and parts[0] == "current" and method == "GET":
+            return await service.current(parts[1].lower())
+        if len(parts) == 2 and parts[0] == "forecast" and method == "GET":
+            return await service.forecast(parts[1].lower(), _parse_horizon(query.get("horizon", [None])[0]))
+        if parts == ["forecast"]:
+            if method == "GET":
+                cities = [c for c in query.get("cities", [""])[0].lower().split(",") if c]
+                horizon = _parse_horizon(query.get("horizon", [None])[0])
+            elif method == "POST":
+                try:
+                    req = json.loads(await _read_body(receive) or b"{}")
+                    cities = [str(c).lower() for c in req.get("cities", [])]
+                except (ValueError, AttributeError):
+                    raise ApiError(400, "body must be JSON like {\"cities\": [...], \"horizon\": 6}")
+                horizon = _parse_horizon(req.get("horizon"))
+            else:
+                raise ApiError(405, "method not allowed")
+            if not cities:
+                raise ApiError(400, "no cities given")
+            return await service.forecast_many(cities, horizon)
+        raise ApiError(404, "not found")
+
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    # Preload the forecaster so the first request doesn't pay for unpickling
+                    try:
+                        service.model()
+                    except ApiError as e:
+                        logger.warning(str(e))
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+        if scope["path"] == "/metrics":
+            body = metrics.get_metrics().to_prometheus().encode()
+            await _send(send, 200, body, b"text/plain; version=0.0.4")
+            return
+        query = parse_qs(scope.get("query_string", b"").decode())
+        # Label by the first path segment only, so cities don't explode the series count
+        endpoint = "/" + scope["path"].strip("/").split("/")[0]
+        start = time.perf_counter()
+        status = 200
+        try:
+            payload = await route(scope["method"], scope["path"], query, receive)
+            await _send_json(send, 200, payload)
+        except ApiError as e:
+            status = e.status
+            await _send_json(send, e.status, {"error": e.args[0]})
+        except Exception as e:
+            status = 500
+            logger.exception("request failed")
+            await _send_json(send, 500, {"error": f"{type(e).__name__}: {e}"})
+        finally:
+            metrics.observe("api_request_seconds", time.perf_counter() - start, endpoint=endpoint, status=status)
+
+    app.service = service
+    return app
+
+
+app = create_app()
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=int(os.getenv("PORT", "8000")))
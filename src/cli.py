@@ -0,0 +1,133 @@
+"""
+Single entry point for the project's scripts.
+
+    python aqilytics.py fetch delhi mumbai
+    python aqilytics.py pipeline --workers 4
+    python aqilytics.py imports            # import time of every command vs its budget
+
+Each command runs an existing module as __main__ with the remaining
+arguments, so nothing is imported until a command is picked: `fetch` only
+needs requests + sqlite, not pandas or xgboost. Secrets (.env) are read
+once here, before dispatch.
+"""
+import os
+import sys
+import json
+import runpy
+import argparse
+
+from src.utils.config import load_secrets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (module run as __main__, help, import budget in ms)
+# Budgets are about 2x what a 1-CPU CI runner measures, after interpreter start.
+COMMANDS = {
+    "fetch": ("src.data.ingest", "fetch WAQI / OpenWeather / CPCB for cities into the raw store", 300),
+    "merge": ("src.features.merge_data", "build hourly features for one city", 800),
+    "train": ("src.models.train", "train the multi-horizon forecaster on processed features", 3000),
+    "pipeline": ("run_pipeline", "fetch → merge → train → dashboard, skipping unchanged stages", 3000),
+    "historical": ("src.models.train_historical", "train the daily per-city models", 3000),
+    "stream-train": ("src.models.train_streaming", "out-of-core training over the station_hour history", 3000),
+    "backtest": ("src.models.backtest", "rolling-origin backtest per city and horizon", 3000),
+    "alerts": ("src.utils.send_alerts", "evaluate alert rules on saved forecasts and notify", 3000),
+    "stations": ("src.data.stations", "station-level aggregates from station_hour", 900),
+    "aqi": ("src.features.aqi", "NAQI sub-indices and AQI from concentrations", 900),
+    "quality": ("src.features.quality", "range / stuck / spike / gap report for a historical table", 900),
+    "serve": ("src.app.api", "run the prediction API (uvicorn)", 3000),
+    "bench": ("benchmarks.suite", "benchmark the pipeline hot paths", 1100),
+}
+
+# Libraries that commands listed here must not pull in
+HEAVY = ("pandas", "numpy", "xgboost", "sklearn")
+LIGHT_COMMANDS = {"fetch"}
+
+_PROBE = """
+import sys, time, json, importlib
+start = time.perf_counter()
+importlib.import_module(sys.argv[1])
+print(json.dumps({"ms": (time.perf_counter() - start) * 1000,
+                  "heavy": [m for m in sys.argv[2:] if m in sys.modules]}))
+"""
+
+
+def run_command(name, argv):
+    module = COMMANDS[name][0]
+    # alter_sys makes the module the real __main__ (pickling in process pools works);
+    # runpy replaces argv[0] with the module's path
+    saved, sys.argv = sys.argv, [module, *argv]
+    try:
+        runpy.run_module(module, run_name="__main__", alter_sys=True)
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    finally:
+        sys.argv = saved
+    return 0
+
+
+def measure_import(name, repeat=3):
+    """Best-of-`repeat` import time of a command's module in a fresh interpreter."""
+    import subprocess
+
+    module = COMMANDS[name][0]
+    best = None
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", _PROBE, module, *HEAVY], capture_output=True, text=True,
+                             cwd=ROOT, env={**os.environ, "PYTHONPATH": ROOT})
+        if out.returncode != 0:
+            raise RuntimeError(f"importing {module} failed:\n{out.stderr.strip()}")
+        res = json.loads(out.stdout.strip().splitlines()[-1])
+        if best is None or res["ms"] < best["ms"]:
+            best = res
+    return best
+
+
+def check_imports(names=None, repeat=3):
+    """Rows of {command, ms, budget_ms, heavy, ok}; ok is False over budget or on a forbidden import."""
+    rows = []
+    for name in names or COMMANDS:
+        res = measure_import(name, repeat)
+        budget = COMMANDS[name][2]
+        forbidden = res["heavy"] if name in LIGHT_COMMANDS else []
+        rows.append({"command": name, "ms": round(res["ms"], 1), "budget_ms": budget, "heavy": res["heavy"],
+                     "ok": res["ms"] <= budget and not forbidden})
+    return rows
+
+
+def imports_main(argv):
+    parser = argparse.ArgumentParser(prog="aqilytics imports", description="Import time of each command vs budget")
+    parser.add_argument("names", nargs="*", help=f"commands (default: all of {', '.join(COMMANDS)})")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+    unknown = [n for n in args.names if n not in COMMANDS]
+    if unknown:
+        parser.error(f"unknown commands {unknown}")
+
+    rows = check_imports(args.names, args.repeat)
+    print(f"{'command':<12} {'import ms':>10} {'budget':>8}  heavy libs")
+    for r in rows:
+        flag = "" if r["ok"] else "  OVER" if r["ms"] > r["budget_ms"] else "  FORBIDDEN IMPORT"
+        print(f"{r['command']:<12} {r['ms']:>10.1f} {r['budget_ms']:>8}  {', '.join(r['heavy']) or '-'}{flag}")
+    return 0 if all(r["ok"] for r in rows) else 1
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    commands = "\n".join(f"  {name:<12} {help_}" for name, (_, help_, _) in COMMANDS.items())
+    parser = argparse.ArgumentParser(
+        prog="aqilytics", formatter_class=argparse.RawDescriptionHelpFormatter,
+        description="AQILytics command line",
+        epilog=f"commands:\n{commands}\n  {'imports':<12} import time of each command vs its budget\n\n"
+               "`aqilytics <command> --help` shows a command's own options.")
+    parser.add_argument("command", choices=list(COMMANDS) + ["imports"], metavar="command")
+    # Only the command name is parsed here; the rest belongs to the command
+    args = parser.parse_args(argv[:1])
+
+    if args.command == "imports":
+        return imports_main(argv[1:])
+    load_secrets()
+    return run_command(args.command, argv[1:])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,55 +1,81 @@
 
-import requests
-import pandas as pd
-import os
+import json
 import logging
 from datetime import datetime, timedelta
 import sys
+from src.data import raw_store
+from src.data.http_cache import ResponseCache, cached_get
+from src.utils.config import secret
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load token
-from dotenv import load_dotenv
-load_dotenv()
-WAQI_TOKEN = os.getenv("WAQI_TOKEN")
-if not WAQI_TOKEN:
-    raise ValueError("WAQI_TOKEN not found in .env")
+WAQI_BASE = "https://api.waqi.info/feed"
+# iaqi keys persisted as their own typed columns
+POLLUTANTS = ['pm25', 'pm10', 'no2', 'o3', 'co', 'so2']
+TIMEOUT = 10
 
-def fetch_current_aqi(city):
-    print(f"Fetching current AQI for {city}...")
-    url = f"https://api.waqi.info/feed/{city}/?token={WAQI_TOKEN}"
-    response = requests.get(url)
-    print(f"Status: {response.status_code}")
-    if response.status_code != 200:
-        print(f"Error: {response.text}")
-        return pd.DataFrame()
-    data = response.json()
+def get_token():
+    token = secret("WAQI_TOKEN")
+    if not token:
+        raise ValueError("WAQI_TOKEN not found in .env")
+    return token
+
+def waqi_url(city, base=WAQI_BASE):
+    return f"{base}/{city}/"
+
+def waqi_ok(data):
+    # WAQI reports errors (bad token, over quota) as HTTP 200 with status "error"
+    return data.get("status") == "ok"
+
+def waqi_observed(data):
+    return data['data']['time']['s']
+
+def parse_waqi(city, data):
     if data.get("status") != "ok":
         print(f"API Error: {data}")
-        return pd.DataFrame()
+        return None
     
     aqi = data['data']['aqi']
     pollutants = data['data'].get('iaqi', {})
     timestamp = data['data']['time']['s']
     
+    values = {k: v['v'] for k, v in pollutants.items() if 'v' in v}
     record = {
         'city': city,
         'timestamp': timestamp,
         'aqi': aqi,
-        'pollutants': str({
-            k: v['v'] for k, v in pollutants.items()
-            if 'v' in v
-        })
+        # Full iaqi map as JSON (weather keys etc.), pollutants also typed below
+        'pollutants': json.dumps(values)
     }
-    df = pd.DataFrame([record])
-    filepath = f"data/raw/{city}_current_aqi.csv"
-    os.makedirs("data/raw", exist_ok=True)
-    df.to_csv(filepath, index=False)
-    logger.info(f"Saved 1 record → {filepath}")
-    return df
+    for name in POLLUTANTS:
+        value = values.get(name)
+        record[name] = float(value) if isinstance(value, (int, float)) else None
+    return record
+
+def save_current_aqi(record):
+    # Append to the raw store; re-fetching the same hour just updates it
+    return raw_store.upsert("aqi", [record])
+
+def fetch_current_aqi(city):
+    import pandas as pd
+    print(f"Fetching current AQI for {city}...")
+    cache = ResponseCache()
+    res = cached_get(waqi_url(city), params={"token": get_token()}, observe=waqi_observed, valid=waqi_ok,
+                     timeout=TIMEOUT, cache=cache)
+    if res is None:
+        return pd.DataFrame()
+    print(f"Status: {res.status}")
+    record = parse_waqi(city, res.body)
+    if record is None:
+        return pd.DataFrame()
+    if res.new:
+        save_current_aqi(record)
+    cache.save()
+    return pd.DataFrame([record])
 
 def fetch_historical_aqi(city):
+    import pandas as pd
     print(f"Fetching historical AQI for {city} (mock)...")
     # WAQI free tier has no historical API → mock 7 days
     current = datetime.now()
@@ -60,17 +86,16 @@ def fetch_historical_aqi(city):
             'city': city,
             'timestamp': d.strftime("%Y-%m-%d %H:00:00"),
             'aqi': 200 + i * 10,  # mock
-            'pollutants': "{}"
+            'pollutants': "{}",
+            **{name: None for name in POLLUTANTS}
         })
-    df = pd.DataFrame(records)
-    filepath = f"data/raw/{city}_historical_aqi.csv"
-    df.to_csv(filepath, index=False)
-    logger.info(f"Saved 7 mock records → {filepath}")
-    return df
+    # Only fill hours we have no real reading for
+    raw_store.upsert("aqi", records, overwrite=False)
+    return pd.DataFrame(records)
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Usage: python src/data/fetch_aqi.py <city>")
+        print("Usage: python -m src.data.fetch_aqi <city>")
         sys.exit(1)
     city = sys.argv[1].lower()
     fetch_current_aqi(city)
@@ -1,10 +1,8 @@
 
-import requests
-import pandas as pd
-import os
 from datetime import datetime
-
-CPCB_KEY = os.getenv("CPCB_KEY")
+from src.data import raw_store
+from src.data.http_cache import ResponseCache, cached_get
+from src.utils.config import secret
 
 CITY_TO_STATE = {
     "mumbai": "Maharashtra",
@@ -14,43 +12,55 @@ CITY_TO_STATE = {
     "bhopal": "Madhya Pradesh"
 }
 
-def fetch_cpcb_pm25(city):
+CPCB_URL = "https://api.data.gov.in/resource/3b01bcb8-0b14-4abf-b6f2-c1bfd384ba69"
+TIMEOUT = 10
+
+def cpcb_params(city, api_key):
     state = CITY_TO_STATE.get(city.lower())
-    if not state or not CPCB_KEY:
+    if not state or not api_key:
         return None
-
-    url = "https://api.data.gov.in/resource/3b01bcb8-0b14-4abf-b6f2-c1bfd384ba69"
-    params = {
-        "api-key": CPCB_KEY,
+    return {
+        "api-key": api_key,
         "format": "json",
         "limit": 1,
         "filters[state]": state
     }
-    try:
-        data = requests.get(url, params=params, timeout=10).json()
-        records = data.get('records', [])
-        if records and 'pm2_5' in records[0]:
-            pm25 = float(records[0]['pm2_5'])
-            return pm25
-    except Exception as e:
-        print(f"CPCB Error: {e}")
+
+def cpcb_observed(data):
+    records = data.get('records', [])
+    return records[0].get('last_update') if records else None
+
+def parse_cpcb(data):
+    records = data.get('records', [])
+    if records and 'pm2_5' in records[0]:
+        return float(records[0]['pm2_5'])
     return None
 
+def save_cpcb_pm25(city, pm25):
+    return raw_store.upsert("cpcb", [{
+        "city": city,
+        "pm25": pm25,
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:00:00")
+    }])
+
+def fetch_cpcb_pm25(city, cache=None):
+    params = cpcb_params(city, secret("CPCB_KEY"))
+    if params is None:
+        return None
+    res = cached_get(CPCB_URL, params=params, observe=cpcb_observed, timeout=TIMEOUT, cache=cache)
+    return parse_cpcb(res.body) if res is not None else None
+
 if __name__ == "__main__":
     import sys
     if len(sys.argv) < 2:
-        print("Usage: python fetch_cpcb.py <city>")
+        print("Usage: python -m src.data.fetch_cpcb <city>")
         sys.exit(1)
     city = sys.argv[1].lower()
-    pm25 = fetch_cpcb_pm25(city)
+    cache = ResponseCache()
+    pm25 = fetch_cpcb_pm25(city, cache=cache)
     if pm25 is not None:
-        df = pd.DataFrame([{
-            "city": city,
-            "pm25": pm25,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:00:00")
-        }])
-        os.makedirs("data/raw", exist_ok=True)
-        df.to_csv(f"data/raw/{city}_cpcb_pm25.csv", index=False)
+        save_cpcb_pm25(city, pm25)
+        cache.save()
         print(f"PM2.5 for {city}: {pm25} µg/m³")
     else:
         print(f"No PM2.5 data for {city}")
@@ -1,21 +1,24 @@
 """
 Fetch weather for any city.
 """
-import requests
-import pandas as pd
-import os
 import logging
 from datetime import datetime, timedelta
 import sys
+from src.data import raw_store
+from src.data.http_cache import ResponseCache, cached_get
+from src.utils.config import secret
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-from dotenv import load_dotenv
-load_dotenv()
-OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY")
-if not OPENWEATHER_API_KEY:
-    raise ValueError("OPENWEATHER_API_KEY not found in .env")
+WEATHER_BASE = "https://api.openweathermap.org/data/2.5"
+TIMEOUT = 10
+
+def get_api_key():
+    api_key = secret("OPENWEATHER_API_KEY")
+    if not api_key:
+        raise ValueError("OPENWEATHER_API_KEY not found in .env")
+    return api_key
 
 # City → (lat, lon)
 CITY_COORDS = {
@@ -26,16 +29,18 @@ CITY_COORDS = {
     "bhopal": (23.2599, 77.4126)
 }
 
-def fetch_current_weather(city):
-    print(f"Fetching current weather for {city}...")
+def weather_url(base=WEATHER_BASE):
+    return f"{base}/weather"
+
+def weather_params(city, api_key):
     lat, lon = CITY_COORDS[city]
-    url = f"https://api.openweathermap.org/data/2.5/weather?lat={lat}&lon={lon}&appid={OPENWEATHER_API_KEY}&units=metric"
-    response = requests.get(url)
-    if response.status_code != 200:
-        print(f"Error: {response.text}")
-        return pd.DataFrame()
-    data = response.json()
-    record = {
+    return {"lat": lat, "lon": lon, "appid": api_key, "units": "metric"}
+
+def weather_observed(data):
+    return data.get('dt')
+
+def parse_weather(city, data):
+    return {
         'city': city,
         'timestamp': datetime.fromtimestamp(data['dt']).strftime("%Y-%m-%d %H:%M:%S"),
         'temp': data['main']['temp'],
@@ -44,14 +49,26 @@ def fetch_current_weather(city):
         'wind_speed': data['wind']['speed'],
         'rain_1h': data.get('rain', {}).get('1h', 0)
     }
-    df = pd.DataFrame([record])
-    filepath = f"data/raw/{city}_current_weather.csv"
-    os.makedirs("data/raw", exist_ok=True)
-    df.to_csv(filepath, index=False)
-    logger.info(f"Saved → {filepath}")
-    return df
+
+def save_current_weather(record):
+    return raw_store.upsert("weather", [record])
+
+def fetch_current_weather(city):
+    import pandas as pd
+    print(f"Fetching current weather for {city}...")
+    cache = ResponseCache()
+    res = cached_get(weather_url(), params=weather_params(city, get_api_key()), observe=weather_observed,
+                     timeout=TIMEOUT, cache=cache)
+    if res is None:
+        return pd.DataFrame()
+    record = parse_weather(city, res.body)
+    if res.new:
+        save_current_weather(record)
+    cache.save()
+    return pd.DataFrame([record])
 
 def fetch_historical_weather(city):
+    import pandas as pd
     print(f"Fetching historical weather for {city} (mock)...")
     records = []
     for i in range(7):
@@ -65,15 +82,13 @@ def fetch_historical_weather(city):
             'wind_speed': 3.5 + i * 0.2,
             'rain_1h': 0
         })
-    df = pd.DataFrame(records)
-    filepath = f"data/raw/{city}_historical_weather.csv"
-    df.to_csv(filepath, index=False)
-    logger.info(f"Saved 7 mock records → {filepath}")
-    return df
+    # Only fill hours we have no real reading for
+    raw_store.upsert("weather", records, overwrite=False)
+    return pd.DataFrame(records)
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Usage: python src/data/fetch_weather.py <city>")
+        print("Usage: python -m src.data.fetch_weather <city>")
         sys.exit(1)
     city = sys.argv[1].lower()
     if city not in CITY_COORDS:
@@ -0,0 +1,211 @@
+"""
+Columnar historical store.
+
+The Kaggle CSVs in data/historical/ are ingested once into Parquet datasets
+partitioned by City and year, with typed (float32 / dictionary) columns.
+Readers load only the city, columns and date range they ask for; filters are
+pushed down to partition pruning and Parquet row-group statistics.
+
+    python -m src.data.historical_store          # (re)build every table
+"""
+import os
+import sys
+import shutil
+import logging
+import pyarrow as pa
+import pyarrow.csv as pv
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+HIST_DIR = "data/historical"
+STORE_DIR = "data/historical/parquet"
+
+TABLES = {
+    "city_day": "city_day.csv",
+    "station_day": "station_day.csv",
+    "station_hour": "station_hour.csv",
+}
+
+POLLUTANTS = ['PM2.5', 'PM10', 'NO', 'NO2', 'NOx', 'NH3', 'CO', 'SO2', 'O3',
+              'Benzene', 'Toluene', 'Xylene']
+
+COLUMN_TYPES = {
+    'City': pa.string(),
+    'Station': pa.string(),
+    'Datetime': pa.timestamp('s'),
+    'AQI': pa.float32(),
+    'AQI_Bucket': pa.string(),
+    **{p: pa.float32() for p in POLLUTANTS},
+}
+
+PARTITIONING = ds.partitioning(pa.schema([('City', pa.string()), ('year', pa.int16())]), flavor="hive")
+
+
+def table_dir(table, store_dir=STORE_DIR):
+    return os.path.join(store_dir, table)
+
+
+DICTIONARY_COLUMNS = ('Station', 'AQI_Bucket')  # low-cardinality strings, stored dictionary encoded
+BLOCK_BYTES = 16 << 20  # CSV read per batch; the whole file is never in memory
+
+
+def _store_schema(csv_schema):
+    fields = [pa.field(f.name, pa.dictionary(pa.int32(), pa.string())) if f.name in DICTIONARY_COLUMNS else f
+              for f in csv_schema]
+    return pa.schema(fields + [pa.field('year', pa.int16())])
+
+
+def _store_batch(batch, schema):
+    columns = [pc.dictionary_encode(col) if name in DICTIONARY_COLUMNS else col
+               for name, col in zip(batch.schema.names, batch.columns)]
+    columns.append(pc.cast(pc.year(batch.column('Datetime')), pa.int16()))
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def ingest(table, hist_dir=HIST_DIR, store_dir=STORE_DIR, block_bytes=BLOCK_BYTES):
+    """Convert one historical CSV to a City/year partitioned Parquet dataset, one CSV block at a time."""
+    src = os.path.join(hist_dir, TABLES[table])
+    reader = pv.open_csv(src, read_options=pv.ReadOptions(block_size=block_bytes),
+                         convert_options=pv.ConvertOptions(column_types=COLUMN_TYPES))
+    schema = _store_schema(reader.schema)
+    rows = 0
+
+    def batches():
+        nonlocal rows
+        for batch in reader:
+            rows += batch.num_rows
+            yield _store_batch(batch, schema)
+
+    dest = table_dir(table, store_dir)
+    tmp = dest + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    ds.write_dataset(pa.RecordBatchReader.from_batches(schema, batches()), tmp, format="parquet",
+                     partitioning=PARTITIONING, existing_data_behavior="overwrite_or_ignore")
+    shutil.rmtree(dest, ignore_errors=True)
+    os.replace(tmp, dest)
+    logger.info(f"Ingested {rows} rows {src} → {dest}")
+    return dest
+
+
+def is_stale(table, hist_dir=HIST_DIR, store_dir=STORE_DIR):
+    dest = table_dir(table, store_dir)
+    if not os.path.isdir(dest):
+        return True
+    return os.path.getmtime(os.path.join(hist_dir, TABLES[table])) > os.path.getmtime(dest)
+
+
+def ensure_store(table, hist_dir=HIST_DIR, store_dir=STORE_DIR):
+    """Ingest on first use (or when the CSV is newer). Returns False if the store can't be written."""
+    if not is_stale(table, hist_dir, store_dir):
+        return True
+    try:
+        ingest(table, hist_dir, store_dir)
+        return True
+    except OSError as e:
+        logger.warning(f"Could not build {table} store, reading CSV instead: {e}")
+        return False
+
+
+def _as_list(value):
+    if value is None:
+        return None
+    return [value] if isinstance(value, str) else list(value)
+
+
+def open_dataset(table, store_dir=STORE_DIR):
+    return ds.dataset(table_dir(table, store_dir), format="parquet", partitioning=PARTITIONING)
+
+
+def build_filter(city=None, start=None, end=None):
+    expr = None
+
+    def _and(e):
+        return e if expr is None else expr & e
+
+    cities = _as_list(city)
+    if cities:
+        expr = _and(ds.field('City').isin(cities))
+    if start is not None:
+        start = pd.Timestamp(start)
+        expr = _and((ds.field('year') >= start.year) & (ds.field('Datetime') >= start.to_datetime64()))
+    if end is not None:
+        end = pd.Timestamp(end)
+        expr = _and((ds.field('year') <= end.year) & (ds.field('Datetime') <= end.to_datetime64()))
+    return expr
+
+
+def _filter_frame(df, city, columns, start, end):
+    cities = _as_list(city)
+    if cities:
+        df = df[df['City'].isin(cities)]
+    if start is not None:
+        df = df[df['Datetime'] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df['Datetime'] <= pd.Timestamp(end)]
+    return df[columns] if columns else df
+
+
+def _load_csv(table, city, columns, start, end, hist_dir):
+    df = pd.read_csv(os.path.join(hist_dir, TABLES[table]), parse_dates=['Datetime'])
+    return _filter_frame(df, city, columns, start, end)
+
+
+def load_history(table, city=None, columns=None, start=None, end=None,
+                 hist_dir=HIST_DIR, store_dir=STORE_DIR):
+    """
+    Load rows of a historical table for one city (or a list), optional column
+    subset and inclusive Datetime range. Rows are sorted by Datetime.
+    """
+    columns = _as_list(columns)
+    if columns and 'Datetime' not in columns:
+        columns = columns + ['Datetime']
+
+    if not ensure_store(table, hist_dir, store_dir):
+        df = _load_csv(table, city, columns, start, end, hist_dir)
+    else:
+        dataset = open_dataset(table, store_dir)
+        data = dataset.to_table(columns=columns, filter=build_filter(city, start, end))
+        df = data.to_pandas()
+        if columns is None:
+            df = df.drop(columns=['year'])
+    return df.sort_values('Datetime', kind='stable').reset_index(drop=True)
+
+
+def iter_history(table, city=None, columns=None, start=None, end=None, batch_rows=1_000_000,
+                 hist_dir=HIST_DIR, store_dir=STORE_DIR):
+    """
+    Yield a historical table as pandas chunks of at most `batch_rows` rows, in
+    storage order (not sorted), so only one chunk is in memory at a time.
+    Same filters as load_history.
+    """
+    columns = _as_list(columns)
+    if columns and 'Datetime' not in columns:
+        columns = columns + ['Datetime']
+
+    if not ensure_store(table, hist_dir, store_dir):
+        reader = pd.read_csv(os.path.join(hist_dir, TABLES[table]), parse_dates=['Datetime'],
+                             chunksize=batch_rows)
+        for df in reader:
+            df = _filter_frame(df, city, columns, start, end)
+            if len(df):
+                yield df
+        return
+
+    dataset = open_dataset(table, store_dir)
+    # Minimal readahead keeps the scanner from buffering many batches ahead
+    for batch in dataset.to_batches(columns=columns, filter=build_filter(city, start, end),
+                                    batch_size=batch_rows, batch_readahead=1, fragment_readahead=1):
+        if batch.num_rows:
+            df = batch.to_pandas()
+            yield df.drop(columns=['year']) if columns is None else df
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    tables = sys.argv[1:] or list(TABLES)
+    for t in tables:
+        print(f"Ingesting {t}...")
+        ingest(t)
@@ -0,0 +1,165 @@
+"""
+Persistent response cache for the upstream APIs (WAQI, OpenWeather, CPCB).
+
+Entries are keyed by endpoint + params (tokens and API keys are left out of
+the key and never written) and keep the JSON body, ETag / Last-Modified, an
+expiry (Cache-Control max-age, else DEFAULT_TTL) and the observation
+timestamp the body carries. A fetch then
+
+  - skips the network while the entry is fresh,
+  - otherwise revalidates with If-None-Match / If-Modified-Since (304 → cached body),
+  - serves the last good body when the upstream rate-limits or fails,
+
+and reports whether the observation is new, so the pipeline can skip merge
+and train for cities where nothing changed. The file lives next to the raw
+store and is kept with it in the hourly workflow's Actions cache (not in
+git), so "already seen" never outlives the observations it refers to.
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from urllib.parse import urlencode
+
+from src.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = "data/raw/http_cache.json"
+DEFAULT_TTL = 600  # seconds; OpenWeather refreshes ~every 10 min, WAQI hourly
+SECRET_PARAMS = {"token", "appid", "api-key", "api_key", "key"}
+
+
+class CachedResponse:
+    def __init__(self, body, status, new):
+        self.body = body
+        self.status = status  # "fetched" | "not_modified" | "fresh" | "stale"
+        self.new = new        # observation differs from the cached one
+
+
+def body_digest(body):
+    return hashlib.sha256(json.dumps(body, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class ResponseCache:
+    def __init__(self, path=CACHE_PATH, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.entries = self._read()
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except ValueError as e:
+            logger.warning(f"Ignoring unreadable cache {self.path}: {e}")
+            return {}
+
+    @staticmethod
+    def key(url, params=None):
+        public = sorted((k, str(v)) for k, v in (params or {}).items() if k.lower() not in SECRET_PARAMS)
+        return url + ("?" + urlencode(public) if public else "")
+
+    def begin(self, url, params=None, now=None):
+        """(key, CachedResponse if the entry is still fresh else None, conditional request headers)."""
+        key = self.key(url, params)
+        entry = self.entries.get(key)
+        if entry is None:
+            return key, None, {}
+        if (now or time.time()) < entry["expires"]:
+            metrics.inc("http_cache_total", result="fresh")
+            return key, CachedResponse(entry["body"], "fresh", False), {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return key, None, headers
+
+    def _expires(self, response, now):
+        cache_control = response.headers.get("Cache-Control", "")
+        match = re.search(r"max-age=(\d+)", cache_control)
+        if "no-store" in cache_control or "no-cache" in cache_control:
+            return now
+        return now + (int(match.group(1)) if match else self.ttl)
+
+    def complete(self, key, response, observe=None, valid=None, now=None):
+        """
+        Record a 200 or 304 response; returns CachedResponse. Raises ValueError
+        for a body that fails `valid` (e.g. WAQI's 200 + "Over quota"), so the
+        caller falls back instead of caching it.
+        """
+        now = now or time.time()
+        with self._lock:
+            entry = self.entries.get(key)
+            if response.status_code == 304 and entry is not None:
+                entry.update(fetched=now, expires=self._expires(response, now))
+                self._dirty = True
+                metrics.inc("http_cache_total", result="not_modified")
+                return CachedResponse(entry["body"], "not_modified", False)
+
+            body = response.json()
+            if valid is not None and not valid(body):
+                raise ValueError(f"upstream error: {str(body)[:200]}")
+            observed = observe(body) if observe else None
+            observed = str(observed) if observed is not None else body_digest(body)
+            new = entry is None or entry.get("observed") != observed
+            self.entries[key] = {"body": body, "etag": response.headers.get("ETag"),
+                                 "last_modified": response.headers.get("Last-Modified"),
+                                 "fetched": now, "expires": self._expires(response, now), "observed": observed}
+            self._dirty = True
+            metrics.inc("http_cache_total", result="new" if new else "unchanged")
+            return CachedResponse(body, "fetched", new)
+
+    def fallback(self, key, error):
+        """Last good body after a failed fetch (rate limit, outage), or None."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        logger.warning(f"{key}: {error} — serving last good response from {time.ctime(entry['fetched'])}")
+        metrics.inc("http_cache_total", result="stale")
+        return CachedResponse(entry["body"], "stale", False)
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.entries, f, indent=1, sort_keys=True)
+            os.replace(tmp, self.path)
+            self._dirty = False
+
+
+def cached_get(url, params=None, observe=None, valid=None, timeout=10, cache=None):
+    """
+    Blocking conditional GET through the cache, for the single-city fetch scripts.
+    Returns CachedResponse, or None when the fetch failed and nothing is cached.
+    The cache isn't saved here: the caller saves it once the observation is in
+    the raw store, so a failed write can't leave it marked as seen.
+    """
+    import requests
+
+    cache = cache or ResponseCache()
+    key, hit, headers = cache.begin(url, params)
+    if hit is not None:
+        return hit
+    try:
+        response = metrics.timed_get(url, params=params, timeout=timeout, headers=headers)
+        if response.status_code not in (200, 304):
+            raise requests.HTTPError(f"HTTP {response.status_code}: {response.text[:200]}")
+        result = cache.complete(key, response, observe, valid)
+    except (requests.RequestException, ValueError) as e:
+        result = cache.fallback(key, e)
+        if result is None:
+            print(f"Error: {e}")
+            return None
+    return result
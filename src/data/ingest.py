@@ -0,0 +1,217 @@
+"""
+Single-process ingestion engine.
+
+Fetches WAQI, OpenWeather and CPCB for every city concurrently on one
+asyncio loop. Blocking requests calls run on a bounded thread pool that
+shares one keep-alive connection pool; each upstream host gets its own
+concurrency limit, and every call has a timeout plus retry with
+exponential backoff. Responses go through the on-disk cache in
+http_cache.py: fresh entries skip the network, stale ones are revalidated,
+the last good body is served when an upstream rate-limits, and only new
+observations are written to the raw store.
+
+    python -m src.data.ingest                 # all cities
+    python -m src.data.ingest delhi mumbai
+    python -m src.data.ingest --no-cache      # always hit the network
+"""
+import time
+import argparse
+import asyncio
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.data import fetch_aqi, fetch_weather, fetch_cpcb
+from src.data.http_cache import ResponseCache, CachedResponse
+from src.utils import metrics
+from src.utils.config import secret
+
+logger = logging.getLogger(__name__)
+
+CITIES = list(fetch_weather.CITY_COORDS)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    def __init__(self, message, retryable=False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class AsyncFetcher:
+    def __init__(self, max_per_host=4, timeout=10, retries=3, backoff=0.5, max_workers=16, cache=None):
+        self.cache = cache
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fetch")
+        self._host_limits = defaultdict(lambda: asyncio.Semaphore(self.max_per_host))
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+    async def _get(self, url, params, headers, cached):
+        loop = asyncio.get_running_loop()
+        host = urlsplit(url).netloc
+        async with self._host_limits[host]:
+            for attempt in range(self.retries + 1):
+                try:
+                    response = await loop.run_in_executor(
+                        self.executor, partial(metrics.timed_get, url, params=params, timeout=self.timeout,
+                                               session=self.session, headers=headers))
+                    if response.status_code not in (200, 304):
+                        # 4xx other than 429 won't get better by retrying; with a cached
+                        # body to fall back on, a 429 isn't worth more quota either
+                        retryable = response.status_code in RETRY_STATUS and not (
+                            cached and response.status_code == 429)
+                        raise FetchError(f"HTTP {response.status_code} from {host}: {response.text[:200]}",
+                                         retryable=retryable)
+                    return response
+                except (requests.RequestException, FetchError) as e:
+                    retryable = getattr(e, "retryable", True)
+                    if attempt == self.retries or not retryable:
+                        raise FetchError(str(e), retryable) from e
+                    delay = self.backoff * 2 ** attempt
+                    logger.warning(f"{host}: {e} — retry {attempt + 1}/{self.retries} in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+
+    async def get_json(self, url, params=None, observe=None, valid=None):
+        """CachedResponse for url; .new is False when the observation is one we already have."""
+        if self.cache is None:
+            response = await self._get(url, params, {}, cached=False)
+            body = response.json()
+            if valid is not None and not valid(body):
+                raise FetchError(f"upstream error from {urlsplit(url).netloc}: {str(body)[:200]}")
+            return CachedResponse(body, "fetched", True)
+
+        key, hit, headers = self.cache.begin(url, params)
+        if hit is not None:
+            return hit
+        try:
+            response = await self._get(url, params, headers, cached=key in self.cache.entries)
+            return self.cache.complete(key, response, observe, valid)
+        except (FetchError, ValueError) as e:
+            stale = self.cache.fallback(key, e)
+            if stale is None:
+                raise FetchError(str(e)) from e
+            return stale
+
+
+# Each returns (parsed value, whether it is a new observation)
+
+async def _fetch_aqi(fetcher, city, base, token):
+    res = await fetcher.get_json(fetch_aqi.waqi_url(city, base), {"token": token},
+                                 observe=fetch_aqi.waqi_observed, valid=fetch_aqi.waqi_ok)
+    return fetch_aqi.parse_waqi(city, res.body), res.new
+
+
+async def _fetch_weather(fetcher, city, base, api_key):
+    res = await fetcher.get_json(fetch_weather.weather_url(base), fetch_weather.weather_params(city, api_key),
+                                 observe=fetch_weather.weather_observed)
+    return fetch_weather.parse_weather(city, res.body), res.new
+
+
+async def _fetch_cpcb(fetcher, city, url, api_key):
+    params = fetch_cpcb.cpcb_params(city, api_key)
+    if params is None:
+        return None, False
+    res = await fetcher.get_json(url, params, observe=fetch_cpcb.cpcb_observed)
+    return fetch_cpcb.parse_cpcb(res.body), res.new
+
+
+async def fetch_all(cities, fetcher, waqi_base=fetch_aqi.WAQI_BASE, weather_base=fetch_weather.WEATHER_BASE,
+                    cpcb_url=fetch_cpcb.CPCB_URL, waqi_token=None, weather_key=None, cpcb_key=None):
+    """
+    Fetch every source for every city at once. Returns
+    {city: {"aqi": record|None, "weather": record|None, "cpcb": pm25|None, "updated": [sources]}},
+    where "updated" lists the sources whose observation is new since the cached one.
+    """
+    jobs = {}
+    for city in cities:
+        if waqi_token:
+            jobs[(city, "aqi")] = _fetch_aqi(fetcher, city, waqi_base, waqi_token)
+        if weather_key and city in fetch_weather.CITY_COORDS:
+            jobs[(city, "weather")] = _fetch_weather(fetcher, city, weather_base, weather_key)
+        if cpcb_key:
+            jobs[(city, "cpcb")] = _fetch_cpcb(fetcher, city, cpcb_url, cpcb_key)
+
+    results = await asyncio.gather(*jobs.values(), return_exceptions=True)
+    out = {city: {"aqi": None, "weather": None, "cpcb": None, "updated": []} for city in cities}
+    for (city, source), result in zip(jobs, results):
+        if isinstance(result, Exception):
+            logger.error(f"{source} fetch failed for {city}: {result}")
+            continue
+        out[city][source], new = result
+        if new and out[city][source] is not None:
+            out[city]["updated"].append(source)
+    return out
+
+
+def save_results(results):
+    # Cached / revalidated / stale values are already in the raw store
+    with metrics.span("fetch_save") as s:
+        s.rows = 0
+        for city, res in results.items():
+            if "aqi" in res["updated"]:
+                s.rows += fetch_aqi.save_current_aqi(res["aqi"])
+            if "weather" in res["updated"]:
+                s.rows += fetch_weather.save_current_weather(res["weather"])
+            if "cpcb" in res["updated"]:
+                s.rows += fetch_cpcb.save_cpcb_pm25(city, res["cpcb"])
+
+
+def run_ingest(cities=None, mock_history=True, cache=True, **kwargs):
+    """Fetch, save new observations, then (optionally) the mock backfill. cache: True, False or a ResponseCache."""
+    cities = cities or CITIES
+    kwargs.setdefault("waqi_token", secret("WAQI_TOKEN"))
+    kwargs.setdefault("weather_key", secret("OPENWEATHER_API_KEY"))
+    kwargs.setdefault("cpcb_key", secret("CPCB_KEY"))
+    for name, key in [("WAQI_TOKEN", "waqi_token"), ("OPENWEATHER_API_KEY", "weather_key")]:
+        if not kwargs[key]:
+            logger.warning(f"{name} not set — skipping that source")
+
+    fetcher_opts = {k: kwargs.pop(k) for k in ["max_per_host", "timeout", "retries", "backoff"] if k in kwargs}
+    if cache is True:
+        cache = ResponseCache()
+    fetcher = AsyncFetcher(cache=cache or None, **fetcher_opts)
+    start = time.perf_counter()
+    try:
+        with metrics.span("fetch") as s:
+            results = asyncio.run(fetch_all(cities, fetcher, **kwargs))
+            s.rows = sum(len(res["updated"]) for res in results.values())
+    finally:
+        fetcher.close()
+    logger.info(f"Fetched {len(cities)} cities in {time.perf_counter() - start:.2f}s "
+                f"({s.rows} new observations)")
+
+    save_results(results)
+    if cache:
+        # After the save, so a crash can't mark an observation seen that never reached the store
+        cache.save()
+    if mock_history:
+        for city in cities:
+            results[city]["aqi_history"] = fetch_aqi.fetch_historical_aqi(city)
+            if city in fetch_weather.CITY_COORDS:
+                results[city]["weather_history"] = fetch_weather.fetch_historical_weather(city)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch WAQI, OpenWeather and CPCB into the raw store")
+    parser.add_argument("cities", nargs="*", help=f"cities to fetch (default: {' '.join(CITIES)})")
+    parser.add_argument("--no-history", action="store_true", help="skip the mock 7-day backfill")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the HTTP response cache")
+    args = parser.parse_args()
+    run_ingest([c.lower() for c in args.cities] or CITIES, mock_history=not args.no_history,
+               cache=not args.no_cache)
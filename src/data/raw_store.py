@@ -0,0 +1,117 @@
+"""
+Append-only raw observation store.
+
+Every fetch is upserted into a SQLite table keyed on (city, timestamp),
+with timestamps floored to the hour, so re-running an hour is idempotent
+and duplicates collapse instead of piling up. Readers pull only the
+city/time window they need through the primary-key index.
+
+Writes use only the standard library so fetching stays lightweight;
+pandas is imported when a window is read.
+"""
+import os
+import sqlite3
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = "data/raw/aqilytics.db"
+
+# table -> {column: SQLite type}, besides the (city, timestamp) key
+TABLES = {
+    "aqi": {"aqi": "REAL", "pollutants": "TEXT",
+            **{p: "REAL" for p in ["pm25", "pm10", "no2", "o3", "co", "so2"]}},
+    "weather": {"temp": "REAL", "humidity": "REAL", "pressure": "REAL",
+                "wind_speed": "REAL", "rain_1h": "REAL"},
+    "cpcb": {"pm25": "REAL"},
+}
+
+
+def hour_key(ts):
+    """Normalise a timestamp (str or datetime) to 'YYYY-MM-DD HH:00:00'."""
+    if not isinstance(ts, datetime):
+        ts = datetime.fromisoformat(str(ts))
+    return ts.strftime("%Y-%m-%d %H:00:00")
+
+
+def connect(db_path=DB_PATH):
+    os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    for table, columns in TABLES.items():
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ("
+                     "city TEXT NOT NULL, timestamp TEXT NOT NULL, fetched_at TEXT, "
+                     "PRIMARY KEY (city, timestamp)) WITHOUT ROWID")
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for name, sql_type in columns.items():
+            if name not in existing:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN "{name}" {sql_type}')
+    return conn
+
+
+def upsert(table, records, overwrite=True, db_path=DB_PATH):
+    """
+    Insert records keyed on (city, hour). overwrite=False only fills hours
+    that are missing (used for mock backfill so it never clobbers real data).
+    Returns the number of rows inserted or updated.
+    """
+    records = [r for r in records if r is not None]
+    if not records:
+        return 0
+    columns = list(TABLES[table])
+    names = ["city", "timestamp", "fetched_at"] + columns
+    quoted = ", ".join(f'"{n}"' for n in names)
+    placeholders = ", ".join("?" for _ in names)
+    if overwrite:
+        updates = ", ".join(f'"{n}"=excluded."{n}"' for n in ["fetched_at"] + columns)
+        conflict = f"ON CONFLICT(city, timestamp) DO UPDATE SET {updates}"
+    else:
+        conflict = "ON CONFLICT(city, timestamp) DO NOTHING"
+    sql = f"INSERT INTO {table} ({quoted}) VALUES ({placeholders}) {conflict}"
+
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    rows = [[r["city"], hour_key(r["timestamp"]), now] + [r.get(c) for c in columns] for r in records]
+    conn = connect(db_path)
+    try:
+        with conn:
+            before = conn.total_changes
+            conn.executemany(sql, rows)
+            written = conn.total_changes - before
+    finally:
+        conn.close()
+    logger.info(f"Upserted {written}/{len(rows)} rows → {db_path}:{table}")
+    return written
+
+
+def read_window(table, city, start=None, end=None, db_path=DB_PATH):
+    """Rows for one city with start <= timestamp <= end, oldest first."""
+    import pandas as pd
+
+    sql = f"SELECT * FROM {table} WHERE city = ?"
+    params = [city]
+    if start is not None:
+        sql += " AND timestamp >= ?"
+        params.append(hour_key(start))
+    if end is not None:
+        sql += " AND timestamp <= ?"
+        params.append(hour_key(end))
+    sql += " ORDER BY timestamp"
+    conn = connect(db_path)
+    try:
+        df = pd.read_sql_query(sql, conn, params=params)
+    finally:
+        conn.close()
+    return df.drop(columns=["fetched_at"])
+
+
+def latest(table, city, db_path=DB_PATH):
+    """Most recent row for a city as a dict, or None."""
+    conn = connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        row = conn.execute(f"SELECT * FROM {table} WHERE city = ? ORDER BY timestamp DESC LIMIT 1",
+                           (city,)).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row else None
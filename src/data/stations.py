@@ -0,0 +1,185 @@
+"""
+Station-level hourly data as a dense station x hour x pollutant array.
+
+station_hour is loaded once from the historical store into a float32 cube
+(NaN = no reading). City aggregates are numpy reductions over the station
+axis of the city's rows, so a query costs the same whether a city has 2 or
+200 stations and never touches pandas groupby.
+
+    cube = get_cube()
+    cube.aggregate("Delhi", ["PM2.5"], start="2015-01-10")   # mean/max/p90/count per hour
+    station_features(cube, "Delhi")                          # long frame for training
+
+    python -m src.data.stations [city]
+"""
+import os
+import sys
+import threading
+import warnings
+import numpy as np
+import pandas as pd
+
+from src.data.historical_store import HIST_DIR, STORE_DIR, POLLUTANTS, TABLES, load_history
+
+STATIONS_CSV = "stations.csv"
+
+# Station columns → names used by the feature engine / config
+ENGINE_NAMES = {'AQI': 'aqi', 'PM2.5': 'pm25', 'PM10': 'pm10', 'NO2': 'no2', 'CO': 'co', 'O3': 'o3'}
+
+
+def load_stations(hist_dir=HIST_DIR):
+    """{city: [station, ...]} from stations.csv."""
+    df = pd.read_csv(os.path.join(hist_dir, STATIONS_CSV))
+    return {city: g['Station'].tolist() for city, g in df.groupby('City', sort=False)}
+
+
+def _nanpercentile(block, q, count):
+    """np.nanpercentile(block, q, axis=0) (linear), without its per-cell Python loop."""
+    if len(block) == 0:
+        return np.full(count.shape, np.nan)
+    ordered = np.sort(block, axis=0)  # NaNs sort last
+    pos = np.maximum(count - 1, 0) * (q / 100.0)
+    lo = np.floor(pos).astype(int)
+    hi = np.ceil(pos).astype(int)
+    a = np.take_along_axis(ordered, lo[None], axis=0)[0]
+    b = np.take_along_axis(ordered, hi[None], axis=0)[0]
+    out = a + (b - a) * (pos - lo)
+    return np.where(count > 0, out, np.nan)
+
+
+class StationCube:
+    def __init__(self, values, stations, station_city, times, pollutants):
+        self.values = values                      # (n_stations, n_hours, n_pollutants) float32
+        self.stations = np.asarray(stations)
+        self.station_city = np.asarray(station_city)
+        self.times = pd.DatetimeIndex(times)      # contiguous hourly axis
+        self.pollutants = list(pollutants)
+        self._city_rows = {c: np.flatnonzero(self.station_city == c) for c in pd.unique(self.station_city)}
+
+    @classmethod
+    def from_frame(cls, df, pollutants=None, freq="h"):
+        """Scatter long station readings (City, Station, Datetime, pollutants) into the cube."""
+        pollutants = [p for p in (pollutants or ['AQI'] + POLLUTANTS) if p in df.columns]
+        times = pd.to_datetime(df['Datetime'])
+        axis = pd.date_range(times.min().floor(freq), times.max().floor(freq), freq=freq)
+        t = ((times.dt.floor(freq) - axis[0]) // pd.Timedelta(1, unit=freq)).to_numpy()
+        s, stations = pd.factorize(df['Station'], sort=True)
+        station_city = df.groupby('Station', observed=True)['City'].first().reindex(stations).to_numpy()
+
+        values = np.full((len(stations), len(axis), len(pollutants)), np.nan, dtype=np.float32)
+        # Later rows win on duplicate station/hour, like the raw store upserts
+        values[s, t, :] = df[pollutants].to_numpy(dtype=np.float32)
+        return cls(values, stations, station_city, axis, pollutants)
+
+    @property
+    def cities(self):
+        return list(self._city_rows)
+
+    def city_stations(self, city):
+        return self.stations[self._city_rows.get(city, [])].tolist()
+
+    def _hours(self, start=None, end=None):
+        lo = 0 if start is None else self.times.searchsorted(pd.Timestamp(start), side='left')
+        hi = len(self.times) if end is None else self.times.searchsorted(pd.Timestamp(end), side='right')
+        return slice(lo, hi)
+
+    def _pollutant_index(self, pollutants):
+        return [self.pollutants.index(p) for p in (pollutants or self.pollutants)]
+
+    def block(self, city, pollutants=None, start=None, end=None):
+        """(stations, hours, pollutants) copy of one city's readings in the window; only the window is read."""
+        rows = self._city_rows.get(city, np.array([], dtype=int))
+        hours = self._hours(start, end)
+        return self.values[np.ix_(rows, np.arange(hours.start, hours.stop), self._pollutant_index(pollutants))]
+
+    def aggregate(self, city, pollutants=None, start=None, end=None, q=90):
+        """
+        Hourly city series per pollutant: <p>_mean, <p>_max, <p>_p<q> across
+        stations and <p>_count (stations reporting). Hours with no reading are NaN.
+        """
+        pollutants = pollutants or self.pollutants
+        block = self.block(city, pollutants, start, end)
+        hours = self.times[self._hours(start, end)]
+        count = (~np.isnan(block)).sum(axis=0)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)  # all-NaN hours
+            mean = np.nanmean(block, axis=0)
+            vmax = np.nanmax(block, axis=0) if len(block) else np.full(count.shape, np.nan)
+            pct = _nanpercentile(block, q, count)
+
+        out = {'timestamp': hours}
+        for j, p in enumerate(pollutants):
+            out[f"{p}_mean"] = mean[:, j]
+            out[f"{p}_max"] = vmax[:, j]
+            out[f"{p}_p{q}"] = pct[:, j]
+            out[f"{p}_count"] = count[:, j]
+        return pd.DataFrame(out)
+
+    def aggregate_all(self, pollutants=None, start=None, end=None, q=90):
+        """aggregate() for every city, stacked with a City column."""
+        frames = [self.aggregate(c, pollutants, start, end, q).assign(City=c) for c in self.cities]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def load_cube(city=None, start=None, end=None, pollutants=None, hist_dir=HIST_DIR, store_dir=STORE_DIR):
+    columns = ['City', 'Station'] + (pollutants or ['AQI'] + POLLUTANTS)
+    df = load_history("station_hour", city=city, columns=columns, start=start, end=end,
+                      hist_dir=hist_dir, store_dir=store_dir)
+    df['Station'] = df['Station'].astype(str)
+    return StationCube.from_frame(df, pollutants)
+
+
+_cube = None
+_cube_key = None
+_cube_lock = threading.Lock()
+
+
+def get_cube(hist_dir=HIST_DIR, store_dir=STORE_DIR):
+    """Process-wide cube of every station, rebuilt only when station_hour.csv changes."""
+    global _cube, _cube_key
+    key = (hist_dir, store_dir, os.path.getmtime(os.path.join(hist_dir, TABLES["station_hour"])))
+    with _cube_lock:
+        if _cube is None or _cube_key != key:
+            _cube = load_cube(hist_dir=hist_dir, store_dir=store_dir)
+            _cube_key = key
+        return _cube
+
+
+def station_features(cube, city, start=None, end=None):
+    """
+    Long per-station frame for training: city, station, timestamp, the
+    pollutants under their engine names, and each station's deviation from
+    the city mean that hour (<p>_vs_city). Feed it to add_lag_rolling with
+    group_cols=['city', 'station'].
+    """
+    cols = [p for p in cube.pollutants if p in ENGINE_NAMES]
+    block = cube.block(city, cols, start, end)
+    n_st, n_h, n_p = block.shape
+    if n_st == 0:
+        return pd.DataFrame()
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        city_mean = np.nanmean(block, axis=0)
+
+    names = [ENGINE_NAMES[p] for p in cols]
+    flat = block.reshape(n_st * n_h, n_p)
+    dev = (block - city_mean[None]).reshape(n_st * n_h, n_p)
+    df = pd.DataFrame(flat, columns=names)
+    df = pd.concat([df, pd.DataFrame(dev, columns=[f"{n}_vs_city" for n in names])], axis=1)
+    df.insert(0, 'timestamp', np.tile(cube.times[cube._hours(start, end)], n_st))
+    df.insert(0, 'station', np.repeat(cube.city_stations(city), n_h))
+    df.insert(0, 'city', city.lower())
+    # Hours where the station reported nothing are dropped
+    return df[~np.isnan(flat).all(axis=1)].reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    cube = get_cube()
+    print(f"Cube: {len(cube.stations)} stations x {len(cube.times)} hours x {len(cube.pollutants)} pollutants "
+          f"({cube.values.nbytes / 1e6:.1f} MB)")
+    registered = load_stations()
+    for city in sys.argv[1:] or cube.cities:
+        agg = cube.aggregate(city, ['AQI', 'PM2.5'])
+        print(f"{city}: {len(cube.city_stations(city))}/{len(registered.get(city, []))} stations reporting, "
+              f"mean AQI {np.nanmean(agg['AQI_mean']):.1f}, "
+              f"peak station PM2.5 {np.nanmax(agg['PM2.5_max']):.1f}")
@@ -0,0 +1,124 @@
+"""
+Indian National AQI (CPCB NAQI) from raw pollutant concentrations.
+
+Sub-indices are piecewise-linear in the CPCB breakpoint tables, computed
+for whole arrays at once (np.searchsorted for the segment, then one
+interpolation), so AQI can be derived for every station-hour row without an
+API call or a Python loop.
+
+Averaging rules: PM2.5, PM10, NO2, SO2 and NH3 use 24-hour means (at least
+16 valid hours); CO and O3 use the 8-hour maximum. The AQI is the worst
+sub-index, reported only when at least 3 sub-indices are available and one
+of them is PM2.5 or PM10.
+
+    python -m src.features.aqi          # recompute AQI for station_hour.csv
+"""
+import time
+import numpy as np
+import pandas as pd
+
+# Concentration breakpoints (µg/m³, CO in mg/m³) for index 0/50/100/200/300/400/500.
+# The top segment (above the 400 breakpoint) follows the usual CPCB calculator extension.
+INDEX_BREAKPOINTS = np.array([0, 50, 100, 200, 300, 400, 500], dtype=float)
+BREAKPOINTS = {
+    'PM2.5': [0, 30, 60, 90, 120, 250, 380],
+    'PM10': [0, 50, 100, 250, 350, 430, 510],
+    'NO2': [0, 40, 80, 180, 280, 400, 520],
+    'SO2': [0, 40, 80, 380, 800, 1600, 2400],
+    'NH3': [0, 200, 400, 800, 1200, 1800, 2400],
+    'CO': [0, 1.0, 2.0, 10, 17, 34, 51],
+    'O3': [0, 50, 100, 168, 208, 748, 1000],
+}
+BREAKPOINTS = {k: np.array(v, dtype=float) for k, v in BREAKPOINTS.items()}
+
+# (averaging window in hours, aggregation, minimum valid hours)
+AVERAGING = {
+    'PM2.5': (24, 'mean', 16), 'PM10': (24, 'mean', 16), 'NO2': (24, 'mean', 16),
+    'SO2': (24, 'mean', 16), 'NH3': (24, 'mean', 16),
+    'CO': (8, 'max', 1), 'O3': (8, 'max', 1),
+}
+
+# Engine / raw-store spellings
+ALIASES = {'pm25': 'PM2.5', 'pm10': 'PM10', 'no2': 'NO2', 'so2': 'SO2', 'nh3': 'NH3', 'co': 'CO', 'o3': 'O3'}
+
+BUCKETS = np.array(['Good', 'Satisfactory', 'Moderate', 'Poor', 'Very Poor', 'Severe'], dtype=object)
+BUCKET_UPPER = np.array([50, 100, 200, 300, 400])
+
+
+def sub_index(pollutant, conc):
+    """NAQI sub-index for an array of (already averaged) concentrations. NaN stays NaN."""
+    bp = BREAKPOINTS[ALIASES.get(pollutant, pollutant)]
+    conc = np.asarray(conc, dtype=float)
+    x = np.clip(conc, 0, bp[-1])
+    seg = np.clip(np.searchsorted(bp, x, side='right') - 1, 0, len(bp) - 2)
+    lo, hi = bp[seg], bp[seg + 1]
+    ilo, ihi = INDEX_BREAKPOINTS[seg], INDEX_BREAKPOINTS[seg + 1]
+    out = ilo + (x - lo) * (ihi - ilo) / (hi - lo)
+    return np.where(np.isnan(conc), np.nan, out)
+
+
+def bucket(aqi):
+    """AQI category labels (None where AQI is NaN)."""
+    aqi = np.asarray(aqi, dtype=float)
+    labels = BUCKETS[np.searchsorted(BUCKET_UPPER, np.ceil(aqi), side='left')]
+    return np.where(np.isnan(aqi), None, labels)
+
+
+def averaged(df, group_cols=('Station',), time_col='Datetime', pollutants=None):
+    """
+    Concentrations under the NAQI averaging rules, per series: time-based
+    trailing windows, so missing hours are not counted as valid.
+    """
+    group_cols = list(group_cols)
+    pollutants = [p for p in (pollutants or BREAKPOINTS) if p in df.columns]
+    data = df.sort_values(group_cols + [time_col], kind='stable')
+    data = data.assign(**{time_col: pd.to_datetime(data[time_col])})
+    grouped = data.groupby(group_cols, sort=True, observed=True)
+    out = {}
+    for hours, how, min_valid in dict.fromkeys(AVERAGING[p] for p in pollutants):
+        cols = [p for p in pollutants if AVERAGING[p] == (hours, how, min_valid)]
+        roll = grouped.rolling(f"{hours}h", on=time_col, min_periods=1)[cols]
+        # groupby(sort=True) over group+time sorted rows keeps `data` row order
+        values = getattr(roll, how)()
+        valid = roll.count()
+        for c in cols:
+            out[c] = np.where(valid[c].to_numpy() >= min_valid, values[c].to_numpy(), np.nan)
+    return pd.DataFrame(out, index=data.index).reindex(df.index)
+
+
+def compute_aqi(df, average=True, group_cols=('Station',), time_col='Datetime'):
+    """
+    Sub-indices (<p>_SubIndex), AQI and AQI_Bucket for every row of df.
+    Pollutant columns may use either spelling (PM2.5 / pm25). With
+    average=False the concentrations are taken as already averaged.
+    """
+    conc = df.rename(columns=ALIASES)
+    pollutants = [p for p in BREAKPOINTS if p in conc.columns]
+    if average:
+        conc = averaged(conc, group_cols, time_col, pollutants)
+
+    sub = np.column_stack([sub_index(p, conc[p].to_numpy(dtype=float)) for p in pollutants]) \
+        if pollutants else np.empty((len(df), 0))
+    valid = ~np.isnan(sub)
+    has_pm = np.zeros(len(df), dtype=bool)
+    for p in ('PM2.5', 'PM10'):
+        if p in pollutants:
+            has_pm |= valid[:, pollutants.index(p)]
+    ok = (valid.sum(axis=1) >= 3) & has_pm
+    aqi = np.where(ok, np.max(np.where(valid, sub, -np.inf), axis=1, initial=-np.inf), np.nan)
+
+    out = pd.DataFrame(sub, columns=[f"{p}_SubIndex" for p in pollutants], index=df.index)
+    out['AQI'] = np.round(aqi)
+    out['AQI_Bucket'] = bucket(out['AQI'])
+    return out
+
+
+if __name__ == "__main__":
+    from src.data.historical_store import load_history
+
+    df = load_history("station_hour", columns=['Station'] + list(BREAKPOINTS) + ['AQI'])
+    start = time.perf_counter()
+    res = compute_aqi(df)
+    took = time.perf_counter() - start
+    print(f"Computed NAQI for {len(df):,} station-hours in {took:.2f}s ({len(df) / took:,.0f} rows/s)")
+    print(res['AQI_Bucket'].value_counts(dropna=False).to_string())
@@ -0,0 +1,122 @@
+"""
+Config-driven lag / rolling feature engine.
+
+Reads `features.lags` and `features.rolling` from config/config.yaml and
+builds, for every city (or city + station) series:
+
+    <col>_lag_<k>            value exactly k hours earlier (NaN if that hour is missing)
+    <col>_rolling_<w>h       mean over the trailing w hours
+    <col>_rolling_std_<w>h   std over the trailing w hours
+    <col>_rolling_max_<w>h   max over the trailing w hours
+
+Lags are time-exact self-joins and rolling windows are time-based, so gaps
+in the hourly series never shift values onto the wrong hour. Everything is
+one sort + vectorized groupby pass; update_features() recomputes only the
+rows a new batch of hours can affect.
+"""
+import pandas as pd
+
+from src.utils.config import load_config
+
+ROLLING_STATS = {'mean': '{col}_rolling_{w}h', 'std': '{col}_rolling_std_{w}h', 'max': '{col}_rolling_max_{w}h'}
+
+
+def feature_spec(config=None):
+    """Lags, windows and the columns they apply to, from the `features` config section."""
+    feats = (config or load_config())['features']
+    series = [feats['target']] + list(feats['pollutants'])
+    return {
+        'lags': sorted(feats.get('lags', [])),
+        'rolling': sorted(feats.get('rolling', [])),
+        'lag_columns': series,
+        'rolling_columns': series + list(feats.get('weather', [])),
+    }
+
+
+def feature_names(df_columns, spec=None):
+    """Names of the lag/rolling columns the engine adds for a frame with these columns."""
+    spec = spec or feature_spec()
+    names = [f"{c}_lag_{k}" for c in spec['lag_columns'] if c in df_columns for k in spec['lags']]
+    for w in spec['rolling']:
+        for c in spec['rolling_columns']:
+            if c in df_columns:
+                names += [fmt.format(col=c, w=w) for fmt in ROLLING_STATS.values()]
+    return names
+
+
+def lookback_hours(spec=None):
+    spec = spec or feature_spec()
+    return max(spec['lags'] + spec['rolling'] + [0])
+
+
+def shift_hours(df, columns, hours, group_cols=('city',), time_col='timestamp'):
+    """
+    Values of `columns` from exactly `hours` earlier in the same series
+    (negative hours look ahead), aligned row-for-row with df. Missing hours give NaN.
+    """
+    group_cols = list(group_cols)
+    keys = df[group_cols + [time_col]]
+    base = df[group_cols + [time_col] + list(columns)].drop_duplicates(group_cols + [time_col], keep='last')
+    base = base.assign(**{time_col: base[time_col] + pd.Timedelta(hours=hours)})
+    joined = keys.merge(base, on=group_cols + [time_col], how='left')
+    return joined[list(columns)].set_axis(df.index)
+
+
+def add_lag_rolling(df, group_cols=('city',), time_col='timestamp', spec=None):
+    """Return df (sorted by group + time) with every configured lag/rolling column added."""
+    spec = spec or feature_spec()
+    group_cols = list(group_cols)
+    out = df.sort_values(group_cols + [time_col], kind='stable').reset_index(drop=True)
+    out[time_col] = pd.to_datetime(out[time_col])
+    new = {}
+
+    # Lags: join each row to the same series k hours earlier
+    lag_cols = [c for c in spec['lag_columns'] if c in out.columns]
+    for k in spec['lags'] if lag_cols else []:
+        shifted = shift_hours(out, lag_cols, k, group_cols, time_col)
+        for c in lag_cols:
+            new[f"{c}_lag_{k}"] = shifted[c].to_numpy()
+
+    # Rolling: time-based trailing windows per series
+    roll_cols = [c for c in spec['rolling_columns'] if c in out.columns]
+    if roll_cols and spec['rolling']:
+        grouped = out.groupby(group_cols, sort=True)
+        for w in spec['rolling']:
+            window = grouped.rolling(f"{w}h", on=time_col, min_periods=1)[roll_cols]
+            for stat, fmt in ROLLING_STATS.items():
+                # One call per stat over all columns; groupby(sort=True) keeps `out` row order
+                values = getattr(window, stat)()
+                for c in roll_cols:
+                    new[fmt.format(col=c, w=w)] = values[c].to_numpy()
+
+    return pd.concat([out, pd.DataFrame(new, index=out.index)], axis=1)
+
+
+def update_features(features_df, new_rows, group_cols=('city',), time_col='timestamp', spec=None):
+    """
+    Append new hourly rows to an already-featurized frame, recomputing only
+    rows from the earliest new hour onwards (plus the lookback they need).
+    """
+    spec = spec or feature_spec()
+    group_cols = list(group_cols)
+    if features_df is None or features_df.empty:
+        return add_lag_rolling(new_rows, group_cols, time_col, spec)
+
+    new_rows = new_rows.copy()
+    new_rows[time_col] = pd.to_datetime(new_rows[time_col])
+    first_new = new_rows[time_col].min()
+    context_start = first_new - pd.Timedelta(hours=lookback_hours(spec))
+
+    derived = set(feature_names(features_df.columns, spec))
+    base_cols = [c for c in features_df.columns if c not in derived]
+    old_times = pd.to_datetime(features_df[time_col])
+    context = features_df.loc[old_times >= context_start, base_cols]
+    combined = pd.concat([context, new_rows[[c for c in base_cols if c in new_rows.columns]]],
+                         ignore_index=True)
+    combined = combined.drop_duplicates(group_cols + [time_col], keep='last')
+
+    fresh = add_lag_rolling(combined, group_cols, time_col, spec)
+    fresh = fresh[fresh[time_col] >= first_new]
+    kept = features_df[old_times < first_new]
+    out = pd.concat([kept, fresh], ignore_index=True)
+    return out.sort_values(group_cols + [time_col], kind='stable').reset_index(drop=True)
@@ -3,95 +3,133 @@ import pandas as pd
 import os
 import logging
 import sys
+from datetime import datetime, timedelta
+from src.data import raw_store
+from src.features import quality
+from src.features.engine import add_lag_rolling, feature_names
+from src.utils import metrics
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def load_csv(filepath):
-    if not os.path.exists(filepath):
-        raise FileNotFoundError(f"{filepath} not found.")
-    return pd.read_csv(filepath)
-
-def merge_aqi_weather(city):
-    print(f"Merging data for {city}...")
-
-    # Load raw data
-    aqi_current = load_csv(f"data/raw/{city}_current_aqi.csv")
-    aqi_hist    = load_csv(f"data/raw/{city}_historical_aqi.csv")
-    weather_current = load_csv(f"data/raw/{city}_current_weather.csv")
-    weather_hist    = load_csv(f"data/raw/{city}_historical_weather.csv")
-
-    # Combine AQI
-    aqi = pd.concat([aqi_hist, aqi_current], ignore_index=True)
-    aqi['timestamp'] = pd.to_datetime(aqi['timestamp'])
-
-    # Combine Weather
-    weather = pd.concat([weather_hist, weather_current], ignore_index=True)
-    weather['timestamp'] = pd.to_datetime(weather['timestamp'])
-
-    # Merge on timestamp (hourly)
-    merged = pd.merge(aqi, weather, on=['city', 'timestamp'], how='inner')
-
-    # EXTRACT PM2.5 & PM10 FROM WAQI (FALLBACK)
-    def extract_pm(pollutants_str):
-        if pd.isna(pollutants_str) or pollutants_str in ["{}", "null", ""]:
-            return None, None
-        try:
-            data = eval(pollutants_str)
-            pm25 = data.get('pm25') or data.get('pm2.5') or data.get('pm2_5')
-            pm10 = data.get('pm10')
-            return float(pm25) if pm25 else None, float(pm10) if pm10 else None
-        except:
-            return None, None
-
-    merged[['pm25', 'pm10']] = merged['pollutants'].apply(
-        lambda x: pd.Series(extract_pm(x))
-    )
-
-    # OVERRIDE WITH REAL PM2.5 (INDIA)
-    cpcb_path = f"data/raw/{city}_cpcb_pm25.csv"
-    if os.path.exists(cpcb_path):
-        try:
-            cpcb_df = pd.read_csv(cpcb_path)
-            if not cpcb_df.empty and 'pm25' in cpcb_df.columns:
-                real_pm25 = float(cpcb_df.iloc[-1]['pm25'])
-                merged['pm25'] = real_pm25
-                print(f"Using REAL PM2.5 from CPCB: {real_pm25} µg/m³")
-            else:
-                merged['pm25'] = merged['pm25'].fillna(50)
-        except Exception as e:
-            print(f"CPCB read error: {e}")
-            merged['pm25'] = merged['pm25'].fillna(50)
-    else:
-        merged['pm25'] = merged['pm25'].fillna(50)
-
-    # Fallback PM10
-    merged['pm10'] = merged['pm10'].fillna(100)
-
-    # FEATURE ENGINEERING
-    merged = merged.sort_values('timestamp')
-    merged['hour'] = merged['timestamp'].dt.hour
-    merged['is_night'] = merged['hour'].isin([22,23,0,1,2,3,4,5,6]).astype(int)
-
-    merged['pm25_lag_1'] = merged['pm25'].shift(1).fillna(merged['pm25'])
-    merged['temp_rolling_6h'] = merged['temp'].rolling(window=6, min_periods=1).mean()
-    merged['wind_calms'] = (merged['wind_speed'] < 1.5).astype(int)
-
-    # Final features
-    features = [
-        'aqi', 'pm25', 'pm10', 'temp', 'humidity', 'wind_speed',
-        'hour', 'is_night', 'pm25_lag_1', 'temp_rolling_6h', 'wind_calms'
-    ]
-
-    # Save
+# Hours of raw history merge needs (covers the 7-day mock backfill)
+WINDOW_HOURS = 24 * 7
+
+def load_raw(city, hours=WINDOW_HOURS, end=None):
+    """Raw inputs for one city: only the last `hours` of the append-only store."""
+    end = end or datetime.now()
+    start = end - timedelta(hours=hours)
+    with metrics.span("load_raw", city=city) as span:
+        cpcb = raw_store.read_window("cpcb", city, start, end)
+        raw = {
+            'aqi': raw_store.read_window("aqi", city, start, end),
+            'weather': raw_store.read_window("weather", city, start, end),
+            'cpcb_pm25': float(cpcb['pm25'].iloc[-1]) if not cpcb.empty else None,
+        }
+        span.rows = len(raw['aqi']) + len(raw['weather']) + len(cpcb)
+    return raw
+
+POLLUTANTS = ['pm25', 'pm10', 'no2', 'o3', 'co', 'so2']
+WEATHER = ['temp', 'humidity', 'wind_speed', 'pressure', 'rain_1h']
+
+# Key spellings seen in the legacy str(dict)/JSON `pollutants` text
+POLLUTANT_KEYS = {'pm25': r'pm2(?:5|\.5|_5)', 'pm10': 'pm10', 'no2': 'no2',
+                  'o3': 'o3', 'co': 'co', 'so2': 'so2'}
+
+def extract_pollutants(df, names=POLLUTANTS):
+    """
+    Pollutant values as float columns. Typed columns are used as-is; rows
+    that only have the legacy `pollutants` text are decoded in bulk with one
+    vectorized regex per pollutant (no per-row eval / pd.Series).
+    """
+    out = pd.DataFrame(index=df.index)
+    text = df['pollutants'].astype('string') if 'pollutants' in df.columns else None
+    for name in names:
+        if name in df.columns:
+            col = pd.to_numeric(df[name], errors='coerce').astype(float)
+        else:
+            col = pd.Series(float('nan'), index=df.index)
+        missing = col.isna()
+        if text is not None and missing.any():
+            # Decode only rows the typed column doesn't cover
+            pattern = rf"""['"]{POLLUTANT_KEYS[name]}['"]\s*:\s*([-+0-9.eE]+)"""
+            subset = text if missing.all() else text[missing]
+            parsed = subset.str.extract(pattern, expand=False)
+            col[missing] = pd.to_numeric(parsed, errors='coerce').astype(float)
+        out[name] = col
+    return out
+
+def build_features(city, raw):
+    """Merge AQI + weather frames in memory and build model features."""
+    with metrics.span("build_features", city=city) as span:
+        print(f"Merging data for {city}...")
+
+        # Combine AQI
+        aqi = raw['aqi'].copy()
+        aqi['timestamp'] = pd.to_datetime(aqi['timestamp'])
+
+        # Combine Weather
+        weather = raw['weather'].copy()
+        weather['timestamp'] = pd.to_datetime(weather['timestamp'])
+
+        # Merge on timestamp (hourly)
+        merged = pd.merge(aqi, weather, on=['city', 'timestamp'], how='inner')
+
+        # PM2.5 & PM10 FROM WAQI (FALLBACK)
+        merged[POLLUTANTS] = extract_pollutants(merged)
+
+        # Range / stuck / spike checks, then time-aware gap filling (gaps stay NaN if unfillable)
+        merged, report = quality.clean(quality.mask_out_of_range(merged, ['aqi']), columns=POLLUTANTS + WEATHER)
+        quality.record_metrics(report, city=city)
+        logger.info(f"{city} quality:\n{quality.summary(report).to_string()}")
+
+        # OVERRIDE WITH REAL PM2.5 (INDIA)
+        real_pm25 = raw.get('cpcb_pm25')
+        if real_pm25 is not None:
+            merged['pm25'] = real_pm25
+            print(f"Using REAL PM2.5 from CPCB: {real_pm25} µg/m³")
+
+        # FEATURE ENGINEERING
+        merged = merged.sort_values('timestamp')
+        merged['hour'] = merged['timestamp'].dt.hour
+        merged['is_night'] = merged['hour'].isin([22,23,0,1,2,3,4,5,6]).astype(int)
+
+        merged['wind_calms'] = (merged['wind_speed'] < 1.5).astype(int)
+
+        # Lags + rolling mean/std/max from config/config.yaml (features.lags / features.rolling)
+        merged = add_lag_rolling(merged, group_cols=['city'])
+
+        # Final features
+        features = [
+            'aqi', 'pm25', 'pm10', 'temp', 'humidity', 'wind_speed',
+            'hour', 'is_night', 'wind_calms'
+        ] + feature_names(merged.columns)
+
+        span.rows = len(merged)
+        return merged[features + ['timestamp']]
+
+def features_path(city):
+    return f"data/processed/{city}_features.csv"
+
+def save_features(city, df):
     os.makedirs("data/processed", exist_ok=True)
-    filepath = f"data/processed/{city}_features.csv"
-    merged[features + ['timestamp']].to_csv(filepath, index=False)
+    filepath = features_path(city)
+    df.to_csv(filepath, index=False)
     logger.info(f"Saved → {filepath}")
+    return filepath
+
+def load_features(city):
+    # round_trip: the exact floats that were saved, so training fingerprints match the in-memory frame
+    return pd.read_csv(features_path(city), parse_dates=['timestamp'], float_precision="round_trip")
+
+def merge_aqi_weather(city):
+    df = build_features(city, load_raw(city))
+    save_features(city, df)
+    return df
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print("Usage: python src/features/merge_data.py <city>")
+        print("Usage: python -m src.features.merge_data <city>")
         sys.exit(1)
     city = sys.argv[1].lower()
     merge_aqi_weather(city)
\ No newline at end of file
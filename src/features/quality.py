@@ -0,0 +1,263 @@
+"""
+Data quality checks and gap filling for the hourly and daily series.
+
+clean() validates every city (or city + station) series at once:
+
+    schema   group / time columns present, values numeric, one row per timestamp
+    range    readings outside the physical RANGES            → NaN
+    stuck    the same value `stuck_readings` times in a row  → NaN after the first
+             (not for PLATEAU columns such as rain or pressure)
+    spike    |x - rolling median| > spike_z * 1.4826 * MAD   → NaN
+             (centred window of `spike_window` readings, so a sustained
+             episode isn't a spike but a one- or two-reading jump is)
+    gaps     missing timestamps are counted, never inserted
+
+and then fills the NaNs of the `fill` columns:
+
+    gaps up to `max_gap_hours` (`max_gap_days` for daily data) by linear
+    interpolation in time between the neighbouring valid readings (carried
+    over at the ends of a series); longer gaps from the series' seasonal
+    profile, the median by hour of day (by month for daily data). What is
+    still missing stays NaN: XGBoost routes missing values itself, so
+    nothing is zero- or constant-filled.
+
+Every step is one sort + groupby / numpy pass over the whole frame. The
+report has one row per series and column with the count of each finding.
+
+    python -m src.features.quality --table city_day
+"""
+import os
+import argparse
+import numpy as np
+import pandas as pd
+
+from src.utils import metrics
+from src.utils.config import load_config
+
+REPORT_PATH = "data/processed/quality_{name}.csv"
+
+DEFAULTS = {"stuck_readings": 6, "spike_window": 7, "spike_z": 6.0, "max_gap_hours": 6, "max_gap_days": 3}
+
+# Physically plausible values (µg/m³, CO in mg/m³), live and historical column names
+RANGES = {
+    'aqi': (0, 999), 'pm25': (0, 1500), 'pm10': (0, 2000), 'no2': (0, 1000), 'so2': (0, 2500),
+    'co': (0, 100), 'o3': (0, 1000), 'nh3': (0, 2500),
+    'temp': (-30, 55), 'humidity': (0, 100), 'wind_speed': (0, 75), 'pressure': (850, 1100), 'rain_1h': (0, 400),
+}
+RANGES.update({'AQI': RANGES['aqi'], 'PM2.5': RANGES['pm25'], 'PM10': RANGES['pm10'], 'NO2': RANGES['no2'],
+               'SO2': RANGES['so2'], 'CO': RANGES['co'], 'O3': RANGES['o3'], 'NH3': RANGES['nh3']})
+
+# Readings that legitimately hold one value for hours (no rain, integer hPa / %)
+PLATEAU = {'rain_1h', 'pressure', 'humidity'}
+
+CHECKS = ['out_of_range', 'stuck', 'spike']
+FILLS = ['interpolated', 'profile_filled']
+
+
+def quality_config(config=None):
+    q = (config or load_config()).get("quality") or {}
+    return {**DEFAULTS, **{k: v for k, v in q.items() if k in DEFAULTS}}
+
+
+def check_schema(df, group_cols, time_col):
+    missing = [c for c in list(group_cols) + [time_col] if c not in df.columns]
+    if missing:
+        raise ValueError(f"quality check needs columns {missing}")
+
+
+def mask_out_of_range(df, columns):
+    """Copy of df with readings outside RANGES set to NaN (row-local, for labels and chunks)."""
+    out = df.copy()
+    for c in columns:
+        if c in out.columns:
+            lo, hi = RANGES[c]
+            out[c] = out[c].where(out[c].between(lo, hi) | out[c].isna())
+    return out
+
+
+def stuck_mask(x, gid, readings):
+    """Readings after the first of a run of `readings`+ identical values in one series."""
+    same = np.zeros(len(x), dtype=bool)
+    same[1:] = (x[1:] == x[:-1]) & (gid[1:] == gid[:-1])
+    run = np.cumsum(~same) - 1
+    starts = np.flatnonzero(~same)
+    length = np.bincount(run)[run]
+    return same & (length >= readings) & (np.arange(len(x)) > starts[run])
+
+
+def centred_median(x, gid, window, min_periods=3):
+    """Median of each reading's centred window of `window` readings within its series (numpy, no groupby)."""
+    n, before = len(x), window // 2
+    after = window - 1 - before
+    xs = np.r_[np.full(before, np.nan), x, np.full(after, np.nan)]
+    gs = np.r_[np.full(before, -1), gid, np.full(after, -1)]
+    stack = np.empty((window, n))
+    for k in range(window):
+        stack[k] = np.where(gs[k:k + n] == gid, xs[k:k + n], np.nan)
+    stack.sort(axis=0)  # NaNs sort last
+    count = (~np.isnan(stack)).sum(axis=0)
+    lo = np.take_along_axis(stack, (np.maximum(count - 1, 0) // 2)[None, :], axis=0)[0]
+    hi = np.take_along_axis(stack, (count // 2)[None, :], axis=0)[0]
+    return np.where(count >= min_periods, (lo + hi) / 2, np.nan)
+
+
+def spike_mask(x, gid, window, z):
+    """Hampel filter: robust z-score against a centred rolling median / MAD."""
+    med = centred_median(x, gid, window)
+    dev = np.abs(x - med)
+    mad = centred_median(dev, gid, window)
+    # Flat stretches have MAD 0; don't let the tiniest wiggle count as a spike
+    scale = np.maximum(1.4826 * mad, 0.05 * np.abs(med))
+    with np.errstate(invalid='ignore'):
+        return (dev > z * scale) & (scale > 0)
+
+
+def interpolate_in_time(values, gid, hours, max_gap):
+    """Linear in time between the valid readings either side of a gap of at most max_gap hours."""
+    pos = pd.DataFrame(np.where(values.notna(), np.arange(len(values))[:, None], np.nan),
+                       columns=values.columns)
+    prev = pos.groupby(gid).ffill().to_numpy()
+    nxt = pos.groupby(gid).bfill().to_numpy()
+    x = values.to_numpy(dtype=float)
+    out = x.copy()
+    for j in range(x.shape[1]):
+        p, n = prev[:, j], nxt[:, j]
+        hole = np.isnan(x[:, j])
+        pi, ni = np.nan_to_num(p).astype(int), np.nan_to_num(n).astype(int)
+        tp, tn = np.where(np.isnan(p), np.nan, hours[pi]), np.where(np.isnan(n), np.nan, hours[ni])
+        xp, xn = x[pi, j], x[ni, j]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            inner = hole & (tn - tp <= max_gap)
+            weight = (hours - tp) / (tn - tp)
+            out[:, j] = np.where(inner, xp + (xn - xp) * weight, out[:, j])
+            # Ends of a series: carry the nearest reading over a short gap
+            head = hole & np.isnan(p) & (tn - hours <= max_gap)
+            tail = hole & np.isnan(n) & (hours - tp <= max_gap)
+        out[:, j] = np.where(head, xn, np.where(tail, xp, out[:, j]))
+    return pd.DataFrame(out, columns=values.columns, index=values.index)
+
+
+def seasonal_profile(values, gid, times, daily=False):
+    """Per-series median of each column by hour of day (by month for daily data)."""
+    season = times.dt.month if daily else times.dt.hour
+    return values.groupby([gid, season.to_numpy()]).transform('median')
+
+
+def clean(df, columns=None, fill=None, group_cols=('city',), time_col='timestamp', step='1h', config=None):
+    """
+    Validate `columns` (default: every column with a known range) and fill
+    the gaps of `fill` (default: all of them). `step` is the sampling
+    interval of the series. Returns (clean frame sorted by series + time,
+    report DataFrame).
+    """
+    q = quality_config(config)
+    group_cols = list(group_cols)
+    check_schema(df, group_cols, time_col)
+    step = pd.Timedelta(step)
+    daily = step >= pd.Timedelta(days=1)
+    max_gap = q['max_gap_days'] * 24 if daily else q['max_gap_hours']
+
+    out = df.copy()
+    out[time_col] = pd.to_datetime(out[time_col])
+    out = out.sort_values(group_cols + [time_col], kind='stable')
+    dup = out.duplicated(group_cols + [time_col], keep='last')
+    out = out[~dup].reset_index(drop=True)
+    gid = out.groupby(group_cols, sort=False).ngroup().to_numpy()
+
+    columns = [c for c in (columns or RANGES) if c in out.columns]
+    fill = [c for c in (fill if fill is not None else columns) if c in columns]
+    raw = out[columns]
+    x = raw.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float, copy=True)
+    found = {'missing': np.isnan(x), 'not_numeric': np.isnan(x) & raw.notna().to_numpy()}
+    for key in CHECKS + FILLS:
+        found[key] = np.zeros(x.shape, dtype=bool)
+    for j, c in enumerate(columns):
+        lo, hi = RANGES[c]
+        found['out_of_range'][:, j] = (x[:, j] < lo) | (x[:, j] > hi)
+        x[found['out_of_range'][:, j], j] = np.nan
+        if c not in PLATEAU:
+            found['stuck'][:, j] = stuck_mask(x[:, j], gid, q['stuck_readings'])
+            x[found['stuck'][:, j], j] = np.nan
+        found['spike'][:, j] = spike_mask(x[:, j], gid, q['spike_window'], q['spike_z'])
+        x[found['spike'][:, j], j] = np.nan
+
+    if fill:
+        idx = [columns.index(c) for c in fill]
+        values = pd.DataFrame(x[:, idx], columns=fill)
+        hours = ((out[time_col] - out[time_col].min()) / pd.Timedelta(hours=1)).to_numpy()
+        interpolated = interpolate_in_time(values, gid, hours, max_gap)
+        filled = interpolated.fillna(seasonal_profile(values, gid, out[time_col], daily)).to_numpy()
+        before = np.isnan(x[:, idx])
+        found['interpolated'][:, idx] = before & interpolated.notna().to_numpy()
+        found['profile_filled'][:, idx] = before & ~found['interpolated'][:, idx] & ~np.isnan(filled)
+        x[:, idx] = filled
+    out[columns] = x
+
+    return out, quality_report(out, columns, found, gid, group_cols, time_col, step, dup.sum())
+
+
+def quality_report(out, columns, found, gid, group_cols, time_col, step, duplicates=0):
+    """One row per series and column: rows, missing, findings, fills, gap steps, still missing."""
+    keys = out[group_cols].drop_duplicates().reset_index(drop=True)
+    n_series, n_cols = len(keys), len(columns)
+    gaps = out[time_col].diff().to_numpy()
+    first = np.r_[True, gid[1:] != gid[:-1]]
+    missing_steps = np.where(first, 0, np.maximum(gaps / step - 1, 0)).round()
+    rows = np.bincount(gid, minlength=n_series)
+    gap_steps = np.bincount(gid, weights=missing_steps, minlength=n_series).astype(int)
+
+    # Counts per (column, series) in one bincount per finding: bin = column * n_series + series
+    bins = (np.arange(n_cols)[None, :] * n_series + gid[:, None]).ravel()
+    found = {**found, 'still_missing': out[columns].isna().to_numpy()}
+    report = keys.iloc[np.tile(np.arange(n_series), n_cols)].reset_index(drop=True)
+    report = report.assign(rows=np.tile(rows, n_cols), gap_steps=np.tile(gap_steps, n_cols),
+                           column=np.repeat(columns, n_series),
+                           **{k: np.bincount(bins, weights=m.ravel(), minlength=n_cols * n_series).astype(int)
+                              for k, m in found.items()})
+    report.attrs['duplicates'] = int(duplicates)
+    return report
+
+
+def write_report(report, name, path=None):
+    path = path or REPORT_PATH.format(name=name)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    report.to_csv(path, index=False)
+    return path
+
+
+def summary(report):
+    """Totals per column, for logs."""
+    cols = [c for c in ['missing', 'not_numeric'] + CHECKS + FILLS + ['still_missing'] if c in report.columns]
+    return report.groupby('column', sort=False)[cols].sum()
+
+
+def record_metrics(report, **labels):
+    """Gauge per column and finding (quality_rows{column=,check=}) for metrics.prom."""
+    totals = summary(report)
+    for column, row in totals.iterrows():
+        for check, n in row.items():
+            metrics.gauge("quality_rows", int(n), column=column, check=check, **labels)
+
+
+def table_report(table, city=None, **store):
+    """Validate + fill a historical table (per city, or per station for station tables). Returns the report."""
+    from src.data.historical_store import load_history
+
+    groups = ['City'] if table == "city_day" else ['City', 'Station']
+    df = load_history(table, city=city, **store)
+    fill = [c for c in RANGES if c in df.columns and c != 'AQI']
+    _, report = clean(df, fill=fill, group_cols=groups, time_col='Datetime',
+                      step='1h' if table == "station_hour" else '1D')
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quality report for a historical table")
+    parser.add_argument("--table", default="city_day", choices=["city_day", "station_day", "station_hour"])
+    parser.add_argument("--city", action="append", help="restrict to a city (repeatable)")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    report = table_report(args.table, city=args.city)
+    print(summary(report).to_string())
+    print(f"Saved → {write_report(report, args.table, args.out)}")
@@ -0,0 +1,219 @@
+"""
+Rolling-origin backtests over the historical tables.
+
+For each city the table is reduced to one series (station_hour is averaged
+over stations per hour), lag/rolling features come from the feature engine,
+and the target is the AQI exactly h hours later. The last `folds` windows of
+`test_hours` are then scored one origin at a time:
+
+    train: rows whose label is observed by the origin (t + h <= origin),
+           all history (expanding) or only the last `train_hours` (sliding)
+    test:  the `test_hours` after the origin
+
+so no fold ever trains on a label from its own future. Each (city, fold)
+fits one model per horizon in a process pool and reports MAE/RMSE next to a
+persistence baseline (AQI now). Per-city feature matrices are cached as
+Parquet under CACHE_DIR keyed by the input rows + feature spec, so comparing
+model params only pays for the fits; folds are index slices of that matrix.
+
+    python -m src.models.backtest --table city_day --folds 6
+    python -m src.models.backtest --table station_hour --window sliding --train-hours 4320
+"""
+import os
+import json
+import time
+import hashlib
+import argparse
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from concurrent.futures import ProcessPoolExecutor
+
+from src.data.historical_store import HIST_DIR, STORE_DIR, load_history
+from src.features import quality
+from src.features.engine import add_lag_rolling, feature_names, feature_spec
+from src.models.forecast import DEFAULT_PARAMS, TARGET, add_targets, model_horizons
+from src.models.train_historical import CITIES
+from src.utils import fingerprint
+
+CACHE_DIR = "data/processed/backtest_cache"
+RESULTS_PATH = "data/processed/backtest_{table}.csv"
+
+# Historical column names → the feature engine's names
+HIST_COLUMNS = {'AQI': 'aqi', 'PM2.5': 'pm25', 'PM10': 'pm10', 'NO2': 'no2', 'CO': 'co', 'O3': 'o3'}
+CALENDAR = ['hour', 'day', 'month', 'is_weekend']
+
+# Daily rows: lags / windows / horizons in whole days (all in hours)
+DAILY_SPEC = {'lags': [24, 48, 168], 'rolling': [72, 168]}
+DAILY_HORIZONS = [24, 72, 168]
+TEST_HOURS = {'city_day': 30 * 24, 'station_day': 30 * 24, 'station_hour': 7 * 24}
+
+
+def table_spec(table):
+    spec = feature_spec()
+    if table != "station_hour":
+        spec = {**spec, **DAILY_SPEC}
+    return spec
+
+
+def table_horizons(table):
+    return model_horizons() if table == "station_hour" else list(DAILY_HORIZONS)
+
+
+def city_series(table, city, hist_dir=HIST_DIR, store_dir=STORE_DIR):
+    """One row per timestamp for a city: pollutants averaged over its stations, then quality-checked."""
+    df = load_history(table, city=city, columns=list(HIST_COLUMNS), hist_dir=hist_dir, store_dir=store_dir)
+    df = df.rename(columns={**HIST_COLUMNS, 'Datetime': 'timestamp'})
+    df = df.groupby('timestamp', sort=True)[list(HIST_COLUMNS.values())].mean().reset_index()
+    pollutants = [c for c in HIST_COLUMNS.values() if c != TARGET]
+    df, _ = quality.clean(df.assign(city=city), columns=pollutants, step='1h' if table == "station_hour" else '1D')
+    return df
+
+
+def build_matrix(series, spec, horizons):
+    """Features + aqi_h<h> targets for one city's series, sorted by time."""
+    df = add_lag_rolling(series, spec=spec)
+    when = df['timestamp'].dt
+    df['hour'], df['day'], df['month'] = when.hour, when.day, when.month
+    df['is_weekend'] = (when.dayofweek >= 5).astype(int)
+    return add_targets(df, horizons)
+
+
+def matrix_features(columns, spec):
+    return [c for c in list(HIST_COLUMNS.values()) + CALENDAR if c in columns] + feature_names(columns, spec)
+
+
+def cached_matrix(table, city, horizons, cache_dir=CACHE_DIR, hist_dir=HIST_DIR, store_dir=STORE_DIR):
+    """Path of the city's feature matrix, built on a cache miss."""
+    series = city_series(table, city, hist_dir, store_dir)
+    spec = table_spec(table)
+    rows = hashlib.sha256(pd.util.hash_pandas_object(series, index=False).to_numpy().tobytes()).hexdigest()
+    key = fingerprint.digest({"rows": rows, "spec": spec, "horizons": horizons})[:16]
+    path = os.path.join(cache_dir, f"{table}_{city.lower()}_{key}.parquet")
+    if not os.path.exists(path):
+        os.makedirs(cache_dir, exist_ok=True)
+        build_matrix(series, spec, horizons).to_parquet(f"{path}.tmp", index=False)
+        os.replace(f"{path}.tmp", path)
+    return path
+
+
+def rolling_origins(times, folds, test_hours):
+    """The last `folds` origins, test_hours apart, ending test_hours before the final timestamp."""
+    end = times.max()
+    step = pd.Timedelta(hours=test_hours)
+    return [end - step * k for k in range(folds, 0, -1)]
+
+
+def fold_indices(times, origin, horizon, test_hours, window="expanding", train_hours=None):
+    """(train, test) row positions for one origin and horizon, leak-free."""
+    times = times.to_numpy()
+    origin = np.datetime64(origin)
+    h = np.timedelta64(horizon, 'h')
+    train = times + h <= origin
+    if window == "sliding":
+        train &= times > origin - h - np.timedelta64(train_hours, 'h')
+    test = (times > origin) & (times <= origin + np.timedelta64(test_hours, 'h'))
+    return np.flatnonzero(train), np.flatnonzero(test)
+
+
+def run_fold(path, city, fold, origin, horizons, test_hours, window, train_hours, spec, params):
+    """Score one origin for every horizon. Returns error sums so folds pool exactly."""
+    df = pd.read_parquet(path)
+    features = matrix_features(df.columns, spec)
+    X = df[features].to_numpy(dtype=np.float32)
+    rows = []
+    for h in horizons:
+        y = df[f"{TARGET}_h{h}"].to_numpy(dtype=float)
+        train, test = fold_indices(df['timestamp'], origin, h, test_hours, window, train_hours)
+        train, test = train[~np.isnan(y[train])], test[~np.isnan(y[test])]
+        if len(train) < 2 or not len(test):
+            continue
+        model = xgb.XGBRegressor(tree_method='hist', n_jobs=1, **params)
+        model.fit(X[train], y[train])
+        err = np.clip(model.predict(X[test]), 0, 500) - y[test]
+        naive = df[TARGET].to_numpy(dtype=float)[test] - y[test]
+        naive = naive[~np.isnan(naive)]
+        rows.append({"city": city, "horizon": h, "fold": fold, "origin": str(origin), "train_rows": len(train),
+                     "n": len(test), "abs": float(np.abs(err).sum()), "sq": float((err ** 2).sum()),
+                     "naive_n": len(naive), "naive_abs": float(np.abs(naive).sum())})
+    return rows
+
+
+def summarize(fold_rows):
+    """Per-city, per-horizon MAE / RMSE pooled over folds, with the persistence MAE."""
+    folds = pd.DataFrame(fold_rows)
+    if folds.empty:
+        return folds
+    g = folds.groupby(['city', 'horizon'], sort=True)
+    sums = g[['n', 'abs', 'sq', 'naive_n', 'naive_abs']].sum()
+    out = pd.DataFrame({
+        'folds': g['fold'].nunique(),
+        'n': sums['n'],
+        'mae': (sums['abs'] / sums['n']).round(2),
+        'rmse': np.sqrt(sums['sq'] / sums['n']).round(2),
+        'persistence_mae': (sums['naive_abs'] / sums['naive_n'].replace(0, np.nan)).round(2),
+    })
+    return out.reset_index()
+
+
+def run_backtest(table="city_day", cities=None, folds=5, test_hours=None, window="expanding", train_hours=None,
+                 horizons=None, params=None, workers=None, cache_dir=CACHE_DIR,
+                 hist_dir=HIST_DIR, store_dir=STORE_DIR):
+    """Returns (summary, per-fold rows) DataFrames."""
+    if window == "sliding" and not train_hours:
+        raise ValueError("a sliding window needs train_hours")
+    start = time.perf_counter()
+    cities = cities or CITIES
+    horizons = sorted(horizons or table_horizons(table))
+    test_hours = test_hours or TEST_HOURS[table]
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    spec = table_spec(table)
+
+    tasks = []
+    for city in cities:
+        path = cached_matrix(table, city, horizons, cache_dir, hist_dir, store_dir)
+        times = pd.read_parquet(path, columns=['timestamp'])['timestamp']
+        if times.empty:
+            print(f"No rows for {city} — skipped")
+            continue
+        for k, origin in enumerate(rolling_origins(times, folds, test_hours)):
+            tasks.append((path, city, k, origin, horizons, test_hours, window, train_hours, spec, params))
+    print(f"{len(tasks)} folds over {len(cities)} cities, features ready in {time.perf_counter() - start:.1f}s")
+
+    workers = workers or max(1, min(len(tasks), os.cpu_count() or 1))
+    fold_rows = []
+    if workers == 1:
+        for task in tasks:
+            fold_rows.extend(run_fold(*task))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for rows in pool.map(run_fold, *zip(*tasks)):
+                fold_rows.extend(rows)
+    print(f"Backtest done in {time.perf_counter() - start:.1f}s ({workers} workers)")
+    return summarize(fold_rows), pd.DataFrame(fold_rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest per city and horizon")
+    parser.add_argument("--table", default="city_day", choices=["city_day", "station_day", "station_hour"])
+    parser.add_argument("--city", action="append", help="restrict to a city (repeatable)")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--test-hours", type=int, default=None, help="length of each fold's test window")
+    parser.add_argument("--window", choices=["expanding", "sliding"], default="expanding")
+    parser.add_argument("--train-hours", type=int, default=None, help="training window for --window sliding")
+    parser.add_argument("--horizon", type=int, action="append", help="hours ahead (repeatable)")
+    parser.add_argument("--params", type=json.loads, default=None, help='XGBoost overrides, e.g. \'{"max_depth": 6}\'')
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out", default=None, help="summary CSV (default data/processed/backtest_<table>.csv)")
+    args = parser.parse_args()
+
+    summary, _ = run_backtest(args.table, args.city, args.folds, args.test_hours, args.window, args.train_hours,
+                              args.horizon, args.params, args.workers)
+    if summary.empty:
+        print("No folds had enough rows")
+    else:
+        print(summary.to_string(index=False))
+        out = args.out or RESULTS_PATH.format(table=args.table)
+        os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+        summary.to_csv(out, index=False)
+        print(f"Saved → {out}")
@@ -0,0 +1,201 @@
+"""
+Direct multi-horizon AQI forecasting.
+
+Instead of feeding a one-step model its own predictions in a loop, the model
+is trained on the target exactly h hours later for every horizon in config
+`model.horizons` (hours ahead). All cities and all horizons share one
+booster: city is a categorical feature and the horizon a numeric one, each
+training row appearing once per horizon whose label it has. The latest rows
+of every city are stacked once per horizon into one matrix, so every horizon
+for every city comes out of a single predict() call.
+
+A quantile booster (reg:quantileerror) is trained on the same stacked rows
+and fits every quantile in config `model.quantile`, plus the median, at
+once. Its lower/median/upper bands are written into the forecast artifact
+at training time, so the dashboard only reads them.
+
+Explanations are precomputed the same way: XGBoost's TreeSHAP
+(pred_contribs=True) gives every feature's contribution to each city's
+forecast at every horizon in one batched call (the horizon's own
+contribution is part of that horizon's baseline), and the mean
+|contribution| over the training rows is the model's global importance.
+"""
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from src.features.engine import shift_hours
+from src.utils.config import load_config
+
+TARGET = 'aqi'
+MIN_ROWS = 2  # below this a horizon falls back to persistence (current AQI)
+IMPORTANCE_ROWS = 5000  # rows sampled for the global importance summary
+DEFAULT_PARAMS = dict(n_estimators=200, max_depth=4, learning_rate=0.05)
+HORIZON = 'horizon'  # feature column of the stacked matrix
+
+
+def model_horizons(config=None):
+    return sorted((config or load_config())['model']['horizons'])
+
+
+def model_quantiles(config=None):
+    """Configured band quantiles plus the median, ascending."""
+    return sorted(set((config or load_config())['model'].get('quantile', [])) | {0.5})
+
+
+def add_targets(df, horizons, group_cols=('city',), time_col='timestamp'):
+    """Add aqi_h<h> columns: the AQI exactly h hours after each row (NaN if not observed)."""
+    out = df.copy()
+    for h in horizons:
+        out[f"{TARGET}_h{h}"] = shift_hours(out, [TARGET], -h, group_cols, time_col)[TARGET]
+    return out
+
+
+class DirectForecaster:
+    def __init__(self, horizons, features, cities, quantiles=(0.1, 0.5, 0.9), params=None):
+        self.horizons = list(horizons)
+        self.features = list(features)
+        self.cities = sorted(cities)
+        self.quantiles = sorted(quantiles)
+        self.params = params or dict(DEFAULT_PARAMS)
+        self.trained = []  # horizons the booster learned; the rest use persistence
+        self.model = None
+        self.quantile_model = None
+
+    def matrix(self, df):
+        """Feature matrix with city as a fixed categorical, in training column order."""
+        X = df.reindex(columns=self.features).astype(float)
+        X['city'] = pd.Categorical(df['city'], categories=self.cities)
+        return X
+
+    def stacked(self, df):
+        """matrix(df) once per trained horizon (horizon-major), with the horizon as a feature."""
+        X = self.matrix(df)
+        return pd.concat([X.assign(**{HORIZON: float(h)}) for h in self.trained], ignore_index=True)
+
+    def fit(self, df, time_col='timestamp'):
+        data = add_targets(df, self.horizons, time_col=time_col)
+        X = self.matrix(data)
+        parts, labels = [], []
+        self.trained = []
+        for h in self.horizons:
+            y = data[f"{TARGET}_h{h}"]
+            mask = y.notna().to_numpy()
+            if mask.sum() < MIN_ROWS:
+                print(f"Horizon {h}h: {mask.sum()} labelled rows — using persistence")
+                continue
+            self.trained.append(h)
+            parts.append(X[mask].assign(**{HORIZON: float(h)}))
+            labels.append(y[mask])
+        if not parts:
+            return self
+        Xs, ys = pd.concat(parts, ignore_index=True), pd.concat(labels, ignore_index=True)
+        self.model = xgb.XGBRegressor(tree_method='hist', enable_categorical=True, **self.params).fit(Xs, ys)
+        # All quantiles in one booster
+        self.quantile_model = xgb.XGBRegressor(tree_method='hist', enable_categorical=True,
+                                               objective='reg:quantileerror',
+                                               quantile_alpha=np.array(self.quantiles), **self.params).fit(Xs, ys)
+        return self
+
+    def _columns(self):
+        return [self.horizons.index(h) for h in self.trained]
+
+    def predict(self, df):
+        """(n_rows, n_horizons) forecasts for every row of df, clipped to the AQI scale."""
+        out = np.repeat(df[TARGET].to_numpy(dtype=float)[:, None], len(self.horizons), axis=1)
+        if self.trained:
+            pred = np.asarray(self.model.predict(self.stacked(df)))
+            out[:, self._columns()] = pred.reshape(len(self.trained), len(df)).T
+        return np.clip(out, 0, 500)
+
+    def predict_quantiles(self, df):
+        """(n_rows, n_horizons, n_quantiles) bands, sorted so quantiles never cross."""
+        current = df[TARGET].to_numpy(dtype=float)
+        out = np.repeat(current[:, None, None], len(self.horizons), axis=1).repeat(len(self.quantiles), axis=2)
+        if self.trained:
+            pred = np.asarray(self.quantile_model.predict(self.stacked(df)))
+            pred = pred.reshape(len(self.trained), len(df), len(self.quantiles))
+            out[:, self._columns(), :] = pred.transpose(1, 0, 2)
+        return np.clip(np.sort(out, axis=2), 0, 500)
+
+    def contributions(self, df):
+        """
+        (n_rows, n_horizons, n_columns + 1) TreeSHAP contributions, columns as in
+        matrix() and the bias last (including the horizon feature's share).
+        Each row sums to the unclipped prediction; a persistence horizon puts
+        the current AQI in the bias.
+        """
+        out = np.zeros((len(df), len(self.horizons), len(self.features) + 2))
+        out[:, :, -1] = df[TARGET].to_numpy(dtype=float)[:, None]
+        if self.trained:
+            dmatrix = xgb.DMatrix(self.stacked(df), enable_categorical=True)
+            contribs = self.model.get_booster().predict(dmatrix, pred_contribs=True)
+            contribs[:, -1] += contribs[:, -2]  # horizon → baseline
+            contribs = np.delete(contribs, -2, axis=1)
+            out[:, self._columns(), :] = contribs.reshape(len(self.trained), len(df), -1).transpose(1, 0, 2)
+        return out
+
+    def importance(self, df, max_rows=IMPORTANCE_ROWS):
+        """{horizon: {column: mean |contribution|}} over up to max_rows evenly spaced rows of df."""
+        if len(df) > max_rows:
+            df = df.iloc[np.linspace(0, len(df) - 1, max_rows).astype(int)]
+        contribs = np.abs(self.contributions(df)[:, :, :-1]).mean(axis=0)
+        columns = self.features + ['city']
+        return {h: {c: round(float(v), 3) for c, v in zip(columns, contribs[j])}
+                for j, h in enumerate(self.horizons) if h in self.trained}
+
+
+def latest_rows(frames, time_col='timestamp'):
+    """Last row of every city's features, stacked into one frame."""
+    rows = []
+    for city, df in frames.items():
+        if not df.empty:
+            rows.append(df.sort_values(time_col).iloc[[-1]].assign(city=city))
+    return pd.concat(rows, ignore_index=True) if rows else pd.DataFrame()
+
+
+def forecast_frames(forecaster, frames, time_col='timestamp'):
+    """All horizons (+ bands) for all cities from one batched predict. Returns {city: forecast_df}."""
+    latest = latest_rows(frames, time_col)
+    if latest.empty:
+        return {}
+    preds = forecaster.predict(latest)
+    bands = forecaster.predict_quantiles(latest)
+    lower, median, upper = 0, forecaster.quantiles.index(0.5), len(forecaster.quantiles) - 1
+    base_times = pd.to_datetime(latest[time_col])
+    out = {}
+    for i, city in enumerate(latest['city']):
+        out[city] = pd.DataFrame({
+            'timestamp': [base_times.iloc[i] + pd.Timedelta(hours=h) for h in forecaster.horizons],
+            'horizon': forecaster.horizons,
+            'aqi_forecast': np.round(preds[i], 1),
+            'aqi_lower': np.round(bands[i, :, lower], 1),
+            'aqi_median': np.round(bands[i, :, median], 1),
+            'aqi_upper': np.round(bands[i, :, upper], 1),
+        })
+    return out
+
+
+def explain_frames(forecaster, frames, time_col='timestamp'):
+    """
+    Per-city TreeSHAP explanation of the forecasts from forecast_frames(), in
+    one contributions() call: {city: {"features", "values", "horizons", "base",
+    "contributions"}} with one contribution row per horizon.
+    """
+    latest = latest_rows(frames, time_col)
+    if latest.empty:
+        return {}
+    contribs = forecaster.contributions(latest)
+    columns = forecaster.features + ['city']
+    values = latest.reindex(columns=forecaster.features).astype(float)
+    out = {}
+    for i, city in enumerate(latest['city']):
+        out[city] = {
+            "timestamp": str(latest[time_col].iloc[i]),
+            "features": columns,
+            "values": [None if pd.isna(v) else round(float(v), 3) for v in values.iloc[i]] + [city],
+            "horizons": forecaster.horizons,
+            "base": np.round(contribs[i, :, -1], 3).tolist(),
+            "contributions": np.round(contribs[i, :, :-1], 3).tolist(),
+        }
+    return out
@@ -0,0 +1,214 @@
+"""
+Model registry: load trained city models once per process.
+
+City models from train_historical.py are XGBoost boosters in the native
+UBJSON format (models/<city>_model.ubj), described by models/manifest.json
+(features, training window, metrics). Older pickles (<city>_model.pkl) and
+the forecaster from train.py are still read with joblib.
+
+Models load lazily on first use and are cached by path, keyed on file
+mtime/size + content hash, so the dashboard and the API pay the load cost
+once and pick up a new file as soon as the hourly job replaces it. At most
+`max_models` stay resident; the least recently used is dropped first, which
+bounds memory for a server that handles many cities.
+"""
+import os
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from src.utils.fingerprint import file_digest
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = "models"
+MANIFEST = "manifest.json"
+NATIVE_FORMATS = (".ubj", ".json")
+MAX_MODELS = int(os.getenv("AQILYTICS_MAX_MODELS", "64"))
+
+# Feature order used by train_historical.py
+HIST_FEATURES = ['PM2.5', 'PM10', 'NO2', 'CO', 'O3', 'Month', 'Day', 'DayOfWeek', 'IsWeekend']
+
+
+def model_path(city, model_dir=MODEL_DIR):
+    return os.path.join(model_dir, f"{city.lower()}_model.ubj")
+
+
+def legacy_model_path(city, model_dir=MODEL_DIR):
+    return os.path.join(model_dir, f"{city.lower()}_model.pkl")
+
+
+def save_model(model, path):
+    """
+    Write atomically so a running registry never sees a half-written file.
+    .ubj/.json paths get the booster in XGBoost's own format, anything else a pickle.
+    """
+    root, ext = os.path.splitext(path)
+    if ext in NATIVE_FORMATS:
+        booster = model.get_booster() if hasattr(model, "get_booster") else model
+        tmp = f"{root}.tmp{ext}"  # xgboost picks the format from the extension
+        booster.save_model(tmp)
+    else:
+        import joblib
+        tmp = f"{path}.tmp"
+        joblib.dump(model, tmp)
+    os.replace(tmp, path)
+
+
+def read_model(path):
+    if os.path.splitext(path)[1] in NATIVE_FORMATS:
+        import xgboost as xgb
+        return xgb.Booster(model_file=path)
+    import joblib
+    return joblib.load(path)
+
+
+def read_manifest(model_dir=MODEL_DIR):
+    path = os.path.join(model_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {"models": {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def update_manifest(entries, model_dir=MODEL_DIR, **extra):
+    """Merge {city: info} into the manifest (atomic replace); extra keys go at the top level."""
+    manifest = read_manifest(model_dir)
+    manifest["models"].update({city.lower(): info for city, info in entries.items()})
+    manifest.update(extra, updated=datetime.now().isoformat(timespec="seconds"))
+    os.makedirs(model_dir, exist_ok=True)
+    path = os.path.join(model_dir, MANIFEST)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=1, default=str)
+    os.replace(f"{path}.tmp", path)
+    return manifest
+
+
+class ModelRegistry:
+    def __init__(self, model_dir=MODEL_DIR, max_models=MAX_MODELS):
+        self.model_dir = model_dir
+        self.max_models = max_models
+        self._entries = OrderedDict()  # path -> {"stat", "digest", "model"}, least recently used first
+        self._manifest = (None, {"models": {}})
+        self._lock = threading.Lock()
+
+    def _stat(self, path):
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _entry(self, path):
+        try:
+            stat = self._stat(path)
+        except FileNotFoundError:
+            self._entries.pop(path, None)
+            return None
+
+        entry = self._entries.get(path)
+        if entry and entry["stat"] == stat:
+            try:
+                self._entries.move_to_end(path)
+            except KeyError:  # evicted by another thread meanwhile
+                pass
+            return entry
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry["stat"] == stat:
+                return entry
+            digest = file_digest(path)
+            if entry and entry["digest"] == digest:
+                # Touched but identical content: keep the loaded model
+                entry["stat"] = stat
+                return entry
+            entry = {"stat": stat, "digest": digest, "model": read_model(path)}
+            self._entries[path] = entry
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.max_models:
+                evicted, _ = self._entries.popitem(last=False)
+                logger.info(f"Evicted model ← {evicted}")
+            logger.info(f"Loaded model ({digest[:12]}) ← {path}")
+            return entry
+
+    def load(self, path):
+        """Return the model stored at path, reloading it if the file changed. None if missing."""
+        entry = self._entry(path)
+        return entry["model"] if entry else None
+
+    def load_version(self, path):
+        """Content hash of the model currently loaded from path, or None."""
+        entry = self._entry(path)
+        return entry["digest"] if entry else None
+
+    def resident(self):
+        """Paths of the models currently in memory, least recently used first."""
+        return list(self._entries)
+
+    def city_path(self, city):
+        path = model_path(city, self.model_dir)
+        legacy = legacy_model_path(city, self.model_dir)
+        return legacy if not os.path.exists(path) and os.path.exists(legacy) else path
+
+    def get(self, city):
+        """Per-city daily model (models/<city>_model.ubj, or a legacy .pkl)."""
+        return self.load(self.city_path(city))
+
+    def version(self, city):
+        """Content hash of the currently loaded model, or None."""
+        return self.load_version(self.city_path(city))
+
+    def info(self, city):
+        """Manifest entry for a city model (features, training window, metrics), or None."""
+        path = os.path.join(self.model_dir, MANIFEST)
+        try:
+            stat = self._stat(path)
+        except FileNotFoundError:
+            return None
+        if self._manifest[0] != stat:
+            self._manifest = (stat, read_manifest(self.model_dir))
+        return self._manifest[1]["models"].get(city.lower())
+
+    def predict(self, city, X):
+        model = self.get(city)
+        if model is None:
+            return None
+        if hasattr(model, "inplace_predict"):
+            # Raw Booster (train_historical.py): predicts straight from the frame, no DMatrix
+            return model.inplace_predict(X)
+        return model.predict(X)
+
+
+_registry = None
+
+
+def get_registry(model_dir=MODEL_DIR):
+    """Process-wide registry shared by every rerun/session."""
+    global _registry
+    if _registry is None or _registry.model_dir != model_dir:
+        _registry = ModelRegistry(model_dir)
+    return _registry
+
+
+def convert_legacy(model_dir=MODEL_DIR):
+    """Rewrite <city>_model.pkl pickles as UBJSON boosters with a manifest entry."""
+    import glob
+
+    entries = {}
+    for pkl in sorted(glob.glob(os.path.join(model_dir, "*_model.pkl"))):
+        city = os.path.basename(pkl)[:-len("_model.pkl")]
+        model = read_model(pkl)
+        booster = model.get_booster() if hasattr(model, "get_booster") else model
+        path = model_path(city, model_dir)
+        save_model(booster, path)
+        entries[city] = {"file": os.path.basename(path), "format": "ubj", "features": booster.feature_names,
+                         "rounds": booster.num_boosted_rounds(), "converted_from": os.path.basename(pkl)}
+        print(f"Converted {pkl} ({os.path.getsize(pkl):,} B) → {path} ({os.path.getsize(path):,} B)")
+    if entries:
+        update_manifest(entries, model_dir)
+    return entries
+
+
+if __name__ == "__main__":
+    import sys
+    convert_legacy(sys.argv[1] if len(sys.argv) > 1 else MODEL_DIR)
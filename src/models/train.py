@@ -1,83 +1,123 @@
 
 import pandas as pd
-import xgboost as xgb
-from joblib import dump
 import os
+import json
 import sys
-import numpy as np
+import glob
 
-if len(sys.argv) < 2:
-    print("Usage: python src/models/train.py <city>")
-    sys.exit(1)
-city = sys.argv[1].lower()
+from src.features.engine import feature_names
+from src.features.merge_data import load_features
+from src.models.forecast import (DEFAULT_PARAMS, DirectForecaster, model_horizons, model_quantiles, forecast_frames,
+                                 explain_frames)
+from src.models.registry import save_model
+from src.utils import metrics, fingerprint
 
-try:
-    df = pd.read_csv(f"data/processed/{city}_features.csv")
-except FileNotFoundError:
-    print(f"No data for {city}")
-    sys.exit(1)
+MODEL_PATH = "models/xgb_forecaster.pkl"
+IMPORTANCE_PATH = "models/xgb_forecaster_importance.json"
 
-latest = df.iloc[-1:].copy()
-latest['timestamp'] = pd.to_datetime(latest['timestamp'])
-
-features = [
-    'pm25', 'pm10', 'temp', 'humidity', 'wind_speed',
-    'hour', 'is_night', 'pm25_lag_1', 'temp_rolling_6h', 'wind_calms'
+base_features = [
+    'aqi', 'pm25', 'pm10', 'temp', 'humidity', 'wind_speed',
+    'hour', 'is_night', 'wind_calms'
 ]
 
-train_df = df.tail(6).copy()
-if len(train_df) < 2:
-    print("Not enough data. Using mock training...")
-    base_aqi = latest['aqi'].iloc[0]
-    mock = pd.DataFrame({
-        'aqi': np.linspace(base_aqi - 20, base_aqi + 20, 6),
-        'pm25': [latest['pm25'].iloc[0]] * 6,
-        'pm10': [latest['pm10'].iloc[0]] * 6,
-        'temp': np.linspace(latest['temp'].iloc[0] - 2, latest['temp'].iloc[0] + 2, 6),
-        'humidity': [latest['humidity'].iloc[0]] * 6,
-        'wind_speed': [latest['wind_speed'].iloc[0]] * 6,
-        'hour': [(latest['timestamp'].dt.hour.iloc[0] - i) % 24 for i in range(6)],
-        'is_night': [1 if h in [22,23,0,1,2,3,4,5,6] else 0 for h in [(latest['timestamp'].dt.hour.iloc[0] - i) % 24 for i in range(6)]],
-        'pm25_lag_1': [latest['pm25'].iloc[0]] * 6,
-        'temp_rolling_6h': [latest['temp'].iloc[0]] * 6,
-        'wind_calms': [latest['wind_calms'].iloc[0]] * 6,
-    })
-    X = mock[features]
-    y = mock['aqi'].shift(-1).fillna(mock['aqi'])
-else:
-    X = train_df[features]
-    y = train_df['aqi'].shift(-1).fillna(train_df['aqi'])
-
-model = xgb.XGBRegressor(n_estimators=20, learning_rate=0.05, max_depth=3)
-model.fit(X, y)
-
-os.makedirs("models", exist_ok=True)
-dump(model, f"models/xgb_model_{city}.pkl")
-
-current = latest.copy()
-forecast = []
-for _ in range(6):
-    pred = model.predict(current[features])[0]
-    pred = max(0, min(500, pred))
-    forecast.append(round(pred, 1))
-    
-    current['pm25_lag_1'] = current['pm25']
-    current['aqi'] = pred
-    current['timestamp'] = current['timestamp'] + pd.Timedelta(hours=1)
-    current['hour'] = current['timestamp'].dt.hour
-    current['is_night'] = current['hour'].isin([22,23,0,1,2,3,4,5,6]).astype(int)
-    current['temp_rolling_6h'] = current['temp']
-
-future_times = pd.date_range(
-    start=latest['timestamp'].iloc[0] + pd.Timedelta(hours=1),
-    periods=6, freq='h'
-)
-forecast_df = pd.DataFrame({
-    'timestamp': future_times,
-    'aqi_forecast': forecast
-})
-os.makedirs("data/processed", exist_ok=True)
-forecast_df.to_csv(f"data/processed/{city}_forecast.csv", index=False)
-
-print(f"Model saved → models/xgb_model_{city}.pkl")
-print(f"Forecast saved → data/processed/{city}_forecast.csv")
+def model_features(columns):
+    return [c for c in base_features if c in columns] + feature_names(columns)
+
+def forecast_path(city):
+    return f"data/processed/{city}_forecast.csv"
+
+def explain_path(city):
+    return f"data/processed/{city}_explain.json"
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(f"{path}.tmp", path)
+
+def training_fingerprint(frames):
+    """Hash of the features frames actually trained on + feature/model config."""
+    config = fingerprint.config_digest("features", "model",
+                                       extra={"base_features": base_features, "params": DEFAULT_PARAMS,
+                                              "layout": "stacked-horizon"})
+    return fingerprint.make_fingerprint({f"features:{city}": fingerprint.frame_digest(frames[city])
+                                         for city in sorted(frames)}, config)
+
+def training_data(frames):
+    data = pd.concat([df.assign(city=city) for city, df in frames.items()], ignore_index=True)
+    data['timestamp'] = pd.to_datetime(data['timestamp'])
+    return data
+
+def train_forecaster(frames, data=None):
+    """Fit the direct multi-horizon booster (+ quantile bands) on every city's features, all horizons stacked."""
+    data = training_data(frames) if data is None else data
+    forecaster = DirectForecaster(model_horizons(), model_features(data.columns), cities=list(frames),
+                                  quantiles=model_quantiles())
+    with metrics.span("train_fit", cities=len(frames)) as span:
+        span.rows = len(data)
+        return forecaster.fit(data)
+
+def save_artifacts(forecaster, forecasts, explanations=None, importance=None):
+    os.makedirs("models", exist_ok=True)
+    save_model(forecaster, MODEL_PATH)
+    print(f"Model saved → {MODEL_PATH}")
+    if importance is not None:
+        # JSON keys are strings; horizons stay readable as "1", "6", "24"
+        write_json(IMPORTANCE_PATH, {str(h): imp for h, imp in importance.items()})
+
+    os.makedirs("data/processed", exist_ok=True)
+    for city, forecast_df in forecasts.items():
+        forecast_df.to_csv(forecast_path(city), index=False)
+        print(f"Forecast saved → {forecast_path(city)}")
+    for city, explanation in (explanations or {}).items():
+        write_json(explain_path(city), explanation)
+
+def train_all(frames, force=False):
+    """
+    Train on frames (each city's features). Skipped when the frames + config
+    hash the same as the inputs of the current model: the forecasts on disk
+    are returned and the forecaster is None.
+    """
+    fp = training_fingerprint(frames)
+    if not force and fingerprint.is_current("forecaster", fp["fingerprint"]):
+        print(f"Training inputs unchanged ({fp['fingerprint'][:12]}) — reusing {MODEL_PATH}")
+        metrics.inc("train_skipped_total")
+        return None, {city: load_forecast(city) for city in frames}
+
+    data = training_data(frames)
+    forecaster = train_forecaster(frames, data)
+    with metrics.span("train_predict") as span:
+        forecasts = forecast_frames(forecaster, frames)
+        span.rows = len(forecasts)
+    # TreeSHAP contributions for every forecast + global importance, so the dashboard only reads them
+    with metrics.span("train_explain") as span:
+        explanations = explain_frames(forecaster, frames)
+        importance = forecaster.importance(data)
+        span.rows = len(explanations)
+    with metrics.span("save_artifacts"):
+        save_artifacts(forecaster, forecasts, explanations, importance)
+    artifacts = [MODEL_PATH, IMPORTANCE_PATH] + [forecast_path(c) for c in forecasts] \
+        + [explain_path(c) for c in explanations]
+    fingerprint.record_lineage("forecaster", fp, artifacts, rows=int(sum(len(df) for df in frames.values())))
+    return forecaster, forecasts
+
+def load_forecast(city):
+    return pd.read_csv(forecast_path(city), parse_dates=['timestamp'])
+
+if __name__ == "__main__":
+    force = "--force" in sys.argv[1:]
+    cities = [c.lower() for c in sys.argv[1:] if c != "--force"]
+    if not cities:
+        cities = sorted(os.path.basename(p)[:-len("_features.csv")]
+                        for p in glob.glob("data/processed/*_features.csv"))
+    frames = {}
+    for city in cities:
+        try:
+            frames[city] = load_features(city)
+        except FileNotFoundError:
+            print(f"No data for {city}")
+    if not frames:
+        print("Usage: python -m src.models.train [city ...] [--force]  (needs data/processed/<city>_features.csv)")
+        sys.exit(1)
+
+    train_all(frames, force=force)
@@ -0,0 +1,180 @@
+"""
+Out-of-core training over a full historical table (station_hour by default).
+
+train_historical.py holds the whole city_day frame in pandas; that does not
+scale to years of hourly station rows. Here the Parquet store is scanned in
+chunks of --batch-rows through an xgb.DataIter, features are built per chunk
+(all of them row-local, so chunking changes nothing), and XGBoost quantises
+each chunk into an on-disk ExtMemQuantileDMatrix cache. Only one raw chunk
+and the quantised pages being trained on are in memory at a time.
+
+Rows without an AQI label are dropped; missing pollutants are left as NaN
+for XGBoost's missing-value handling instead of being ffilled across rows.
+Every VALID_EVERY-th day is held out by a mask, so no split copy is made,
+and the hold-out MAE is computed by streaming predictions. Peak RSS is
+reported and recorded in the metrics log.
+
+    python -m src.models.train_streaming
+    python -m src.models.train_streaming --city Delhi --batch-rows 500000 --rounds 300
+"""
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import numpy as np
+import xgboost as xgb
+
+from src.data.historical_store import STORE_DIR, HIST_DIR, TABLES, ensure_store, iter_history, open_dataset
+from src.features import quality
+from src.models.registry import save_model, update_manifest
+from src.utils import fingerprint, metrics
+
+FEATURES = ['PM2.5', 'PM10', 'NO2', 'CO', 'O3', 'Hour', 'Month', 'DayOfWeek', 'IsWeekend']
+POLLUTANTS = FEATURES[:5]
+COLUMNS = POLLUTANTS + ['AQI']
+
+PARAMS = {'objective': 'reg:squarederror', 'max_depth': 8, 'eta': 0.05, 'seed': 42,
+          'tree_method': 'hist', 'max_bin': 256}
+N_ROUNDS = 600
+BATCH_ROWS = 1_000_000
+VALID_EVERY = 5  # every 5th calendar day is the hold-out set
+MODEL_NAME = "hourly_model"
+
+
+def chunk_features(df):
+    """
+    (X float32, y, hold-out mask) for one chunk; implausible readings become
+    NaN and rows without AQI are dropped. Chunks arrive in storage order, so
+    the per-series checks of src.features.quality don't apply here.
+    """
+    df = quality.mask_out_of_range(df, ['AQI'] + POLLUTANTS)
+    df = df[df['AQI'].notna()]
+    when = df['Datetime'].dt
+    X = np.empty((len(df), len(FEATURES)), dtype=np.float32)
+    X[:, :len(POLLUTANTS)] = df[POLLUTANTS].to_numpy(dtype=np.float32, na_value=np.nan)
+    X[:, 5] = when.hour
+    X[:, 6] = when.month
+    X[:, 7] = when.dayofweek
+    X[:, 8] = X[:, 7] >= 5
+    days = df['Datetime'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    return X, df['AQI'].to_numpy(dtype=np.float32), days % VALID_EVERY == 0
+
+
+class HistoryIter(xgb.DataIter):
+    """Feeds one subset ("train" or "valid") of a historical table to XGBoost chunk by chunk."""
+
+    def __init__(self, table, cities=None, subset="train", batch_rows=BATCH_ROWS, cache_prefix=None,
+                 hist_dir=HIST_DIR, store_dir=STORE_DIR):
+        self.table = table
+        self.cities = cities
+        self.subset = subset
+        self.batch_rows = batch_rows
+        self.hist_dir = hist_dir
+        self.store_dir = store_dir
+        self.rows = 0
+        self._chunks = None
+        super().__init__(cache_prefix=cache_prefix)
+
+    def chunks(self):
+        """(X, y) for every non-empty chunk of this subset."""
+        for df in iter_history(self.table, city=self.cities, columns=COLUMNS, batch_rows=self.batch_rows,
+                               hist_dir=self.hist_dir, store_dir=self.store_dir):
+            X, y, holdout = chunk_features(df)
+            keep = holdout if self.subset == "valid" else ~holdout
+            if keep.any():
+                yield X[keep], y[keep]
+
+    def reset(self):
+        self._chunks = None
+
+    def next(self, input_data):
+        if self._chunks is None:
+            self._chunks = self.chunks()
+            self.rows = 0
+        chunk = next(self._chunks, None)
+        if chunk is None:
+            return False
+        X, y = chunk
+        input_data(data=X, label=y, feature_names=FEATURES)
+        self.rows += len(y)
+        return True
+
+
+def streaming_mae(booster, data_iter):
+    """MAE of booster over a HistoryIter's subset, predicted one chunk at a time."""
+    total, rows = 0.0, 0
+    for X, y in data_iter.chunks():
+        total += float(np.abs(booster.inplace_predict(X) - y).sum())
+        rows += len(y)
+    return total / rows if rows else None
+
+
+def store_fingerprint(table, cities, rounds, hist_dir=HIST_DIR, store_dir=STORE_DIR):
+    """Fingerprint over the table's Parquet files (or CSV) + the training config."""
+    if ensure_store(table, hist_dir, store_dir):
+        files = open_dataset(table, store_dir).files
+    else:
+        files = [os.path.join(hist_dir, TABLES[table])]
+    config = fingerprint.digest({"params": PARAMS, "rounds": rounds, "features": FEATURES,
+                                 "table": table, "cities": sorted(cities or []), "valid_every": VALID_EVERY})
+    return fingerprint.inputs_fingerprint(files, config)
+
+
+def train_streaming(table="station_hour", cities=None, rounds=N_ROUNDS, batch_rows=BATCH_ROWS, model_dir="models",
+                    cache_dir=None, force=False, hist_dir=HIST_DIR, store_dir=STORE_DIR):
+    """Train MODEL_NAME out of core; returns its manifest info, or None when the inputs are unchanged."""
+    start = time.perf_counter()
+    path = os.path.join(model_dir, f"{MODEL_NAME}.ubj")
+    lineage_path = os.path.join(model_dir, "lineage.json")
+    fp = store_fingerprint(table, cities, rounds, hist_dir, store_dir)
+    if not force and fingerprint.is_current(MODEL_NAME, fp["fingerprint"], lineage_path):
+        print(f"Unchanged → {table} ({fp['fingerprint'][:12]}), keeping {os.path.basename(path)}")
+        return None
+
+    # Quantised pages go to a scratch directory, removed when training ends
+    scratch = tempfile.mkdtemp(prefix="xgb-extmem-", dir=cache_dir)
+    try:
+        with metrics.span("train_streaming", table=table):
+            train_iter = HistoryIter(table, cities, "train", batch_rows, os.path.join(scratch, "train"),
+                                     hist_dir, store_dir)
+            dtrain = xgb.ExtMemQuantileDMatrix(train_iter, max_bin=PARAMS['max_bin'])
+            print(f"Quantised {train_iter.rows} training rows in {time.perf_counter() - start:.1f}s "
+                  f"(peak RSS {metrics.peak_rss_mb():.0f} MB)")
+            booster = xgb.train({**PARAMS, 'nthread': -1}, dtrain, num_boost_round=rounds)
+            train_rows = train_iter.rows
+            del dtrain
+            mae = streaming_mae(booster, HistoryIter(table, cities, "valid", batch_rows, None, hist_dir, store_dir))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    os.makedirs(model_dir, exist_ok=True)
+    save_model(booster, path)
+    peak = metrics.peak_rss_mb()
+    info = {"file": os.path.basename(path), "format": "ubj", "features": FEATURES, "table": table,
+            "cities": cities, "rounds": booster.num_boosted_rounds(), "rows": train_rows,
+            "valid_mae": round(mae, 3) if mae is not None else None,
+            "peak_rss_mb": round(peak, 1) if peak is not None else None,
+            "fingerprint": fp["fingerprint"], "trained_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    fingerprint.record_lineage(MODEL_NAME, fp, [path], lineage_path, rows=train_rows)
+    update_manifest({}, model_dir, hourly=info)
+
+    mae_text = f"{mae:.2f}" if mae is not None else "n/a"
+    print(f"Saved → {info['file']}: {train_rows} rows, hold-out MAE {mae_text}, "
+          f"peak RSS {info['peak_rss_mb']} MB, {time.perf_counter() - start:.1f}s")
+    return info
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Out-of-core AQI training over a historical table")
+    parser.add_argument("--table", default="station_hour", choices=list(TABLES))
+    parser.add_argument("--city", action="append", help="restrict to a city (repeatable)")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS, help="rows read per chunk")
+    parser.add_argument("--rounds", type=int, default=N_ROUNDS)
+    parser.add_argument("--cache-dir", default=None, help="where the external-memory pages go (default: TMPDIR)")
+    parser.add_argument("--force", action="store_true", help="retrain even if the inputs are unchanged")
+    parser.add_argument("--metrics-log", default=None, help="append metrics events to this JSONL file")
+    args = parser.parse_args()
+    if args.metrics_log:
+        metrics.configure(args.metrics_log)
+    train_streaming(args.table, args.city, args.rounds, args.batch_rows, cache_dir=args.cache_dir, force=args.force)
@@ -0,0 +1,395 @@
+"""
+AQI alerting over every city's latest readings and forecasts.
+
+Rules (config `alerts`, per-city overrides under `alerts.cities`):
+
+    bucket     the observed AQI moved up into a worse NAQI bucket, at or above `min_bucket`
+    forecast   some forecast horizon is at or above `threshold`
+    sustained  the observed AQI has been at or above `threshold` for the last `sustained_hours`
+
+All cities are evaluated together on one frame with a row per city (the
+rule parameters are columns), so a run is a handful of vectorised passes
+whatever the number of cities. Hysteresis: an alert opens when its
+condition first holds and then stays open, silently, until the value drops
+below `threshold - clear_margin` (for buckets, below the bucket's lower
+bound minus the margin). An alert that reopens within `cooldown_hours` of
+its last notification is not sent again. Per-city alert state lives in
+data/processed/alert_state.json.
+
+Subscriptions route cities ("*" for all) and optionally rules to a
+recipient on a sink. Each recipient gets one notification per run listing
+all of its alerts, and every sink delivers its notifications in batches.
+A run over some of the cities leaves the saved state of the others as it was,
+and an alert whose every sink failed isn't recorded as sent, so it is retried.
+"""
+import json
+import logging
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.features.aqi import BUCKETS, BUCKET_UPPER
+from src.utils import metrics
+from src.utils.config import load_config, secret
+
+logger = logging.getLogger(__name__)
+
+STATE_PATH = "data/processed/alert_state.json"
+DEFAULTS = {"threshold": 300, "sustained_hours": 3, "min_bucket": "Poor", "clear_margin": 20,
+            "cooldown_hours": 6}
+BUCKET_LOWER = np.r_[0, BUCKET_UPPER + 1]
+RULE_STATE = {"bucket": ["bucket_level", "bucket_sent"], "forecast": ["forecast_open", "forecast_sent"],
+              "sustained": ["sustained_open", "sustained_sent"]}
+
+
+def alert_config(config=None):
+    return (config or load_config()).get("alerts") or {}
+
+
+def city_rules(cities, config=None):
+    """One row per city with its rule parameters (defaults < config < per-city overrides)."""
+    alerts = alert_config(config)
+    base = {**DEFAULTS, **{k: v for k, v in alerts.items() if k in DEFAULTS}}
+    rules = pd.DataFrame(base, index=pd.Index(sorted(set(cities)), name="city"))
+    overrides = pd.DataFrame.from_dict(alerts.get("cities") or {}, orient="index")
+    overrides = overrides.reindex(index=rules.index, columns=[c for c in overrides.columns if c in DEFAULTS])
+    rules.update(overrides)
+    rules["min_bucket"] = rules["min_bucket"].map(lambda b: list(BUCKETS).index(b))
+    return rules.astype({"threshold": float, "sustained_hours": int, "clear_margin": float,
+                         "cooldown_hours": float, "min_bucket": int})
+
+
+def bucket_index(aqi):
+    """NAQI bucket position (0 = Good … 5 = Severe) for an array of AQI values."""
+    return np.searchsorted(BUCKET_UPPER, np.ceil(np.asarray(aqi, dtype=float)), side='left')
+
+
+def _stack(frames, columns, tail=None):
+    """{city: frame} → one long frame of `columns` plus city, built from numpy arrays (no per-city pandas ops)."""
+    items = [(city, df) for city, df in frames.items() if df is not None and len(df)]
+    if not items:
+        return pd.DataFrame(columns=['city'] + columns)
+    rows = slice(-tail, None) if tail else slice(None)
+    arrays = [[df[c].to_numpy()[rows] for c in columns] for _, df in items]
+    out = {c: np.concatenate([a[i] for a in arrays]) for i, c in enumerate(columns)}
+    out['city'] = np.repeat([city for city, _ in items], [len(a[0]) for a in arrays])
+    return pd.DataFrame(out)
+
+
+def stack_features(features, tail=48):
+    """The last `tail` rows of every city's features as one (city, timestamp, aqi) frame."""
+    out = _stack(features, ['timestamp', 'aqi'], tail)
+    out['timestamp'] = pd.to_datetime(out['timestamp'])
+    out['aqi'] = out['aqi'].astype(float)
+    return out.dropna(subset=['aqi'])
+
+
+def stack_forecasts(forecasts):
+    """Every city's forecast as one (city, horizon, aqi_forecast) frame."""
+    return _stack(forecasts, ['horizon', 'aqi_forecast']).astype({'horizon': float, 'aqi_forecast': float})
+
+
+def observed_state(series, rules):
+    """Latest AQI and the trailing run of consecutive hours at or above threshold, per city."""
+    if series.empty:
+        return pd.DataFrame({'aqi': np.nan, 'run_hours': 0}, index=rules.index)
+    df = series.sort_values(['city', 'timestamp'], kind='stable')
+    above = df['aqi'].to_numpy() >= rules['threshold'].reindex(df['city']).to_numpy()
+    city = df['city'].to_numpy()
+    new_city = np.r_[True, city[1:] != city[:-1]]
+    gap = np.r_[True, np.diff(df['timestamp'].to_numpy()) != np.timedelta64(1, 'h')]
+    # A run restarts at every new city, missing hour or hour below threshold
+    segment = np.cumsum(new_city | gap | ~above)
+    run = pd.Series(above.astype(int)).groupby(segment).cumsum().to_numpy() * above
+    last = np.r_[new_city[1:], True]
+    out = pd.DataFrame({'aqi': df['aqi'].to_numpy()[last], 'run_hours': run[last]},
+                       index=pd.Index(city[last], name='city'))
+    return out.reindex(rules.index)
+
+
+def forecast_state(forecasts, rules):
+    """Worst forecast and the first horizon at or above threshold, per city."""
+    if forecasts.empty:
+        return pd.DataFrame({'forecast_max': np.nan, 'horizon': np.nan}, index=rules.index)
+    thr = rules['threshold'].reindex(forecasts['city']).to_numpy()
+    first = forecasts['horizon'].where(forecasts['aqi_forecast'].to_numpy() >= thr)
+    g = forecasts.assign(first=first).groupby('city')
+    return pd.DataFrame({'forecast_max': g['aqi_forecast'].max(), 'horizon': g['first'].min()}).reindex(rules.index)
+
+
+def read_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    with open(path) as f:
+        return pd.DataFrame.from_dict(json.load(f), orient="index")
+
+
+def write_state(state, path=STATE_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.tmp", "w") as f:
+        f.write(state.to_json(orient="index"))
+    os.replace(f"{path}.tmp", path)
+
+
+def merge_state(previous, new):
+    """The saved state with the evaluated cities' rows replaced; cities not in this run keep theirs."""
+    if previous.empty:
+        return new
+    return pd.concat([previous.drop(index=new.index, errors="ignore"), new]).sort_index()
+
+
+def _column(state, name, default):
+    return state[name] if name in state else pd.Series(default, index=state.index)
+
+
+def evaluate(series, forecasts, rules, state, now):
+    """
+    Vectorised rule pass. Returns (alerts frame, new state frame); state has
+    per city the open bucket level plus open/last-sent per threshold rule.
+    """
+    obs = observed_state(series, rules)
+    fc = forecast_state(forecasts, rules)
+    state = state.reindex(rules.index)
+    new = pd.DataFrame(index=rules.index)
+    thr = rules['threshold'].to_numpy()
+    margin = rules['clear_margin'].to_numpy()
+    aqi = obs['aqi'].to_numpy(dtype=float)
+    now_s = float(now.timestamp())
+    alerts = []
+
+    cooldown = rules['cooldown_hours'].to_numpy() * 3600
+
+    # Bucket crossings: the level rises with the AQI and only falls once the AQI is clearly below it
+    bidx = np.where(np.isnan(aqi), -1, bucket_index(np.nan_to_num(aqi)))
+    level = _column(state, 'bucket_level', np.nan).to_numpy(dtype=float)
+    level = np.where(np.isnan(level), rules['min_bucket'].to_numpy() - 1, level).astype(int)
+    rise = (bidx > level) & (bidx >= rules['min_bucket'].to_numpy())
+    sent = _column(state, 'bucket_sent', np.nan).to_numpy(dtype=float)
+    fire = rise & ~(now_s - sent < cooldown)
+    lower = BUCKET_LOWER[np.clip(level, 0, len(BUCKET_LOWER) - 1)]
+    clear = ~np.isnan(aqi) & (aqi < lower - margin)
+    new['bucket_level'] = np.where(rise, bidx,
+                                   np.where(clear, np.maximum(bidx, rules['min_bucket'].to_numpy() - 1), level))
+    new['bucket_sent'] = np.where(fire, now_s, sent)
+    alerts.append(pd.DataFrame({'city': rules.index[fire], 'rule': 'bucket', 'value': aqi[fire],
+                                'threshold': BUCKET_LOWER[bidx[fire]], 'horizon': np.nan, 'hours': np.nan,
+                                'bucket': BUCKETS[bidx[fire]]}))
+
+    # Threshold rules: (condition, value, first horizon, run length)
+    fmax = fc['forecast_max'].to_numpy(dtype=float)
+    run = obs['run_hours'].to_numpy(dtype=float)
+    nan = np.full(len(rules), np.nan)
+    checks = {
+        "forecast": (fmax >= thr, fmax, fc['horizon'].to_numpy(dtype=float), nan),
+        "sustained": (run >= rules['sustained_hours'].to_numpy(), aqi, nan, run),
+    }
+    for rule, (cond, value, horizon, hours) in checks.items():
+        was_open = _column(state, f'{rule}_open', False).eq(True).to_numpy()
+        sent = _column(state, f'{rule}_sent', np.nan).to_numpy(dtype=float)
+        fire = cond & ~was_open & ~(now_s - sent < cooldown)
+        still = np.where(np.isnan(value), was_open, value >= thr - margin)
+        new[f'{rule}_open'] = cond | (was_open & still)
+        new[f'{rule}_sent'] = np.where(fire, now_s, sent)
+        alerts.append(pd.DataFrame({'city': rules.index[fire], 'rule': rule, 'value': value[fire],
+                                    'threshold': thr[fire], 'horizon': horizon[fire], 'hours': hours[fire],
+                                    'bucket': BUCKETS[bucket_index(value[fire])]}))
+
+    out = pd.concat(alerts, ignore_index=True)
+    out['value'] = out['value'].round(1)
+    out['time'] = now.isoformat(timespec="seconds")
+    return out, new
+
+
+def message(alert):
+    city, value = alert['city'].title(), alert['value']
+    if alert['rule'] == "bucket":
+        return f"{city}: AQI {value:.0f} is now {alert['bucket']}"
+    if alert['rule'] == "forecast":
+        return f"{city}: AQI forecast {value:.0f} ({alert['bucket']}) within {alert['horizon']:.0f}h"
+    return f"{city}: AQI {value:.0f}, at or above {alert['threshold']:.0f} for {alert['hours']:.0f}h"
+
+
+def _as_list(value):
+    return [value] if isinstance(value, str) else list(value or ["*"])
+
+
+def subscriptions_frame(subscriptions):
+    """Config subscriptions → one row per (city or "*", rule or "*", sink, to)."""
+    rows = [{"city": city.lower(), "rule": rule, "sink": sub.get("sink", "log"), "to": sub["to"]}
+            for sub in subscriptions or []
+            for city in _as_list(sub.get("cities", "*"))
+            for rule in _as_list(sub.get("rules", "*"))]
+    return pd.DataFrame(rows, columns=["city", "rule", "sink", "to"])
+
+
+def route(alerts, subscriptions):
+    """One notification per (sink, recipient) holding all of its alerts."""
+    subs = subscriptions_frame(subscriptions)
+    if alerts.empty or subs.empty:
+        return {}
+    alerts = alerts.assign(message=[message(a) for a in alerts.to_dict("records")])
+    specific = alerts.merge(subs[subs['city'] != "*"], on="city")
+    wildcard = alerts.merge(subs[subs['city'] == "*"].drop(columns="city"), how="cross")
+    matched = pd.concat([specific, wildcard], ignore_index=True)
+    matched = matched[(matched['rule_y'] == "*") | (matched['rule_x'] == matched['rule_y'])]
+    matched = matched.rename(columns={'rule_x': 'rule'}).drop(columns='rule_y')
+    matched = matched.drop_duplicates(['sink', 'to', 'city', 'rule'])
+    matched = matched.sort_values(['sink', 'to', 'city', 'rule'], kind='stable')
+    columns = ['city', 'rule', 'value', 'threshold', 'horizon', 'hours', 'bucket', 'time', 'message']
+    records = matched[columns].astype(object).where(matched[columns].notna(), None).to_dict("records")
+    # Rows are sorted, so each recipient's alerts are contiguous
+    notifications, key, current = {}, None, None
+    for sink, to, record in zip(matched['sink'], matched['to'], records):
+        if (sink, to) != key:
+            key, current = (sink, to), {"to": to, "alerts": []}
+            notifications.setdefault(sink, []).append(current)
+        current["alerts"].append(record)
+    return notifications
+
+
+class Sink:
+    """Delivers notifications ({"to", "alerts"}) in batches of batch_size."""
+    batch_size = 100
+
+    def send(self, notifications):
+        for i in range(0, len(notifications), self.batch_size):
+            self.send_batch(notifications[i:i + self.batch_size])
+        return len(notifications)
+
+    def send_batch(self, batch):
+        raise NotImplementedError
+
+
+class LogSink(Sink):
+    def send_batch(self, batch):
+        for n in batch:
+            logger.warning(f"alert → {n['to']}: " + "; ".join(a['message'] for a in n['alerts']))
+
+
+class MemorySink(Sink):
+    """Keeps every batch, for tests and dry runs."""
+
+    def __init__(self, batch_size=100):
+        self.batch_size = batch_size
+        self.batches = []
+
+    def send_batch(self, batch):
+        self.batches.append(batch)
+
+
+class WebhookSink(Sink):
+    """One JSON POST {"notifications": [...]} per batch."""
+
+    def __init__(self, url, batch_size=100, timeout=10):
+        self.url = url
+        self.batch_size = batch_size
+        self.timeout = timeout
+
+    def send_batch(self, batch):
+        import requests
+
+        start = time.perf_counter()
+        response = requests.post(self.url, json={"notifications": batch}, timeout=self.timeout)
+        metrics.observe("alert_webhook_seconds", time.perf_counter() - start, status=response.status_code)
+        response.raise_for_status()
+
+
+class SmtpSink(Sink):
+    """One email per recipient, every batch over a single SMTP session."""
+
+    def __init__(self, host, port=587, user=None, password=None, sender="alerts@aqilytics", batch_size=100):
+        self.host, self.port, self.user, self.password = host, port, user, password
+        self.sender = sender
+        self.batch_size = batch_size
+
+    def send_batch(self, batch):
+        import smtplib
+        from email.message import EmailMessage
+
+        with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+            if self.user:
+                smtp.starttls()
+                smtp.login(self.user, self.password)
+            for n in batch:
+                msg = EmailMessage()
+                msg["From"], msg["To"] = self.sender, n["to"]
+                msg["Subject"] = f"AQILytics: {len(n['alerts'])} air quality alert(s)"
+                msg.set_content("\n".join(a['message'] for a in n['alerts']))
+                smtp.send_message(msg)
+
+
+def build_sinks(config=None):
+    """Sinks from the `alerts.sinks` config + secrets; webhook / smtp only when configured."""
+    opts = alert_config(config).get("sinks") or {}
+    sinks = {"log": LogSink()}
+    if secret("ALERT_WEBHOOK_URL"):
+        sinks["webhook"] = WebhookSink(secret("ALERT_WEBHOOK_URL"), **opts.get("webhook", {}))
+    if secret("SMTP_HOST"):
+        sinks["smtp"] = SmtpSink(secret("SMTP_HOST"), user=secret("SMTP_USER"), password=secret("SMTP_PASSWORD"),
+                                 **opts.get("smtp", {}))
+    return sinks
+
+
+def dispatch(notifications, sinks):
+    """Send every sink's notifications. Returns the names of the sinks that failed."""
+    failed = set()
+    for name, batch in notifications.items():
+        sink = sinks.get(name)
+        if sink is None:
+            logger.warning(f"No '{name}' sink configured — logging {len(batch)} notification(s) instead")
+            sink = sinks.get("log") or LogSink()
+        try:
+            metrics.inc("alert_notifications_total", sink.send(batch), sink=name)
+        except Exception as e:
+            logger.error(f"{name} sink failed: {type(e).__name__}: {e}")
+            metrics.inc("alert_sink_errors_total", sink=name)
+            failed.add(name)
+    return failed
+
+
+def undelivered(notifications, failed):
+    """(city, rule) of the alerts routed only to failed sinks."""
+    def pairs(sinks):
+        return {(a['city'], a['rule']) for name in sinks for n in notifications[name] for a in n['alerts']}
+    return pairs(failed) - pairs(set(notifications) - failed)
+
+
+def restore_state(state, previous, pending):
+    """Put back the previous state of the pending (city, rule) alerts, so the next run fires them again."""
+    previous = previous.reindex(state.index)
+    for rule in {r for _, r in pending}:
+        mask = state.index.isin([c for c, r in pending if r == rule])
+        for col in RULE_STATE[rule]:
+            old = _column(previous, col, np.nan)
+            state[col] = state[col].where(~mask, old.eq(True) if col.endswith("_open") else old)
+    return state
+
+
+def run_alerts(features, forecasts, now=None, config=None, state_path=STATE_PATH, sinks=None, save=True):
+    """
+    Evaluate every city, notify subscribers and save the alert state (unless save=False).
+    features / forecasts: {city: frame}. Returns the alerts frame.
+    """
+    now = now or pd.Timestamp.now()
+    cities = set(features) | set(forecasts)
+    if not cities:
+        return pd.DataFrame()
+    rules = city_rules(cities, config)
+    with metrics.span("alerts", cities=len(rules)) as span:
+        previous = read_state(state_path)
+        alerts, state = evaluate(stack_features(features, int(rules['sustained_hours'].max()) + 1),
+                                 stack_forecasts(forecasts), rules, previous, now)
+        span.rows = len(alerts)
+        notifications = route(alerts, alert_config(config).get("subscriptions"))
+        failed = dispatch(notifications, sinks if sinks is not None else build_sinks(config))
+        pending = undelivered(notifications, failed)
+        if pending:
+            logger.warning(f"{len(pending)} alert(s) not delivered, will retry next run")
+            state = restore_state(state, previous, pending)
+        if save:
+            write_state(merge_state(previous, state), state_path)
+    for rule, n in alerts['rule'].value_counts().items():
+        metrics.inc("alerts_total", int(n), rule=rule)
+    return alerts
@@ -0,0 +1,38 @@
+"""
+Project configuration (config/config.yaml) and API secrets, each loaded once
+per process.
+"""
+import os
+from functools import lru_cache
+
+CONFIG_PATH = "config/config.yaml"
+
+# Read from the environment, or from .env when python-dotenv is installed
+SECRETS = ("WAQI_TOKEN", "OPENWEATHER_API_KEY", "CPCB_KEY",
+           "ALERT_WEBHOOK_URL", "SMTP_HOST", "SMTP_USER", "SMTP_PASSWORD")
+
+
+@lru_cache(maxsize=None)
+def load_config(path=CONFIG_PATH):
+    import yaml
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found.")
+    with open(path) as f:
+        return yaml.safe_load(f) or {}
+
+
+@lru_cache(maxsize=None)
+def load_secrets():
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+    return {name: os.getenv(name) for name in SECRETS}
+
+
+def secret(name):
+    """API key / token by env var name; None when unset."""
+    load_secrets()  # .env is read once; the environment stays the source of truth
+    return os.getenv(name) or None
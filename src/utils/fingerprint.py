@@ -0,0 +1,94 @@
+"""
+Content fingerprints for skip-if-unchanged training, plus model lineage.
+
+A training fingerprint is the sha256 of every input file together with a
+digest of the feature/model config, so identical inputs + config always map
+to the same key no matter how many hours passed. models/lineage.json records
+which fingerprint produced which artifact (and that artifact's own hash), so
+a trainer can tell that the model on disk already matches its inputs.
+"""
+import os
+import json
+import hashlib
+from datetime import datetime
+
+from src.utils.config import load_config
+
+LINEAGE_PATH = "models/lineage.json"
+HISTORY = 48  # lineage records kept per artifact
+
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def digest(value):
+    """sha256 of a JSON-able value (dict keys sorted)."""
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def config_digest(*sections, extra=None):
+    """Digest of the named config.yaml sections plus any code-side settings passed in extra."""
+    config = load_config()
+    return digest({"config": {s: config.get(s) for s in sections}, "extra": extra})
+
+
+def frame_digest(df):
+    """
+    sha256 of a frame's rows. Ints/bools hash as float64 and datetimes as ns, so a
+    frame and its CSV round trip (read with float_precision="round_trip") agree.
+    """
+    import pandas as pd
+
+    canonical = df.astype({c: "float64" for c in df.columns if df[c].dtype.kind in "iub"}
+                          | {c: "datetime64[ns]" for c in df.columns if df[c].dtype.kind == "M"})
+    return hashlib.sha256(pd.util.hash_pandas_object(canonical, index=False).values.tobytes()).hexdigest()
+
+
+def make_fingerprint(inputs, config):
+    """inputs: {name: content hash}. Returns {"inputs", "config", "fingerprint"}."""
+    return {"inputs": dict(inputs), "config": config, "fingerprint": digest([inputs, config])}
+
+
+def inputs_fingerprint(paths, config):
+    """Fingerprint over the sha256 of each input file. Missing files raise FileNotFoundError."""
+    return make_fingerprint({path: file_digest(path) for path in sorted(paths)}, config)
+
+
+def read_lineage(path=LINEAGE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def current(name, path=LINEAGE_PATH):
+    """Latest lineage record for an artifact name, or None."""
+    history = read_lineage(path).get(name)
+    return history[-1] if history else None
+
+
+def is_current(name, fingerprint, path=LINEAGE_PATH):
+    """True when `name` was last built from this fingerprint and its files are still the ones it wrote."""
+    record = current(name, path)
+    if record is None or record["fingerprint"] != fingerprint:
+        return False
+    return all(os.path.exists(p) and file_digest(p) == sha for p, sha in record["artifacts"].items())
+
+
+def record_lineage(name, fp, artifacts, path=LINEAGE_PATH, **info):
+    """Append {fingerprint, inputs, config, artifacts: {path: sha256}} for name; keeps the last HISTORY."""
+    lineage = read_lineage(path)
+    record = {"fingerprint": fp["fingerprint"], "inputs": fp["inputs"], "config": fp["config"],
+              "artifacts": {p: file_digest(p) for p in artifacts},
+              "built_at": datetime.now().isoformat(timespec="seconds"), **info}
+    lineage[name] = (lineage.get(name, []) + [record])[-HISTORY:]
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(lineage, f, indent=1, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+    return record
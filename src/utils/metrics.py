@@ -0,0 +1,237 @@
+"""
+Lightweight instrumentation: spans, counters and latency histograms.
+
+    from src.utils import metrics
+
+    with metrics.span("merge", city="delhi") as s:
+        df = build(...)
+        s.rows = len(df)
+
+    response = metrics.timed_get(url, params=..., timeout=10)   # HTTP latency histogram
+
+Every finished span updates in-process counters (seconds, runs, rows, peak
+RSS) and, when a JSONL path is configured (metrics.configure() or the
+AQILYTICS_METRICS_LOG env var), appends one JSON event per span. to_prometheus()
+renders everything in the Prometheus text format; the pipeline writes it to
+data/processed/metrics.prom and the API serves it on /metrics.
+"""
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "aqilytics"
+JSONL_PATH = os.getenv("AQILYTICS_METRICS_LOG")
+PROM_PATH = "data/processed/metrics.prom"
+
+# Seconds; WAQI/OpenWeather calls are usually 0.1–2 s
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Span:
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+        self.rows = None
+        self.status = "ok"
+        self.seconds = None
+
+
+class Metrics:
+    def __init__(self, jsonl_path=JSONL_PATH):
+        self.jsonl_path = jsonl_path
+        self._lock = threading.Lock()
+        self._written = {}  # path -> monotonic time of the last write_prometheus
+        self.reset()
+
+    def reset(self):
+        self.counters = {}    # (name, labels) -> value
+        self.gauges = {}
+        self.histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+
+    # Recording
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        with self._lock:
+            self.gauges[(name, _key(labels))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, _key(labels))
+        with self._lock:
+            h = self.histograms.get(key)
+            if h is None:
+                h = self.histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    h[i] += 1
+            h[len(LATENCY_BUCKETS)] += 1
+            h[-1] += value
+
+    def event(self, record):
+        if not self.jsonl_path:
+            return
+        line = json.dumps({"ts": time.strftime("%Y-%m-%dT%H:%M:%S"), "pid": os.getpid(), **record}, default=str)
+        try:
+            os.makedirs(os.path.dirname(self.jsonl_path) or ".", exist_ok=True)
+            with self._lock, open(self.jsonl_path, "a") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            logger.warning(f"Could not write metrics log {self.jsonl_path}: {e}")
+
+    @contextmanager
+    def span(self, name, **labels):
+        s = Span(name, labels)
+        start = time.perf_counter()
+        try:
+            yield s
+        except BaseException:
+            s.status = "error"
+            raise
+        finally:
+            s.seconds = time.perf_counter() - start
+            rss = peak_rss_mb()
+            self.inc("span_seconds_total", s.seconds, span=name, **labels)
+            self.inc("span_runs_total", 1, span=name, status=s.status, **labels)
+            self.gauge("span_last_seconds", s.seconds, span=name, **labels)
+            if s.rows is not None:
+                self.inc("span_rows_total", s.rows, span=name, **labels)
+            if rss is not None:
+                self.gauge("peak_rss_megabytes", rss)
+            self.event({"type": "span", "span": name, **labels, "status": s.status,
+                        "seconds": round(s.seconds, 6), "rows": s.rows,
+                        "peak_rss_mb": round(rss, 1) if rss is not None else None})
+
+    def timed_get(self, url, params=None, timeout=None, session=None, headers=None):
+        """requests GET that records http_request_seconds{host, status}."""
+        import requests
+
+        host = urlsplit(url).netloc
+        start = time.perf_counter()
+        status = "error"
+        try:
+            response = (session or requests).get(url, params=params, timeout=timeout, headers=headers)
+            status = response.status_code
+            return response
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe("http_request_seconds", seconds, host=host, status=status)
+            self.event({"type": "http", "host": host, "status": status, "seconds": round(seconds, 6)})
+
+    # Cross-process: worker processes export, the parent merges
+
+    def export(self):
+        with self._lock:
+            return {"counters": list(self.counters.items()), "gauges": list(self.gauges.items()),
+                    "histograms": list(self.histograms.items())}
+
+    def merge(self, exported):
+        with self._lock:
+            for key, value in exported["counters"]:
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, value in exported["gauges"]:
+                self.gauges[key] = max(self.gauges.get(key, value), value) if key[0] == "peak_rss_megabytes" \
+                    else value
+            for key, h in exported["histograms"]:
+                cur = self.histograms.get(key)
+                self.histograms[key] = list(h) if cur is None else [a + b for a, b in zip(cur, h)]
+
+    # Export
+
+    def to_prometheus(self):
+        def fmt(name, labels, value, extra=()):
+            pairs = list(labels) + list(extra)
+            body = ",".join(f'{k}="{v}"' for k, v in pairs)
+            return f"{PREFIX}_{name}{{{body}}} {value}" if body else f"{PREFIX}_{name} {value}"
+
+        lines = []
+        with self._lock:
+            for kind, store in (("counter", self.counters), ("gauge", self.gauges)):
+                for name in sorted({n for n, _ in store}):
+                    lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+                    lines += [fmt(name, labels, value) for (n, labels), value in sorted(store.items()) if n == name]
+            for name in sorted({n for n, _ in self.histograms}):
+                lines.append(f"# TYPE {PREFIX}_{name} histogram")
+                for (n, labels), h in sorted(self.histograms.items()):
+                    if n != name:
+                        continue
+                    # Buckets are stored cumulatively already
+                    for bound, count in zip(LATENCY_BUCKETS, h):
+                        lines.append(fmt(f"{name}_bucket", labels, count, [("le", bound)]))
+                    lines.append(fmt(f"{name}_bucket", labels, h[len(LATENCY_BUCKETS)], [("le", "+Inf")]))
+                    lines.append(fmt(f"{name}_sum", labels, h[-1]))
+                    lines.append(fmt(f"{name}_count", labels, h[len(LATENCY_BUCKETS)]))
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=PROM_PATH, min_interval=0):
+        """
+        Atomically replace path with to_prometheus(). Skipped (returns None) when
+        this registry wrote the same path less than min_interval seconds ago.
+        """
+        now = time.monotonic()
+        with self._lock:
+            last = self._written.get(path)
+            if last is not None and now - last < min_interval:
+                return None
+            self._written[path] = now
+        directory = os.path.dirname(path) or "."
+        os.makedirs(directory, exist_ok=True)
+        # A temp file of its own per write, so concurrent writers (threads) never replace each other's
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=f"{os.path.basename(path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(self.to_prometheus())
+            os.chmod(tmp, 0o644)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return path
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    return _metrics
+
+
+def configure(jsonl_path=None):
+    """Turn on the JSONL event log for this process."""
+    _metrics.jsonl_path = jsonl_path
+
+
+# Module-level shortcuts on the process-wide registry
+span = _metrics.span
+inc = _metrics.inc
+gauge = _metrics.gauge
+observe = _metrics.observe
+timed_get = _metrics.timed_get
+write_prometheus = _metrics.write_prometheus
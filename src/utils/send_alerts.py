@@ -1,126 +1,56 @@
+"""
+Evaluate the alert rules on the saved features + forecasts and notify subscribers.
 
-import os
-import json
-from pathlib import Path
-
-# CONFIG
-ROOT = Path.cwd()
-print(f"Project Root: {ROOT}")
-
-# 1. CHECK REQUIRED FOLDERS
-folders = {
-    "src/data": "Data fetching scripts",
-    "src/features": "Data processing",
-    "src/models": "Model training",
-    "data/raw": "Raw API data",
-    "data/processed": "Merged features",
-    "models": "Trained models",
-    ".github/workflows": "GitHub Actions"
-}
-
-print("\nFOLDER STRUCTURE:")
-missing_folders = []
-for folder, desc in folders.items():
-    path = ROOT / folder
-    exists = path.exists()
-    print(f"  {'✓' if exists else '✗'} {folder.ljust(25)} → {desc}")
-    if not exists:
-        missing_folders.append(folder)
-
-if missing_folders:
-    print(f"\nACTION: Create missing folders:")
-    for f in missing_folders:
-        print(f"  mkdir -p {f}")
-else:
-    print("  All folders present")
-
-# 2. CHECK CRITICAL FILES
-files = {
-    "app.py": "Streamlit dashboard",
-    "requirements.txt": "Python dependencies",
-    ".gitignore": "Git ignore rules",
-    "src/data/fetch_aqi.py": "WAQI API fetcher",
-    "src/data/fetch_weather.py": "Weather fetcher",
-    "src/features/merge_data.py": "Data merger",
-    "src/models/train.py": "XGBoost trainer",
-    "src/utils/send_alerts.py": "Email alerts (MISSING?)",
-    ".github/workflows/update.yml": "Auto-update workflow"
-}
+The pipeline runs the same engine after training; this is for a manual or
+separate scheduled run.
 
-print("\nCRITICAL FILES:")
-missing_files = []
-for file, desc in files.items():
-    path = ROOT / file
-    exists = path.exists()
-    status = '✓' if exists else '✗'
-    print(f"  {status} {file.ljust(40)} → {desc}")
-    if not exists:
-        missing_files.append(file)
-
-# 3. CHECK .gitignore CONTENT
-gitignore_path = ROOT / ".gitignore"
-if gitignore_path.exists():
-    content = gitignore_path.read_text().strip()
-    required = ["data/", "models/", ".venv/", "__pycache__/", ".streamlit/"]
-    print(f"\n.gitignore CHECK:")
-    for req in required:
-        present = req in content
-        print(f"  {'✓' if present else '✗'} {req}")
-else:
-    print(".gitignore MISSING")
-
-# 4. TEST DATA GENERATION (MUMBAI ONLY)
-print(f"\nTESTING DATA PIPELINE (mumbai only)...")
-city = "mumbai"
-
-try:
-    print("  → Fetching AQI...")
-    os.system(f"python src/data/fetch_aqi.py {city}")
-    print("  → Fetching Weather...")
-    os.system(f"python src/data/fetch_weather.py {city}")
-    print("  → Merging data...")
-    os.system(f"python src/features/merge_data.py {city}")
-    print("  → Training model...")
-    os.system(f"python src/models/train.py {city}")
-    print("  PIPELINE SUCCESS")
-except:
-    print("  PIPELINE FAILED")
-
-# 5. CHECK app.py CAN LOAD DATA
-print(f"\nTESTING app.py DATA LOAD...")
-try:
-    import pandas as pd
-    current_path = ROOT / f"data/processed/{city}_features.csv"
-    forecast_path = ROOT / f"data/processed/{city}_forecast.csv"
-    if current_path.exists() and forecast_path.exists():
-        current = pd.read_csv(current_path)
-        forecast = pd.read_csv(forecast_path)
-        print(f"  current.csv: {len(current)} rows")
-        print(f"  forecast.csv: {len(forecast)} rows")
-        print(f"  Columns: {list(current.columns)}")
-        print("  app.py CAN LOAD DATA")
-    else:
-        print("  DATA FILES MISSING AFTER PIPELINE")
-except Exception as e:
-    print(f"  ERROR: {e}")
-
-# 6. FINAL REPORT
-print(f"\nFINAL REPORT (Nov 16, 2025 06:50 PM IST)")
-print("="*60)
-if not missing_folders and not missing_files:
-    print("PROJECT 100% INTACT")
-    print("NO FILES DELETED")
-    print("send_alerts.py → NEVER EXISTED IN CORE (optional feature)")
-    print("READY FOR CLOUD DEPLOY")
-else:
-    print("ISSUES FOUND:")
-    if missing_folders:
-        print("  • Missing folders → run mkdir commands above")
-    if missing_files:
-        print("  • Missing files:")
-        for f in missing_files:
-            print(f"    - {f}")
-    if "src/utils/send_alerts.py" in missing_files:
-        print("  • send_alerts.py → was an optional alert module (not core)")
-print("="*60)
-print("RUN: streamlit run app.py → Should work")
\ No newline at end of file
+    python -m src.utils.send_alerts                 # every city with features on disk
+    python -m src.utils.send_alerts delhi --dry-run # log instead of sending
+"""
+import os
+import sys
+import glob
+import argparse
+import logging
+
+import pandas as pd
+
+from src.features.merge_data import load_features
+from src.models.train import forecast_path, load_forecast
+from src.utils import alerts
+
+
+def load_inputs(cities):
+    features, forecasts = {}, {}
+    for city in cities:
+        try:
+            features[city] = load_features(city)
+        except FileNotFoundError:
+            print(f"No features for {city}")
+        if os.path.exists(forecast_path(city)):
+            forecasts[city] = load_forecast(city)
+    return features, forecasts
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Evaluate AQI alert rules and notify subscribers")
+    parser.add_argument("cities", nargs="*", help="cities (default: every data/processed/<city>_features.csv)")
+    parser.add_argument("--dry-run", action="store_true", help="log notifications instead of sending them")
+    parser.add_argument("--state", default=alerts.STATE_PATH, help="alert state file")
+    args = parser.parse_args()
+
+    cities = [c.lower() for c in args.cities] or sorted(
+        os.path.basename(p)[:-len("_features.csv")] for p in glob.glob("data/processed/*_features.csv"))
+    features, forecasts = load_inputs(cities)
+    if not features and not forecasts:
+        print("Nothing to evaluate (run the pipeline first)")
+        sys.exit(1)
+
+    # A dry run logs every notification and leaves the alert state as it was
+    sinks = dict.fromkeys(["log", "webhook", "smtp"], alerts.LogSink()) if args.dry_run else None
+    fired = alerts.run_alerts(features, forecasts, now=pd.Timestamp.now(), state_path=args.state, sinks=sinks,
+                              save=not args.dry_run)
+    print(f"{len(fired)} alert(s) over {len(set(features) | set(forecasts))} cities")
+    if len(fired):
+        print(fired[['city', 'rule', 'value', 'threshold', 'horizon', 'bucket']].to_string(index=False))
@@ -0,0 +1,212 @@
+"""
+Per-city dashboard snapshots.
+
+The pipeline writes data/processed/<city>_dashboard.json with everything
+app.py draws: latest readings, the 30-day AQI series, a downsampled
+PM2.5/AQI scatter, the forecast (with bands) and its top feature
+contributions per horizon. The app loads one small
+JSON per city, memoized on the file's mtime/size, so a rerun does no CSV
+parsing or pandas work.
+
+    python -m src.visualization.snapshot          # rebuild every city's snapshot
+"""
+import os
+import json
+import time
+import logging
+import numpy as np
+import pandas as pd
+
+from src.data.historical_store import load_history
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = "data/processed"
+
+# Display name → pipeline key
+DASHBOARD_CITIES = {"Delhi": "delhi", "Mumbai": "mumbai", "Bengaluru": "bangalore",
+                    "Kolkata": "kolkata", "Chennai": "chennai"}
+
+# Used when a city has no merged live data yet: (aqi, pm25, pm10, no2, humidity)
+FALLBACK_LIVE = {
+    "Delhi": (415, 280, 340, 68, 72),
+    "Mumbai": (168, 85, 140, 42, 78),
+    "Bengaluru": (82, 48, 95, 28, 68),
+    "Kolkata": (195, 110, 185, 55, 80),
+    "Chennai": (124, 68, 115, 38, 74),
+}
+
+TREND_DAYS = 30
+SCATTER_POINTS = 500
+TOP_CONTRIBUTIONS = 8
+
+
+def snapshot_path(city_key, snapshot_dir=SNAPSHOT_DIR):
+    return os.path.join(snapshot_dir, f"{city_key}_dashboard.json")
+
+
+def snapshot_version(city_key, snapshot_dir=SNAPSHOT_DIR):
+    """(mtime_ns, size) of the snapshot file, or None if it doesn't exist. Used as the cache key."""
+    try:
+        st = os.stat(snapshot_path(city_key, snapshot_dir))
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _value(features, col, default=0.0):
+    """Latest reading of col; quality-checked features keep unfillable gaps as NaN, so take the last valid one."""
+    if col in features.columns:
+        valid = features[col].dropna()
+        if len(valid):
+            return float(valid.iloc[-1])
+    return default
+
+
+def latest_readings(city, features):
+    if features is None or features.empty or pd.isna(features['aqi'].iloc[-1]):
+        aqi, pm25, pm10, no2, humidity = FALLBACK_LIVE[city]
+        return {"aqi": aqi, "pm25": pm25, "pm10": pm10, "no2": no2, "humidity": humidity,
+                "timestamp": None, "fallback": True}
+    row = features.iloc[-1]
+    return {
+        "aqi": int(row['aqi']),
+        "pm25": _value(features, 'pm25'),
+        "pm10": _value(features, 'pm10'),
+        "no2": _value(features, 'no2'),
+        "humidity": _value(features, 'humidity', 65.0),
+        "timestamp": str(row['timestamp']) if 'timestamp' in row else None,
+        "fallback": False,
+    }
+
+
+def history_series(hist):
+    """30-day AQI trend and a downsampled PM2.5 vs AQI scatter from city_day."""
+    aqi = hist.dropna(subset=['AQI']) if 'AQI' in hist.columns else hist.iloc[0:0]
+    out = {"rows": int(len(aqi)), "trend": [round(float(v), 1) for v in aqi['AQI'].tail(TREND_DAYS)],
+           "has_pm25": bool(len(hist) and 'PM2.5' in hist.columns), "scatter": None}
+    if out["has_pm25"]:
+        pts = hist[['PM2.5', 'AQI']].dropna()
+        if len(pts) > SCATTER_POINTS:
+            # Evenly spaced rows keep the seasonal spread of the full history
+            pts = pts.iloc[np.linspace(0, len(pts) - 1, SCATTER_POINTS).astype(int)]
+        out["scatter"] = {
+            "pm25": pts['PM2.5'].round(1).tolist(),
+            "aqi": pts['AQI'].round(1).tolist(),
+            # simulated realistic humidity
+            "humidity": (60 + (pts['AQI'] / 10).clip(upper=30)).round(1).tolist(),
+            "n": int(len(pts)),
+        }
+    return out
+
+
+def forecast_series(forecast):
+    if forecast is None or forecast.empty:
+        return None
+    out = {"time": pd.to_datetime(forecast['timestamp']).dt.strftime("%Y-%m-%d %H:%M").tolist(),
+           "horizon": forecast['horizon'].astype(int).tolist()}
+    for col in ('aqi_forecast', 'aqi_lower', 'aqi_median', 'aqi_upper'):
+        if col in forecast.columns:
+            out[col] = forecast[col].astype(float).round(1).tolist()
+    return out
+
+
+def explanation_series(explain, top=TOP_CONTRIBUTIONS):
+    """Largest |contribution| features per horizon from the training job's <city>_explain.json."""
+    if not explain:
+        return None
+    out = {"horizon": explain["horizons"], "base": explain["base"], "top": []}
+    for row in explain["contributions"]:
+        order = [i for i in np.argsort(-np.abs(row))[:top] if row[i] != 0]
+        out["top"].append({"feature": [explain["features"][i] for i in order],
+                           "value": [explain["values"][i] for i in order],
+                           "contribution": [row[i] for i in order]})
+    return out
+
+
+def build_snapshot(city, features=None, forecast=None, hist=None, explain=None):
+    """Everything the dashboard draws for one city (display name), as plain JSON types."""
+    if hist is None:
+        hist = load_history("city_day", city=city, columns=['AQI', 'PM2.5'])
+    return {
+        "city": city,
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "latest": latest_readings(city, features),
+        "history": history_series(hist),
+        "forecast": forecast_series(forecast),
+        "explanation": explanation_series(explain),
+    }
+
+
+def write_snapshot(city_key, snapshot, snapshot_dir=SNAPSHOT_DIR):
+    os.makedirs(snapshot_dir, exist_ok=True)
+    path = snapshot_path(city_key, snapshot_dir)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(snapshot, f, separators=(",", ":"))
+    os.replace(tmp, path)
+    return path
+
+
+def load_snapshot(city_key, snapshot_dir=SNAPSHOT_DIR):
+    try:
+        with open(snapshot_path(city_key, snapshot_dir)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _read_csv(path, **kwargs):
+    try:
+        return pd.read_csv(path, **kwargs)
+    except FileNotFoundError:
+        return None
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def city_snapshot(city, features=None, forecast=None):
+    """build_snapshot(), reading frames not passed in memory from data/processed."""
+    key = DASHBOARD_CITIES[city]
+    if features is None:
+        features = _read_csv(f"data/processed/{key}_features.csv")
+    if forecast is None:
+        forecast = _read_csv(f"data/processed/{key}_forecast.csv")
+    return build_snapshot(city, features, forecast, explain=_read_json(f"data/processed/{key}_explain.json"))
+
+
+def build_all(features=None, forecasts=None, snapshot_dir=SNAPSHOT_DIR):
+    """Write a snapshot for every dashboard city (cities outside the pipeline get history only)."""
+    features = features or {}
+    forecasts = forecasts or {}
+    written = {}
+    for city, key in DASHBOARD_CITIES.items():
+        snap = city_snapshot(city, features.get(key), forecasts.get(key))
+        written[key] = write_snapshot(key, snap, snapshot_dir)
+        logger.info(f"Snapshot saved → {written[key]}")
+    return written
+
+
+def get_snapshot(city, snapshot_dir=SNAPSHOT_DIR):
+    """Snapshot for a display city; built (and saved if possible) the first time it's missing."""
+    key = DASHBOARD_CITIES[city]
+    snap = load_snapshot(key, snapshot_dir)
+    if snap is None:
+        snap = city_snapshot(city)
+        try:
+            write_snapshot(key, snap, snapshot_dir)
+        except OSError as e:
+            logger.warning(f"Could not save snapshot for {key}: {e}")
+    return snap
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    for key, path in build_all().items():
+        print(f"{key}: {path} ({os.path.getsize(path) / 1024:.1f} KB)")
@@ -0,0 +1,529 @@
+import os
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pandas as pd
+
+from src.data.historical_store import ingest, load_history
+from src.data import raw_store
+from src.data.fetch_aqi import parse_waqi
+from src.data.ingest import run_ingest
+from src.data.stations import StationCube, station_features
+from src.features.aqi import compute_aqi, sub_index
+from src.features.engine import add_lag_rolling, update_features
+from src.features.merge_data import extract_pollutants
+from src.visualization import snapshot
+from src.utils.pipeline import Stage, run_dag
+
+
+def _write_city_day(path):
+    rows = []
+    for city in ["Delhi", "Mumbai"]:
+        for d in pd.date_range("2019-12-30", "2020-01-03", freq="D"):
+            rows.append({"City": city, "Datetime": d.strftime("%Y-%m-%d"), "PM2.5": 100.0,
+                         "PM10": 200.0, "AQI": 150.0, "AQI_Bucket": "Moderate"})
+    pd.DataFrame(rows).to_csv(path / "city_day.csv", index=False)
+
+
+def test_historical_store_filters_city_columns_and_dates(tmp_path):
+    _write_city_day(tmp_path)
+    store = tmp_path / "parquet"
+    # Tiny blocks: the CSV is streamed in several batches, each dictionary encoded on its own
+    ingest("city_day", hist_dir=str(tmp_path), store_dir=str(store), block_bytes=256)
+    assert (store / "city_day" / "City=Delhi" / "year=2020").is_dir()
+
+    df = load_history("city_day", city="Delhi", columns=["AQI"], start="2020-01-01",
+                      hist_dir=str(tmp_path), store_dir=str(store))
+    assert list(df.columns) == ["AQI", "Datetime"]
+    assert len(df) == 3
+    assert df["AQI"].dtype == "float32"
+    assert df["Datetime"].is_monotonic_increasing
+    assert len(load_history("city_day", hist_dir=str(tmp_path), store_dir=str(store))) == 10
+
+
+def test_historical_store_builds_on_first_read(tmp_path):
+    _write_city_day(tmp_path)
+    df = load_history("city_day", city=["Delhi", "Mumbai"],
+                      hist_dir=str(tmp_path), store_dir=str(tmp_path / "parquet"))
+    assert len(df) == 10
+    assert set(df["City"]) == {"Delhi", "Mumbai"}
+
+
+# Local stub for WAQI / OpenWeather / CPCB
+class _StubHandler(BaseHTTPRequestHandler):
+    calls = []
+    fail_once = set()
+    rate_limited = set()
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        self.calls.append(url.path)
+        if url.path in self.fail_once:
+            self.fail_once.discard(url.path)
+            return self._json(503, {"status": "error"})
+        if url.path in self.rate_limited:
+            return self._json(429, {"status": "error"})
+        if url.path.startswith("/feed/") and self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        if url.path.startswith("/feed/"):
+            city = url.path.split("/")[2]
+            return self._json(200, {"status": "ok", "data": {
+                "aqi": 150, "iaqi": {"pm25": {"v": 80}, "pm10": {"v": 120}},
+                "time": {"s": "2025-11-16 18:00:00"}, "city": city}})
+        if url.path == "/data/weather":
+            return self._json(200, {"dt": 1763296200, "main": {"temp": 24.0, "humidity": 60, "pressure": 1012},
+                                    "wind": {"speed": 2.0}, "lat": query["lat"][0]})
+        if url.path == "/cpcb":
+            return self._json(200, {"records": [{"pm2_5": "91"}]})
+        self._json(404, {})
+
+
+def test_ingest_fetches_all_cities_from_stub_with_retry(tmp_path, monkeypatch):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    _StubHandler.calls.clear()
+    _StubHandler.fail_once.add("/feed/delhi/")
+    monkeypatch.chdir(tmp_path)
+    try:
+        results = run_ingest(["delhi", "mumbai"], mock_history=False,
+                             waqi_base=f"{base}/feed", weather_base=f"{base}/data", cpcb_url=f"{base}/cpcb",
+                             waqi_token="t", weather_key="k", cpcb_key="c", backoff=0.01)
+    finally:
+        server.shutdown()
+
+    assert results["delhi"]["aqi"]["aqi"] == 150
+    assert results["mumbai"]["weather"]["temp"] == 24.0
+    assert results["mumbai"]["cpcb"] == 91.0
+    assert _StubHandler.calls.count("/feed/delhi/") == 2
+    assert raw_store.latest("aqi", "delhi")["aqi"] == 150
+    assert raw_store.latest("weather", "mumbai")["timestamp"].endswith(":00:00")
+
+
+def test_ingest_response_cache_skips_revalidates_and_serves_stale(tmp_path, monkeypatch):
+    from src.data.http_cache import ResponseCache
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    _StubHandler.calls.clear()
+    monkeypatch.chdir(tmp_path)
+    def expired():
+        cache = ResponseCache("cache.json")
+        for entry in cache.entries.values():
+            entry["expires"] = 0
+        return cache
+
+    opts = dict(mock_history=False, waqi_base=f"{base}/feed", weather_base=f"{base}/data",
+                cpcb_url=f"{base}/cpcb", waqi_token="secret-token", weather_key="k", backoff=0.01)
+    try:
+        first = run_ingest(["delhi"], cache=ResponseCache("cache.json"), **opts)
+        fresh = run_ingest(["delhi"], cache=ResponseCache("cache.json"), **opts)
+        calls_after_fresh = len(_StubHandler.calls)
+        revalidated = run_ingest(["delhi"], cache=expired(), **opts)
+        _StubHandler.rate_limited.add("/feed/delhi/")
+        stale = run_ingest(["delhi"], cache=expired(), **opts)
+    finally:
+        _StubHandler.rate_limited.clear()
+        server.shutdown()
+
+    assert sorted(first["delhi"]["updated"]) == ["aqi", "weather"]
+    assert fresh["delhi"]["updated"] == [] and fresh["delhi"]["aqi"]["aqi"] == 150
+    assert calls_after_fresh == 2  # the second run never left the cache
+    assert revalidated["delhi"]["updated"] == [] and revalidated["delhi"]["weather"]["temp"] == 24.0
+    # 429 with a cached body: no retries, last good value served
+    assert _StubHandler.calls.count("/feed/delhi/") == 3 and stale["delhi"]["aqi"]["aqi"] == 150
+    assert "secret-token" not in (tmp_path / "cache.json").read_text()
+
+
+def test_pipeline_dag_hands_off_in_memory_and_skips_unchanged(tmp_path):
+    calls = []
+    out = tmp_path / "double.txt"
+
+    def double(key, values):
+        calls.append(key)
+        out.write_text("x")
+        return [v * 2 for v in values]
+
+    stages = [
+        Stage("total", lambda key, doubled: sum(doubled), deps=["double"]),
+        Stage("double", double, deps=["fetch"], checkpoints=lambda key: [str(out)], load=lambda key: [2, 4]),
+    ]
+    outputs, report, state = run_dag(stages, "delhi", inputs={"fetch": [1, 2]})
+    assert outputs["total"] == 6
+    assert [r["stage"] for r in report] == ["double", "total"]
+
+    outputs, report, _ = run_dag(stages, "delhi", inputs={"fetch": [1, 2]}, state=state)
+    assert calls == ["delhi"]
+    assert report[0]["status"] == "skipped"
+    assert outputs["total"] == 6
+
+    run_dag(stages, "delhi", inputs={"fetch": [1, 3]}, state=state)
+    assert calls == ["delhi", "delhi"]
+
+
+def test_raw_store_upserts_are_idempotent_and_windowed(tmp_path):
+    db = str(tmp_path / "raw.db")
+    rec = {"city": "delhi", "timestamp": "2025-01-01 10:42:00", "aqi": 180, "pollutants": "{}"}
+    assert raw_store.upsert("aqi", [rec], db_path=db) == 1
+    raw_store.upsert("aqi", [dict(rec, aqi=190)], db_path=db)
+    # Mock backfill never overwrites a real reading
+    raw_store.upsert("aqi", [dict(rec, aqi=1), dict(rec, timestamp="2025-01-01 09:00:00", aqi=170)],
+                     overwrite=False, db_path=db)
+    raw_store.upsert("aqi", [dict(rec, timestamp="2025-01-03 09:00:00")], db_path=db)
+
+    df = raw_store.read_window("aqi", "delhi", start="2025-01-01 00:00:00", end="2025-01-02 00:00:00", db_path=db)
+    assert list(df["timestamp"]) == ["2025-01-01 09:00:00", "2025-01-01 10:00:00"]
+    assert list(df["aqi"]) == [170, 190]
+    assert raw_store.read_window("aqi", "mumbai", db_path=db).empty
+
+
+def test_pollutants_typed_at_fetch_and_decoded_in_bulk_for_legacy_rows():
+    record = parse_waqi("delhi", {"status": "ok", "data": {
+        "aqi": 150, "iaqi": {"pm25": {"v": 80}, "no2": {"v": 21.5}, "t": {"v": 24}},
+        "time": {"s": "2025-11-16 18:00:00"}}})
+    assert record["pm25"] == 80.0 and record["no2"] == 21.5 and record["so2"] is None
+
+    df = pd.DataFrame({
+        "pollutants": ["{'pm25': 80, 'pm10': 120.5}", '{"pm2.5": 12, "no2": 1e1}', "{}", record["pollutants"]],
+        "pm25": [None, None, None, 5.0],
+    })
+    out = extract_pollutants(df)
+    assert out["pm25"].tolist()[:2] == [80.0, 12.0]
+    assert out["pm25"].iloc[3] == 5.0  # typed column wins
+    assert out["pm10"].iloc[0] == 120.5 and out["no2"].iloc[1] == 10.0
+    assert out.dtypes.eq(float).all() and out.iloc[2].isna().all()
+
+
+SPEC = {'lags': [1, 3], 'rolling': [3], 'lag_columns': ['aqi'], 'rolling_columns': ['aqi', 'temp']}
+
+
+def _hourly(city, hours, start="2025-01-01 00:00"):
+    ts = pd.Timestamp(start) + pd.to_timedelta(hours, unit="h")
+    return pd.DataFrame({"city": city, "timestamp": ts, "aqi": [float(h) for h in hours],
+                         "temp": [20.0 + h for h in hours]})
+
+
+def test_feature_engine_lags_are_time_exact_per_city():
+    # Hour 2 is missing for delhi; rows arrive shuffled and interleaved with mumbai
+    df = pd.concat([_hourly("delhi", [0, 1, 3, 4]), _hourly("mumbai", [0, 1, 2])]).sample(frac=1, random_state=0)
+    out = add_lag_rolling(df, group_cols=["city"], spec=SPEC)
+    delhi = out[out["city"] == "delhi"].set_index("timestamp")
+    assert delhi["aqi_lag_1"].isna().tolist() == [True, False, True, False]
+    assert delhi["aqi_lag_3"].iloc[3] == 1.0          # hour 4 → hour 1, not two rows back
+    assert delhi["aqi_rolling_3h"].iloc[3] == 3.5     # hours 2..4 window holds 3 and 4
+    assert delhi["temp_rolling_max_3h"].iloc[3] == 24.0
+    assert out[out["city"] == "mumbai"]["aqi_lag_1"].tolist()[1:] == [0.0, 1.0]
+
+
+def test_feature_engine_incremental_matches_full_rebuild():
+    full = add_lag_rolling(_hourly("delhi", range(30)), spec=SPEC)
+    partial = add_lag_rolling(_hourly("delhi", range(26)), spec=SPEC)
+    updated = update_features(partial, _hourly("delhi", range(26, 30)), spec=SPEC)
+    pd.testing.assert_frame_equal(updated, full, check_dtype=False)
+
+
+def test_station_cube_city_aggregates_and_station_features():
+    ts = pd.date_range("2020-01-01", periods=3, freq="h")
+    rows = [{"City": "Delhi", "Station": s, "Datetime": t, "PM2.5": v}
+            for s, vals in [("D1", [10, 20, None]), ("D2", [30, 40, 50]), ("D3", [50, None, None])]
+            for t, v in zip(ts, vals)]
+    rows.append({"City": "Mumbai", "Station": "M1", "Datetime": ts[0], "PM2.5": 5.0})
+    cube = StationCube.from_frame(pd.DataFrame(rows), ["PM2.5"])
+    assert cube.values.shape == (4, 3, 1)
+    assert cube.city_stations("Delhi") == ["D1", "D2", "D3"]
+
+    agg = cube.aggregate("Delhi", q=50)
+    assert agg["PM2.5_mean"].tolist() == [30, 30, 50]
+    assert agg["PM2.5_max"].tolist() == [50, 40, 50]
+    assert agg["PM2.5_p50"].tolist() == [30, 30, 50]
+    assert agg["PM2.5_count"].tolist() == [3, 2, 1]
+    assert cube.aggregate("Delhi", start=ts[1])["PM2.5_count"].tolist() == [2, 1]
+
+    feats = station_features(cube, "Delhi")
+    assert len(feats) == 6  # empty station-hours dropped
+    d1 = feats[feats["station"] == "D1"]
+    assert d1["pm25_vs_city"].tolist() == [-20, -10]
+
+
+def test_naqi_sub_indices_averaging_and_bucket():
+    assert sub_index("PM2.5", [0, 30, 45, 500]).tolist() == [0, 50, 75, 500]
+    assert sub_index("co", [1.5]).tolist() == [75]
+
+    ts = pd.date_range("2020-01-01", periods=20, freq="h")
+    df = pd.DataFrame({"Station": "S1", "Datetime": ts, "PM2.5": 60.0, "NO2": 40.0, "CO": 1.0})
+    df.loc[19, "CO"] = 2.0
+    out = compute_aqi(df)
+    assert out["AQI"].iloc[:15].isna().all()  # fewer than 16 hours of PM2.5 / NO2
+    assert out["PM2.5_SubIndex"].iloc[-1] == 100
+    assert out["CO_SubIndex"].iloc[-1] == 100 and out["CO_SubIndex"].iloc[-2] == 50
+    assert out["AQI"].iloc[-1] == 100 and out["AQI_Bucket"].iloc[-1] == "Satisfactory"
+
+    # Fewer than 3 pollutants → no AQI
+    assert compute_aqi(df[["Station", "Datetime", "PM2.5", "NO2"]], average=False)["AQI"].isna().all()
+
+
+def test_dashboard_snapshot_roundtrip_and_version(tmp_path):
+    hist = pd.DataFrame({"AQI": range(2000), "PM2.5": [1.0] * 2000})
+    feats = pd.DataFrame({"timestamp": ["2025-01-01 00:00"], "aqi": [150.0], "pm25": [60.0], "humidity": [70.0]})
+    fc = pd.DataFrame({"timestamp": ["2025-01-01 01:00"], "horizon": [1], "aqi_forecast": [155.04],
+                       "aqi_lower": [140.0], "aqi_upper": [170.0]})
+    snap = snapshot.build_snapshot("Delhi", feats, fc, hist=hist)
+    assert snap["latest"]["aqi"] == 150 and snap["latest"]["pm10"] == 0.0 and not snap["latest"]["fallback"]
+    assert snap["history"]["trend"][-1] == 1999 and len(snap["history"]["trend"]) == 30
+    assert snap["history"]["scatter"]["n"] == snapshot.SCATTER_POINTS
+    assert snap["forecast"]["aqi_forecast"] == [155.0]
+
+    assert snapshot.snapshot_version("delhi", str(tmp_path)) is None
+    snapshot.write_snapshot("delhi", snap, str(tmp_path))
+    assert snapshot.load_snapshot("delhi", str(tmp_path)) == snap
+    assert snapshot.snapshot_version("delhi", str(tmp_path)) is not None
+
+    empty = snapshot.build_snapshot("Mumbai", None, None, hist=hist.iloc[0:0])
+    assert empty["latest"]["fallback"] and empty["forecast"] is None and not empty["history"]["has_pm25"]
+
+
+def test_benchmark_suite_records_history_and_flags_regressions(tmp_path):
+    from benchmarks.suite import run_suite, load_history
+
+    history = str(tmp_path / "history.jsonl")
+    first, regressions = run_suite(["app_load_snapshot"], scale=0.01, repeat=2, history_path=history)
+    assert first[0]["ratio"] is None and not regressions
+    # threshold is a ratio to the previous run; at 0 every ratio exceeds it, so the case is flagged
+    second, regressions = run_suite(["app_load_snapshot"], scale=0.01, repeat=2, threshold=0.0,
+                                    history_path=history)
+    assert second[0]["ratio"] is not None and regressions == ["app_load_snapshot"]
+    assert len(load_history(history)) == 2
+
+
+def test_metrics_spans_histograms_and_cross_process_merge(tmp_path):
+    from src.utils.metrics import Metrics
+
+    log = tmp_path / "metrics.jsonl"
+    m = Metrics(jsonl_path=str(log))
+    with m.span("merge", city="delhi") as s:
+        s.rows = 24
+    try:
+        with m.span("merge", city="delhi"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+    m.observe("http_request_seconds", 0.3, host="api.waqi.info", status=200)
+
+    worker = Metrics()
+    with worker.span("merge", city="delhi") as s:
+        s.rows = 6
+    m.merge(worker.export())
+
+    text = m.to_prometheus()
+    assert 'aqilytics_span_rows_total{city="delhi",span="merge"} 30' in text
+    assert 'aqilytics_span_runs_total{city="delhi",span="merge",status="error"} 1' in text
+    assert 'aqilytics_span_runs_total{city="delhi",span="merge",status="ok"} 2' in text
+    # Cumulative buckets: 0.3 s falls in le=0.5 but not le=0.25
+    assert 'aqilytics_http_request_seconds_bucket{host="api.waqi.info",status="200",le="0.25"} 0' in text
+    assert 'aqilytics_http_request_seconds_bucket{host="api.waqi.info",status="200",le="0.5"} 1' in text
+    assert 'aqilytics_http_request_seconds_count{host="api.waqi.info",status="200"} 1' in text
+
+    events = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [e["status"] for e in events] == ["ok", "error"]
+    assert events[0]["rows"] == 24 and events[0]["city"] == "delhi"
+
+    # Concurrent writers (Streamlit sessions are threads) each use their own temp file
+    prom = str(tmp_path / "prom" / "metrics.prom")
+    errors = []
+
+    def write():
+        try:
+            for _ in range(50):
+                m.write_prometheus(prom)
+        except OSError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == [] and os.listdir(tmp_path / "prom") == ["metrics.prom"]
+    assert m.write_prometheus(prom, min_interval=60) is None
+
+
+def test_cli_fetch_stays_off_the_heavy_imports():
+    from src.cli import check_imports, main
+
+    row, = check_imports(["fetch"], repeat=1)
+    assert row["heavy"] == [] and row["ms"] > 0
+    # Remaining arguments go to the module's own parser
+    assert main(["historical", "--help"]) == 0
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    posts = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.posts.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+        self.send_response(204)
+        self.end_headers()
+
+
+def test_alerts_hysteresis_cooldown_and_batched_sinks(tmp_path):
+    import numpy as np
+    from src.utils import alerts
+
+    def inputs(levels, forecast):
+        hours = pd.date_range("2025-11-16 10:00", periods=4, freq="h")
+        features = {c: pd.DataFrame({"timestamp": hours, "aqi": [v] * 4}) for c, v in levels.items()}
+        forecasts = {c: pd.DataFrame({"horizon": [1, 6, 24], "aqi_forecast": [v, v + 10, v - 10]})
+                     for c, v in forecast.items()}
+        return features, forecasts
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _WebhookHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    memory = alerts.MemorySink(batch_size=1)
+    sinks = {"webhook": alerts.WebhookSink(f"http://127.0.0.1:{server.server_port}/hook"), "memory": memory}
+    config = {"alerts": {"cities": {"delhi": {"threshold": 400}}, "subscriptions": [
+        {"cities": "*", "rules": ["forecast"], "sink": "webhook", "to": "ops"},
+        {"cities": ["mumbai", "delhi"], "sink": "memory", "to": "team@example.com"}]}}
+    state = str(tmp_path / "alert_state.json")
+    t0 = pd.Timestamp("2025-11-16 14:00")
+
+    def run(levels, forecast, hours):
+        features, forecasts = inputs(levels, forecast)
+        out = alerts.run_alerts(features, forecasts, now=t0 + pd.Timedelta(hours=hours), config=config,
+                                state_path=state, sinks=sinks)
+        return sorted(zip(out["city"], out["rule"]))
+
+    try:
+        first = run({"delhi": 350, "mumbai": 320, "chennai": 80}, {"delhi": 380, "mumbai": 320, "chennai": 90}, 0)
+        assert first == [("delhi", "bucket"), ("mumbai", "bucket"), ("mumbai", "forecast"), ("mumbai", "sustained")]
+        # One webhook POST for the forecast subscription; one email per recipient, all its alerts together
+        assert [[n["to"] for n in p["notifications"]] for p in _WebhookHandler.posts] == [["ops"]]
+        assert [len(n["alerts"]) for batch in memory.batches for n in batch] == [4]
+
+        # Still high, or dipped less than clear_margin: alerts stay open and silent
+        assert run({"delhi": 350, "mumbai": 320}, {"delhi": 380, "mumbai": 320}, 1) == []
+        assert run({"delhi": 350, "mumbai": 290}, {"delhi": 380, "mumbai": 290}, 2) == []
+        # Cleared, then back up inside the cooldown → muted; after it → sent again
+        assert run({"mumbai": 250}, {"mumbai": 250}, 3) == []
+        assert run({"mumbai": 320}, {"mumbai": 320}, 4) == []
+        run({"mumbai": 250}, {"mumbai": 250}, 5)
+        assert run({"mumbai": 320}, {"mumbai": 320}, 7) == [("mumbai", "bucket"), ("mumbai", "forecast"),
+                                                            ("mumbai", "sustained")]
+        # The mumbai-only runs kept delhi's state: its bucket alert is still open, so nothing is re-sent
+        assert set(alerts.read_state(state).index) == {"chennai", "delhi", "mumbai"}
+        assert run({"delhi": 350}, {"delhi": 380}, 8) == []
+    finally:
+        server.shutdown()
+
+    # Thousands of cities in one pass: every other city forecast above threshold
+    n = 3000
+    cities = [f"c{i}" for i in range(n)]
+    forecasts = {c: pd.DataFrame({"horizon": [1, 6], "aqi_forecast": [100.0, 350.0 if i % 2 else 100.0]})
+                 for i, c in enumerate(cities)}
+    out = alerts.run_alerts({}, forecasts, now=t0, config={"alerts": {}}, state_path=str(tmp_path / "big.json"),
+                            sinks={})
+    assert len(out) == n // 2 and set(out["rule"]) == {"forecast"} and np.all(out["horizon"] == 6)
+
+
+def test_alerts_retry_when_every_sink_failed(tmp_path):
+    from src.utils import alerts
+
+    class FlakySink(alerts.Sink):
+        down = True
+
+        def send_batch(self, batch):
+            if self.down:
+                raise ConnectionError("webhook unreachable")
+
+    flaky, memory = FlakySink(), alerts.MemorySink()
+    config = {"alerts": {"subscriptions": [{"cities": ["delhi"], "sink": "webhook", "to": "ops"},
+                                           {"cities": ["mumbai"], "sink": "memory", "to": "team"}]}}
+    forecasts = {"delhi": pd.DataFrame({"horizon": [1, 6], "aqi_forecast": [320.0, 350.0]}),
+                 "mumbai": pd.DataFrame({"horizon": [1, 6], "aqi_forecast": [310.0, 330.0]})}
+    state = str(tmp_path / "alert_state.json")
+    t0 = pd.Timestamp("2025-11-16 14:00")
+
+    def run(hours):
+        out = alerts.run_alerts({}, forecasts, now=t0 + pd.Timedelta(hours=hours), config=config,
+                                state_path=state, sinks={"webhook": flaky, "memory": memory})
+        return sorted(zip(out["city"], out["rule"]))
+
+    assert run(0) == [("delhi", "forecast"), ("mumbai", "forecast")]
+    saved = alerts.read_state(state)
+    assert not saved.loc["delhi", "forecast_open"] and saved.loc["mumbai", "forecast_open"]
+    # The webhook is back: only the alert it failed to deliver is sent again
+    flaky.down = False
+    assert run(1) == [("delhi", "forecast")]
+    assert run(2) == []
+
+
+def test_quality_flags_and_fills_per_series():
+    import numpy as np
+    from src.features import quality
+
+    hours = pd.date_range("2025-01-01", periods=72, freq="h")
+    wave = 100 + 20 * np.sin(np.arange(72) / 24 * 2 * np.pi)
+    df = pd.concat([pd.DataFrame({"city": c, "timestamp": hours, "pm25": wave + i, "pm10": "80"})
+                    for i, c in enumerate(["delhi", "mumbai"])], ignore_index=True)
+    df.loc[5, "pm25"] = 900.0                  # spike
+    df.loc[10:12, "pm25"] = np.nan             # 3-hour gap → interpolated in time
+    df.loc[20:31, "pm25"] = np.nan             # 12-hour gap → hour-of-day profile
+    df.loc[60, "pm25"] = -3.0                  # out of range
+    df.loc[72 + 40:72 + 49, "pm25"] = 55.0     # stuck sensor in mumbai
+    df.loc[72 + 71, "pm10"] = "n/a"            # not numeric
+    df = df.drop(index=[72 + 3, 72 + 4])       # missing hours
+
+    config = {"quality": {"max_gap_hours": 6}}
+    out, report = quality.clean(df.sample(frac=1, random_state=0), columns=["pm25", "pm10"], config=config)
+    pm25 = report[report["column"] == "pm25"].set_index("city")
+    assert pm25.loc["delhi", ["spike", "out_of_range", "interpolated", "profile_filled"]].tolist() == [1, 1, 5, 12]
+    assert pm25.loc["mumbai", "stuck"] == 9 and pm25.loc["mumbai", "gap_steps"] == 2
+    assert report.set_index(["city", "column"]).loc[("mumbai", "pm10"), "not_numeric"] == 1
+    assert out["pm25"].notna().all() and out["pm25"].between(50, 200).all()
+
+    # Linear in time across the short gap; nothing is filled with a constant
+    delhi = out[out["city"] == "delhi"].set_index("timestamp")["pm25"]
+    assert np.isclose(delhi[hours[11]], (delhi[hours[9]] + delhi[hours[13]]) / 2)
+
+    # A pollutant a city never reported stays NaN (no zero / constant fill)
+    df["no2"] = np.where(df["city"] == "delhi", np.nan, 30.0 + np.arange(len(df)) % 5)
+    out, report = quality.clean(df, columns=["no2"], config=config)
+    assert out.loc[out["city"] == "delhi", "no2"].isna().all()
+    assert out.loc[out["city"] == "mumbai", "no2"].notna().all()
+
+
+def test_quality_report_for_station_table(tmp_path):
+    import numpy as np
+    from src.features import quality
+
+    hours = pd.date_range("2020-01-01", periods=48, freq="h")
+    df = pd.concat([pd.DataFrame({"City": "Delhi", "Datetime": hours, "Station": s,
+                                  "PM2.5": 100.0 + 10 * i + np.arange(48) % 7, "AQI": 150.0})
+                    for i, s in enumerate(["DL001", "DL002"])], ignore_index=True)
+    df.loc[48 + 5, "PM2.5"] = -1.0
+    df.to_csv(tmp_path / "station_hour.csv", index=False)
+
+    report = quality.table_report("station_hour", hist_dir=str(tmp_path), store_dir=str(tmp_path / "parquet"))
+    pm25 = report[report["column"] == "PM2.5"].set_index("Station")
+    assert list(pm25.index) == ["DL001", "DL002"] and (pm25["rows"] == 48).all()
+    assert pm25["out_of_range"].tolist() == [0, 1] and pm25["interpolated"].tolist() == [0, 1]
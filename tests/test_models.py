@@ -0,0 +1,297 @@
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from src.models.forecast import DirectForecaster, add_targets, forecast_frames
+from src.models.registry import ModelRegistry, legacy_model_path, model_path, save_model, update_manifest
+
+
+def _fit(const, n_features=3):
+    X = pd.DataFrame(np.random.rand(20, n_features), columns=[f"f{i}" for i in range(n_features)])
+    model = xgb.XGBRegressor(n_estimators=2, max_depth=2)
+    model.fit(X, np.full(20, const))
+    return model, X
+
+
+def test_registry_loads_once_and_hot_reloads(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    assert registry.get("Delhi") is None
+
+    model, X = _fit(100.0)
+    save_model(model, model_path("Delhi", str(tmp_path)))
+    first = registry.get("Delhi")
+    assert registry.get("delhi") is first
+    v1 = registry.version("Delhi")
+
+    # Replace the artifact the way the hourly job does
+    newer, _ = _fit(300.0)
+    path = model_path("Delhi", str(tmp_path))
+    save_model(newer, path)
+    os.utime(path, ns=(time.time_ns() + 10**9, time.time_ns() + 10**9))
+    assert registry.get("Delhi") is not first
+    assert registry.version("Delhi") != v1
+    assert registry.predict("Delhi", X)[0] > 200
+
+
+def test_registry_keeps_model_when_only_touched(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    model, _ = _fit(50.0)
+    path = model_path("Mumbai", str(tmp_path))
+    save_model(model, path)
+    first = registry.get("Mumbai")
+    os.utime(path, ns=(time.time_ns() + 10**9, time.time_ns() + 10**9))
+    assert registry.get("Mumbai") is first
+
+
+def test_registry_native_format_manifest_and_lru_bound(tmp_path):
+    registry = ModelRegistry(str(tmp_path), max_models=2)
+    model, X = _fit(120.0)
+    save_model(model, legacy_model_path("Bhopal", str(tmp_path)))  # old pickle still served
+    assert isinstance(registry.get("Bhopal"), xgb.XGBRegressor)
+
+    for city in ["Delhi", "Mumbai", "Kolkata"]:
+        save_model(model, model_path(city, str(tmp_path)))
+    assert model_path("Delhi", str(tmp_path)).endswith(".ubj")
+    update_manifest({"Delhi": {"features": list(X.columns), "train_end": "2024-12-31"}}, str(tmp_path))
+
+    assert isinstance(registry.get("Delhi"), xgb.Booster)
+    registry.get("Mumbai")
+    registry.get("Delhi")  # most recently used survives the next load
+    registry.get("Kolkata")
+    assert [os.path.basename(p) for p in registry.resident()] == ["delhi_model.ubj", "kolkata_model.ubj"]
+    assert abs(registry.predict("Mumbai", X)[0] - 120) < 1  # evicted, reloads lazily
+    assert registry.info("delhi")["features"] == ["f0", "f1", "f2"] and registry.info("Mumbai") is None
+
+
+def _city_hours(city, n, level):
+    ts = pd.date_range("2025-01-01", periods=n, freq="h")
+    aqi = level + 10 * np.sin(np.arange(n) / 4)
+    return pd.DataFrame({"city": city, "timestamp": ts, "aqi": aqi, "pm25": aqi / 2, "hour": ts.hour})
+
+
+def test_direct_forecaster_predicts_every_horizon_for_every_city_in_one_batch():
+    data = pd.concat([_city_hours("delhi", 60, 300), _city_hours("mumbai", 60, 100)], ignore_index=True)
+    targets = add_targets(data, [1, 6])
+    delhi = targets[targets["city"] == "delhi"]
+    assert delhi["aqi_h6"].iloc[0] == delhi["aqi"].iloc[6]
+    assert np.isnan(delhi["aqi_h6"].iloc[-1])
+
+    forecaster = DirectForecaster([1, 6, 72], ["aqi", "pm25", "hour"], cities=["delhi", "mumbai"]).fit(data)
+    assert forecaster.trained == [1, 6]  # never observed 72h ahead → persistence
+
+    frames = {c: g.drop(columns="city") for c, g in data.groupby("city")}
+    calls = []
+    predict = forecaster.model.predict
+    forecaster.model.predict = lambda X: calls.append(len(X)) or predict(X)
+    out = forecast_frames(forecaster, frames)
+    assert calls == [2 * 2]  # one call: 2 cities x 2 trained horizons
+    assert set(out) == {"delhi", "mumbai"}
+    assert out["delhi"]["horizon"].tolist() == [1, 6, 72]
+    assert out["delhi"]["aqi_forecast"].iloc[0] > out["mumbai"]["aqi_forecast"].iloc[0] + 100
+    assert out["mumbai"]["timestamp"].iloc[1] == frames["mumbai"]["timestamp"].iloc[-1] + pd.Timedelta(hours=6)
+
+
+def test_forecast_artifact_carries_precomputed_quantile_bands():
+    data = pd.concat([_city_hours("delhi", 80, 300), _city_hours("mumbai", 80, 100)], ignore_index=True)
+    forecaster = DirectForecaster([1, 6], ["aqi", "pm25", "hour"], cities=["delhi", "mumbai"],
+                                  quantiles=[0.1, 0.5, 0.9]).fit(data)
+    frames = {c: g.drop(columns="city") for c, g in data.groupby("city")}
+    fc = forecast_frames(forecaster, frames)["delhi"]
+    assert (fc["aqi_lower"] <= fc["aqi_median"]).all() and (fc["aqi_median"] <= fc["aqi_upper"]).all()
+    assert (fc["aqi_upper"] - fc["aqi_lower"] > 0).any()
+
+
+def test_forecast_explanations_sum_to_predictions_and_reach_the_snapshot():
+    from src.models.forecast import explain_frames
+    from src.visualization.snapshot import explanation_series
+
+    data = pd.concat([_city_hours("delhi", 60, 300), _city_hours("mumbai", 60, 100)], ignore_index=True)
+    forecaster = DirectForecaster([1, 6, 72], ["aqi", "pm25", "hour"], cities=["delhi", "mumbai"]).fit(data)
+    frames = {c: g.drop(columns="city") for c, g in data.groupby("city")}
+    forecasts = forecast_frames(forecaster, frames)
+    explain = explain_frames(forecaster, frames)
+
+    delhi = explain["delhi"]
+    assert delhi["features"] == ["aqi", "pm25", "hour", "city"] and delhi["horizons"] == [1, 6, 72]
+    totals = np.array(delhi["contributions"]).sum(axis=1) + delhi["base"]
+    assert np.allclose(totals, forecasts["delhi"]["aqi_forecast"], atol=0.2)
+    assert delhi["contributions"][2] == [0, 0, 0, 0]  # 72h is persistence: all in the bias
+
+    importance = forecaster.importance(data)
+    assert set(importance) == {1, 6} and max(importance[1], key=importance[1].get) in ("aqi", "pm25", "city")
+    top = explanation_series(delhi, top=2)
+    assert top["horizon"] == [1, 6, 72] and 0 < len(top["top"][0]["feature"]) <= 2
+    assert top["top"][2]["feature"] == []
+
+
+def test_city_models_train_on_slices_of_one_dmatrix_and_warm_start(tmp_path):
+    from src.models import train_historical as th
+
+    n = 40
+    df = pd.DataFrame(np.random.rand(2 * n, len(th.FEATURES)) * 100, columns=th.FEATURES)
+    df["City"] = ["Delhi"] * n + ["Mumbai"] * n
+    df["AQI"] = np.r_[np.full(n, 300.0), np.full(n, 80.0)]
+    dtrain = th.build_dmatrix(df)
+    idx = th.city_indices(df, ["Delhi", "Mumbai"])
+    assert len(idx["Mumbai"]) == n
+
+    cold = th.train_booster(dtrain.slice(idx["Mumbai"]), nthread=1, rounds=5)
+    save_model(cold, model_path("Mumbai", str(tmp_path)))
+    prev = th.previous_booster("Mumbai", str(tmp_path))
+    warm = th.train_booster(dtrain.slice(idx["Mumbai"]), nthread=1, rounds=3, prev=prev)
+    assert warm.num_boosted_rounds() == 8
+
+    save_model(warm, model_path("Mumbai", str(tmp_path)))
+    pred = ModelRegistry(str(tmp_path)).predict("Mumbai", df[th.FEATURES].head(3))
+    assert len(pred) == 3 and abs(pred[0] - 80) < abs(pred[0] - 300)
+
+
+def _call(app, method, path, query=b"", body=b""):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "query_string": query}
+    return app(scope, receive, send), sent
+
+
+def test_api_serves_forecasts_and_micro_batches_concurrent_requests(tmp_path):
+    import asyncio
+    import json
+    from src.app.api import ForecastService, create_app
+
+    data = pd.concat([_city_hours(c, 40, lvl) for c, lvl in [("delhi", 300), ("mumbai", 100), ("kolkata", 200)]],
+                     ignore_index=True)
+    forecaster = DirectForecaster([1, 6], ["aqi", "pm25", "hour"], cities=["delhi", "mumbai", "kolkata"]).fit(data)
+    save_model(forecaster, str(tmp_path / "forecaster.pkl"))
+    features_dir = tmp_path / "processed"
+    features_dir.mkdir()
+    for city, g in data.groupby("city"):
+        g.drop(columns="city").to_csv(features_dir / f"{city}_features.csv", index=False)
+    g.drop(columns="city").to_csv(tmp_path / "secret_features.csv", index=False)
+
+    service = ForecastService(str(tmp_path / "forecaster.pkl"), str(features_dir), ModelRegistry(str(tmp_path)),
+                              max_wait=0.05)
+    app = create_app(service)
+
+    async def scenario():
+        calls = [_call(app, "GET", f"/forecast/{c}") for c in ["delhi", "mumbai", "kolkata", "delhi"]]
+        await asyncio.gather(*(coro for coro, _ in calls))
+        post, post_sent = _call(app, "POST", "/forecast", body=b'{"cities": ["mumbai", "nowhere", "../secret"], "horizon": 6}')
+        await post
+        bad, bad_sent = _call(app, "GET", "/forecast/delhi", query=b"horizon=5")
+        await bad
+        current, current_sent = _call(app, "GET", "/current/kolkata")
+        await current
+        prom, prom_sent = _call(app, "GET", "/metrics")
+        await prom
+        return ([json.loads(sent[1]["body"]) for _, sent in calls], json.loads(post_sent[1]["body"]), bad_sent,
+                json.loads(current_sent[1]["body"]), prom_sent[1]["body"].decode())
+
+    results, batch, bad_sent, current, prom = asyncio.run(scenario())
+    assert service.batcher.batches == 1  # four concurrent requests, one predict
+    assert [p["horizon"] for p in results[0]["forecast"]] == [1, 6]
+    assert results[0]["forecast"][0]["aqi"] > results[1]["forecast"][0]["aqi"] + 100
+    assert batch["results"]["mumbai"]["forecast"][0]["horizon"] == 6
+    assert "nowhere" in batch["errors"]
+    # Path-like names are rejected before any file access (and never cached)
+    assert batch["errors"]["../secret"].startswith("Invalid city name") and "../secret" not in service.features._rows
+    assert bad_sent[0]["status"] == 400
+    assert current["city"] == "kolkata" and np.isclose(current["aqi"], data["aqi"].iloc[-1])
+    assert 'aqilytics_api_request_seconds_count{endpoint="/forecast",status="400"}' in prom
+
+
+def test_training_skips_unchanged_inputs_and_records_lineage(tmp_path, monkeypatch):
+    import shutil
+    from src.features.merge_data import load_features, save_features
+    from src.models import train
+    from src.utils.fingerprint import read_lineage
+
+    shutil.copytree("config", tmp_path / "config")
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data/processed")
+    frames = {c: _city_hours(c, 40, lvl).drop(columns="city") for c, lvl in [("delhi", 300), ("mumbai", 100)]}
+    for city, df in frames.items():
+        save_features(city, df)
+
+    assert train.train_all(frames)[0] is not None
+    # The same features read back from disk hash the same
+    skipped, forecasts = train.train_all({c: load_features(c) for c in frames})
+    assert skipped is None and sorted(forecasts) == ["delhi", "mumbai"]
+
+    # One new hour for one city, in memory only → retrain, and lineage shows which input changed
+    frames["delhi"] = _city_hours("delhi", 41, 300).drop(columns="city")
+    assert train.train_all(frames)[0] is not None
+    first, second = read_lineage()["forecaster"]
+    changed = [p for p in first["inputs"] if first["inputs"][p] != second["inputs"][p]]
+    assert changed == ["features:delhi"] and first["config"] == second["config"]
+    assert train.MODEL_PATH in second["artifacts"]
+
+
+def test_streaming_training_reads_chunks_and_skips_unchanged_store(tmp_path):
+    from src.data.historical_store import ingest
+    from src.models import train_streaming as ts
+
+    n = 24 * 20
+    when = pd.date_range("2020-01-01", periods=n, freq="h")
+    pm25 = np.random.rand(n).astype("float32") * 200
+    pm25[::7] = np.nan  # missing pollutants stay NaN, not dropped
+    aqi = pm25 * 1.5
+    aqi[::11] = np.nan  # rows without a label are dropped
+    pd.DataFrame({"City": "Delhi", "Station": "DL001", "Datetime": when.strftime("%Y-%m-%d %H:%M:%S"),
+                  "PM2.5": pm25, "PM10": 100.0, "NO2": 20.0, "CO": 1.0, "O3": 30.0,
+                  "AQI": aqi}).to_csv(tmp_path / "station_hour.csv", index=False)
+    store = tmp_path / "parquet"
+    ingest("station_hour", hist_dir=str(tmp_path), store_dir=str(store))
+
+    train = ts.HistoryIter("station_hour", subset="train", batch_rows=50, store_dir=str(store))
+    valid = ts.HistoryIter("station_hour", subset="valid", batch_rows=50, store_dir=str(store))
+    sizes = [len(y) for _, y in train.chunks()]
+    held = sum(len(y) for _, y in valid.chunks())
+    assert len(sizes) > 5 and max(sizes) <= 50
+    assert sum(sizes) + held == int(np.isfinite(aqi).sum()) and held > 0
+
+    kwargs = dict(rounds=5, batch_rows=50, model_dir=str(tmp_path / "models"), cache_dir=str(tmp_path),
+                  hist_dir=str(tmp_path), store_dir=str(store))
+    info = ts.train_streaming("station_hour", **kwargs)
+    assert info["rows"] == sum(sizes) and info["rounds"] == 5 and info["peak_rss_mb"] > 0
+    assert json.load(open(tmp_path / "models" / "manifest.json"))["hourly"]["rows"] == info["rows"]
+    assert not [p for p in os.listdir(tmp_path) if p.startswith("xgb-extmem-")]
+    assert ts.train_streaming("station_hour", **kwargs) is None
+
+
+def test_backtest_folds_are_leak_free_and_pool_per_city_horizon(tmp_path):
+    from src.models import backtest as bt
+
+    times = pd.Series(pd.date_range("2020-01-01", periods=60, freq="D"))
+    origin = bt.rolling_origins(times, 2, 10 * 24)[0]
+    assert origin == times.max() - pd.Timedelta(days=20)
+    train, test = bt.fold_indices(times, origin, 72, 10 * 24)
+    assert (times[train] + pd.Timedelta(hours=72) <= origin).all()
+    assert (times[test] > origin).all() and len(test) == 10
+    slide, _ = bt.fold_indices(times, origin, 72, 10 * 24, "sliding", 7 * 24)
+    assert len(slide) == 7
+
+    rows = []
+    for city, level in [("Delhi", 300.0), ("Mumbai", 80.0)]:
+        for d in times:
+            rows.append({"City": city, "Datetime": d.strftime("%Y-%m-%d"), "PM2.5": level / 2,
+                         "PM10": level, "NO2": 10.0, "CO": 1.0, "O3": 20.0, "AQI": level})
+    pd.DataFrame(rows).to_csv(tmp_path / "city_day.csv", index=False)
+    kwargs = dict(cities=["Delhi", "Mumbai"], folds=2, test_hours=10 * 24, horizons=[24, 72],
+                  params={"n_estimators": 5}, workers=2, cache_dir=str(tmp_path / "cache"),
+                  hist_dir=str(tmp_path), store_dir=str(tmp_path / "parquet"))
+    summary, folds = bt.run_backtest("city_day", **kwargs)
+    assert len(summary) == 4 and set(summary["folds"]) == {2}
+    # The last fold has no labels for its final h hours
+    assert list(summary["n"]) == [19, 17, 19, 17] and (summary["mae"] < 1).all()
+    assert len(os.listdir(tmp_path / "cache")) == 2
+    again, _ = bt.run_backtest("city_day", **{**kwargs, "workers": 1})
+    assert again.equals(summary)